@@ -0,0 +1,190 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel
+
+from services.accounts import AccountExists, accounts
+from services.database import database
+from services.jobs import job_queue
+from services.mail import mailer
+from services.otp import OTPThrottled, otp_store
+from services.passwords import HasherBusy, login_limiter
+from services.sms import mask_phone, normalize_phone, sms
+from services.tokens import tokens, TokenError
+from services.metrics import registry, export_stats
+
+router = APIRouter()
+
+# The queue stops before the clients its jobs use
+SERVICES = [database, tokens, sms, job_queue]
+
+@registry.collector
+def _export_auth_stats():
+    export_stats("tokens", tokens.snapshot())
+    export_stats("jobs", job_queue.snapshot())
+    export_stats("otp", otp_store.snapshot())
+    export_stats("sms", sms.snapshot())
+    export_stats("mail", mailer.snapshot())
+
+# Slow side effects run as background jobs
+async def send_sms_job(payload: dict):
+    await sms.send(payload["to"], payload["body"])
+
+async def welcome_email_job(payload: dict):
+    await mailer.send(
+        payload["email"],
+        "Welcome to EezLegal",
+        f"Hi {payload['name']},\n\nThanks for signing up for EezLegal. "
+        "Ask your first legal question any time at https://www.eezlegal.com.\n",
+    )
+
+job_queue.register("sms", send_sms_job, redact=lambda payload: {"to": mask_phone(payload["to"])})
+job_queue.register("welcome_email", welcome_email_job)
+
+class AuthRequest(BaseModel):
+    email: str
+    password: str
+
+class SignupRequest(BaseModel):
+    name: str
+    email: str
+    password: str
+
+class PhoneVerificationRequest(BaseModel):
+    phoneNumber: str
+
+class PhoneVerifyRequest(BaseModel):
+    phoneNumber: str
+    verificationCode: str
+
+# Authentication helpers
+USER_CLAIMS = ("name", "email", "phone", "subscription")
+
+def issue_token(user: dict) -> str:
+    return tokens.issue(user["id"], {k: user[k] for k in USER_CLAIMS if k in user})
+
+def user_from_claims(claims: dict) -> dict:
+    return {"id": claims["sub"], **{k: claims[k] for k in USER_CLAIMS if k in claims}}
+
+def bearer_token(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token.strip()
+
+async def current_user(request: Request) -> dict:
+    """Authenticate from the signed token alone; no database lookup."""
+    token = bearer_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return tokens.verify(token)
+    except TokenError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+
+def require_self(claims: dict, user_id: str):
+    """Reject a request for someone else's account."""
+    if claims["sub"] != user_id:
+        raise HTTPException(status_code=403, detail="You can only access your own account")
+
+async def optional_user(request: Request) -> Optional[dict]:
+    """Claims of the bearer token, or None for anonymous callers."""
+    if not bearer_token(request):
+        return None
+    return await current_user(request)
+
+# Authentication endpoints
+MIN_PASSWORD_LENGTH = 8
+
+@router.post("/api/auth/login")
+async def login(auth_request: AuthRequest):
+    email = auth_request.email.strip().lower()
+    if not login_limiter.allow(email):
+        raise HTTPException(status_code=429, detail="Too many failed attempts. Please try again in a few minutes")
+    try:
+        user = await accounts.authenticate(email, auth_request.password)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="We are experiencing high load. Please try again in a moment")
+    if user is None:
+        login_limiter.record_failure(email)
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    login_limiter.reset(email)
+    return {"success": True, "token": issue_token(user), "user": user}
+
+@router.post("/api/auth/signup")
+async def signup(signup_request: SignupRequest):
+    name = signup_request.name.strip()
+    email = signup_request.email.strip().lower()
+    if not name or "@" not in email:
+        raise HTTPException(status_code=400, detail="Please enter your name and a valid email address")
+    if len(signup_request.password) < MIN_PASSWORD_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Password must be at least {MIN_PASSWORD_LENGTH} characters long")
+    try:
+        user = await accounts.create(name, email, signup_request.password)
+    except AccountExists as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="We are experiencing high load. Please try again in a moment")
+    if mailer.configured:
+        await job_queue.enqueue(
+            "welcome_email",
+            {"email": email, "name": name},
+            idempotency_key=f"welcome:{email}",
+        )
+    return {"success": True, "token": issue_token(user), "user": user}
+
+@router.get("/api/auth/verify")
+async def verify_token(claims: dict = Depends(current_user)):
+    return {"success": True, "user": user_from_claims(claims)}
+
+@router.post("/api/auth/logout")
+async def logout(request: Request):
+    token = bearer_token(request)
+    if token:
+        try:
+            await tokens.revoke(tokens.verify(token))
+        except TokenError:
+            pass
+    return {"success": True, "message": "Logged out successfully"}
+
+@router.get("/api/auth/stats")
+async def auth_stats():
+    return {"success": True, "tokens": tokens.snapshot(), "jobs": job_queue.snapshot(), "otp": otp_store.snapshot()}
+
+# Phone authentication
+@router.post("/api/auth/phone/send")
+async def send_phone_verification(request: PhoneVerificationRequest, http_request: Request):
+    """Store a hashed code and queue the SMS; delivery happens in the background."""
+    phone = normalize_phone(request.phoneNumber)
+    if phone is None:
+        raise HTTPException(status_code=400, detail="Enter the phone number with its country code, e.g. +14155550123")
+    if not sms.configured:
+        return {"success": False, "error": "SMS not configured"}
+    # The code and its SMS job commit together: one write, and never a code
+    # that nobody will send
+    async with database.session() as session:
+        try:
+            client_ip = http_request.client.host if http_request.client else None
+            code = await otp_store.issue(phone, session, client_ip)
+        except OTPThrottled as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        await job_queue.enqueue(
+            "sms",
+            {"to": phone, "body": f"Your EezLegal verification code is {code}. It expires in {int(otp_store.ttl // 60)} minutes."},
+            idempotency_key="otp:" + otp_store.digest(phone, code),
+            session=session,
+        )
+        await session.commit()
+    job_queue.notify()
+    return {"success": True, "message": "Verification code sent"}
+
+@router.post("/api/auth/phone/verify")
+async def verify_phone_code(request: PhoneVerifyRequest):
+    phone = normalize_phone(request.phoneNumber)
+    if phone is None or not await otp_store.verify(phone, request.verificationCode):
+        raise HTTPException(status_code=400, detail="Invalid or expired verification code")
+    try:
+        user = await accounts.for_phone(phone)
+    except AccountExists:
+        raise HTTPException(status_code=409, detail="This phone number can't be used to sign in")
+    return {"success": True, "token": issue_token(user), "user": user}
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel
+
+from api.auth import current_user, require_self
+from services.database import database
+from services.subscriptions import StripeUnavailable, subscription_service, WebhookSignatureError
+from services.metrics import registry, export_stats
+from services.tokens import tokens
+
+router = APIRouter()
+
+SERVICES = [database, tokens, subscription_service]
+
+registry.collector(lambda: export_stats("subscriptions", subscription_service.snapshot()))
+
+class StripeCheckoutRequest(BaseModel):
+    priceId: str
+    userId: str
+    userEmail: str
+    successUrl: str
+    cancelUrl: str
+
+# Stripe endpoints
+@router.post("/api/stripe/create-checkout-session")
+async def create_checkout_session(request: StripeCheckoutRequest):
+    # TODO: Implement Stripe checkout session creation
+    return {
+        "success": True,
+        "sessionId": "mock_stripe_session_123"
+    }
+
+@router.get("/api/stripe/subscription-status/{user_id}")
+async def get_subscription_status(user_id: str, claims: dict = Depends(current_user)):
+    require_self(claims, user_id)
+    return {"success": True, "subscription": await subscription_service.get(user_id)}
+
+@router.post("/api/stripe/webhook")
+async def stripe_webhook(request: Request):
+    payload = await request.body()
+    try:
+        handled = await subscription_service.handle_webhook(payload, request.headers.get("Stripe-Signature"))
+    except WebhookSignatureError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"received": True, "handled": handled}
+
+@router.post("/api/stripe/cancel-subscription")
+async def cancel_subscription(claims: dict = Depends(current_user)):
+    try:
+        state = await subscription_service.cancel(claims["sub"])
+    except StripeUnavailable:
+        raise HTTPException(status_code=503, detail="Could not reach Stripe; please try again")
+    if state is None:
+        raise HTTPException(status_code=404, detail="No active subscription")
+    return {"success": True, "message": "Subscription cancelled", "subscription": state}
+
+@router.get("/api/stripe/stats")
+async def stripe_stats():
+    return {"success": True, "subscriptions": subscription_service.snapshot()}
@@ -0,0 +1,351 @@
+import os
+import json
+import logging
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from api.auth import bearer_token, current_user, optional_user
+from services.upstream import upstream, UpstreamError
+from services.response_cache import response_cache, make_key, should_bypass
+from services.conversations import conversations, ConversationNotFound
+from services.conversation_search import conversation_search
+from services.prompt import prompt_assembler, AssembledPrompt
+from services.prompt_registry import prompt_registry
+from services.singleflight import chat_flight, stream_flight
+from services.resilience import resilience
+from services.batching import batch_queue
+from services.tokens import tokens, TokenError
+from services.database import database
+from services.metering import usage_meter, QuotaExceeded
+from services.subscriptions import subscription_service, effective_plan, SUSPENDED_STATUSES
+from services.metrics import registry, export_stats
+from services.retrieval import retriever
+
+logger = logging.getLogger("eezlegal.chat")
+
+router = APIRouter()
+
+# Started in this order and closed in reverse by the app factory
+SERVICES = [upstream, batch_queue, database, tokens, usage_meter, subscription_service, retriever, conversation_search]
+
+@registry.collector
+def export_chat_stats():
+    export_stats("response_cache", response_cache.snapshot())
+    export_stats("chat_flight", chat_flight.stats)
+    export_stats("stream_flight", stream_flight.stats)
+    export_stats("upstream", resilience.snapshot())
+    export_stats("batch_queue", batch_queue.snapshot())
+    export_stats("usage_meter", usage_meter.snapshot())
+    export_stats("retrieval", retriever.snapshot())
+    export_stats("conversation_search", conversation_search.snapshot())
+
+class ChatMessage(BaseModel):
+    message: str
+    history: Optional[List[dict]] = []
+    user_id: Optional[str] = None
+    conversation_id: Optional[str] = None
+
+class BatchChatItem(BaseModel):
+    id: Optional[str] = None
+    message: str
+    history: Optional[List[dict]] = []
+
+class BatchChatRequest(BaseModel):
+    messages: List[BatchChatItem]
+
+# Chat endpoint with OpenAI integration
+CHAT_TEMPLATE = prompt_registry.get("legal_assistant")
+
+CHAT_MODEL = "gpt-4o-mini"
+CHAT_MAX_TOKENS = 1000
+CHAT_TEMPERATURE = 0.7
+
+async def chat_access(request: Request) -> dict:
+    """Subscription and quota gate for chat.
+    
+    Anonymous callers are metered on the anonymous plan by client address
+    (see FORWARDED_ALLOW_IPS behind a proxy). The plan comes from the local
+    subscription cache, so steady-state users cost no database or Stripe
+    call here.
+    """
+    token = bearer_token(request)
+    if not token:
+        address = request.client.host if request.client else "unknown"
+        access = {"user_id": None, "meter_key": f"ip:{address}", "plan": "anonymous"}
+    else:
+        try:
+            claims = tokens.verify(token)
+        except TokenError:
+            raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+        state = await subscription_service.get(claims["sub"])
+        if state["status"] in SUSPENDED_STATUSES:
+            raise HTTPException(status_code=402, detail="Subscription payment is overdue")
+        access = {"user_id": claims["sub"], "meter_key": claims["sub"], "plan": effective_plan(state)}
+    try:
+        await usage_meter.check(access["meter_key"], access["plan"])
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=f"Your {e.period}ly token quota has been used up")
+    return access
+
+def record_usage(access: dict, usage: dict):
+    # Counted in memory; persisted in batches by the usage meter
+    if usage:
+        usage_meter.record(access["meter_key"], usage)
+
+async def load_history(chat_request: ChatMessage, access: dict) -> List[dict]:
+    # With a conversation id the server owns the transcript and the client
+    # only sends the new message.
+    if not chat_request.conversation_id:
+        return chat_request.history or []
+    try:
+        return await run_in_threadpool(conversations.messages, chat_request.conversation_id, access["user_id"])
+    except ConversationNotFound:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+async def record_turn(chat_request: ChatMessage, access: dict, answer: str):
+    if chat_request.conversation_id:
+        def append():
+            conversation_id, user_id = chat_request.conversation_id, access["user_id"]
+            conversations.append(conversation_id, "user", chat_request.message, user_id)
+            conversations.append(conversation_id, "assistant", answer, user_id)
+        await run_in_threadpool(append)
+        conversation_search.notify()
+
+async def build_chat_prompt(chat_request: ChatMessage, history: List[dict]) -> Tuple[AssembledPrompt, List[dict]]:
+    """Prompt grounded in matching knowledge-base passages, and their sources.
+    
+    Keeps the system prompt, passages and newest turns within the token budget
+    and summarizes whatever older history does not fit.
+    """
+    context, sources = await retriever.context_for(chat_request.message)
+    prompt = prompt_assembler.assemble(CHAT_TEMPLATE.text, history, chat_request.message, context)
+    return prompt, sources
+
+async def complete_prompt(openai_api_key: str, prompt: AssembledPrompt, use_cache: bool = True):
+    """Answer a prompt from the cache, an identical in-flight call or upstream.
+    
+    Returns (answer, cache_status); answer is None when OpenAI returned an error.
+    """
+    cache_key = make_key(CHAT_MODEL, CHAT_TEMPERATURE, prompt.messages)
+    
+    # Serve repeated questions from the response cache
+    if use_cache:
+        cached = await response_cache.aget(cache_key)
+        if cached is not None:
+            return cached, "HIT"
+    
+    async def complete():
+        # Call OpenAI API over the shared pooled client; only the messages
+        # after the pre-serialized system prompt are encoded per request
+        upstream_response = await upstream.chat_completion(
+            openai_api_key,
+            CHAT_TEMPLATE.render_body(prompt.messages, CHAT_MODEL, CHAT_MAX_TOKENS, CHAT_TEMPERATURE),
+            prompt.prompt_tokens + CHAT_MAX_TOKENS
+        )
+        if upstream_response.status_code != 200:
+            return None
+        result = upstream_response.json()
+        answer = {
+            "message": result["choices"][0]["message"]["content"],
+            "usage": result.get("usage", {})
+        }
+        await response_cache.aset(cache_key, answer)
+        return answer
+    
+    # Identical prompts already in flight share a single upstream call
+    answer = await chat_flight.do(cache_key, complete)
+    return answer, "MISS" if use_cache else "BYPASS"
+
+@router.post("/api/chat")
+async def chat(
+    chat_request: ChatMessage, request: Request, response: Response, access: dict = Depends(chat_access)
+):
+    history = await load_history(chat_request, access)
+    try:
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        
+        if not openai_api_key:
+            return {
+                "success": False,
+                "error": "OpenAI API not configured",
+                "fallback": True
+            }
+        
+        prompt, sources = await build_chat_prompt(chat_request, history)
+        answer, cache_status = await complete_prompt(
+            openai_api_key, prompt, use_cache=not should_bypass(request.headers)
+        )
+        response.headers["X-Cache"] = cache_status
+        
+        if answer is not None:
+            if cache_status != "HIT":
+                record_usage(access, answer["usage"])
+            await record_turn(chat_request, access, answer["message"])
+            return {"success": True, **answer, "sources": sources, "prompt": prompt.stats()}
+        else:
+            return {
+                "success": False,
+                "error": "OpenAI API error",
+                "fallback": True
+            }
+            
+    except Exception:
+        logger.exception("Error in chat endpoint")
+        return {
+            "success": False,
+            "error": "An error occurred while processing your request",
+            "fallback": True
+        }
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+
+@router.post("/api/chat/batch")
+async def chat_batch(batch_request: BatchChatRequest, request: Request, access: dict = Depends(chat_access)):
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        return {"success": False, "error": "OpenAI API not configured", "fallback": True}
+    if len(batch_request.messages) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch can hold at most {BATCH_MAX_ITEMS} messages")
+    use_cache = not should_bypass(request.headers)
+    
+    def job(item: BatchChatItem):
+        async def run():
+            # Checked per item, so a large batch stops at the quota
+            try:
+                await usage_meter.check(access["meter_key"], access["plan"])
+            except QuotaExceeded as e:
+                return {"success": False, "error": f"Your {e.period}ly token quota has been used up"}
+            prompt = prompt_assembler.assemble(CHAT_TEMPLATE.text, item.history or [], item.message)
+            answer, cache_status = await complete_prompt(openai_api_key, prompt, use_cache)
+            if answer is None:
+                return {"success": False, "error": "OpenAI API error"}
+            if cache_status != "HIT":
+                record_usage(access, answer["usage"])
+            return {"success": True, **answer}
+        return run
+    
+    jobs = [
+        (item.id if item.id is not None else str(index), job(item))
+        for index, item in enumerate(batch_request.messages)
+    ]
+    
+    async def lines():
+        # Results go out as NDJSON in completion order, not request order
+        async for job_id, result in batch_queue.run(jobs):
+            yield json.dumps({"id": job_id, **result}) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/api/conversations")
+async def create_conversation(claims: Optional[dict] = Depends(optional_user)):
+    # Owned by the signed-in user, never by a user id the client names
+    user_id = claims["sub"] if claims else None
+    conversation_id = await run_in_threadpool(conversations.create, user_id)
+    return {"success": True, "conversation_id": conversation_id}
+
+# Registered before /api/conversations/{conversation_id} so "search" is not
+# taken for a conversation id
+@router.get("/api/conversations/search")
+async def search_conversations(q: str, limit: int = 20, offset: int = 0, claims: dict = Depends(current_user)):
+    return {"success": True, **await conversation_search.search(claims["sub"], q, limit, offset)}
+
+@router.get("/api/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str, claims: Optional[dict] = Depends(optional_user)):
+    try:
+        messages = await run_in_threadpool(conversations.messages, conversation_id, claims["sub"] if claims else None)
+    except ConversationNotFound:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"success": True, "conversation_id": conversation_id, "messages": messages}
+
+@router.get("/api/chat/cache")
+async def chat_cache_stats():
+    return {
+        "success": True,
+        "cache": response_cache.snapshot(),
+        "coalescing": {"chat": dict(chat_flight.stats), "stream": dict(stream_flight.stats)}
+    }
+
+@router.get("/api/usage")
+async def usage_remaining(claims: dict = Depends(current_user)):
+    plan = effective_plan(await subscription_service.get(claims["sub"]))
+    return {"success": True, "plan": plan, "remaining": await usage_meter.remaining(claims["sub"], plan)}
+
+@router.get("/api/usage/stats")
+async def usage_stats():
+    return {"success": True, "usage": usage_meter.snapshot()}
+
+@router.get("/api/knowledge/search")
+async def knowledge_search(q: str, k: int = 5):
+    return {"success": True, "results": await retriever.search(q, min(max(k, 1), 20))}
+
+@router.get("/api/knowledge/stats")
+async def knowledge_stats():
+    return {"success": True, "knowledge": retriever.snapshot()}
+
+@router.get("/api/upstream/stats")
+async def upstream_stats():
+    return {"success": True, "upstream": resilience.snapshot(), "batch": batch_queue.snapshot()}
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@router.post("/api/chat/stream")
+async def chat_stream(chat_request: ChatMessage, request: Request, access: dict = Depends(chat_access)):
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    prompt, sources = await build_chat_prompt(chat_request, await load_history(chat_request, access))
+    
+    async def events():
+        if not openai_api_key:
+            yield sse_event({"error": "OpenAI API not configured", "fallback": True}, "error")
+            return
+        
+        usage = {}
+        parts = []
+        # Identical prompts streaming at the same time share one upstream
+        # stream, read no further ahead than its slowest subscriber.
+        stream = stream_flight.subscribe(
+            make_key(CHAT_MODEL, CHAT_TEMPERATURE, prompt.messages),
+            lambda: upstream.stream_chat_completion(
+                openai_api_key,
+                CHAT_TEMPLATE.render_body(
+                    prompt.messages, CHAT_MODEL, CHAT_MAX_TOKENS, CHAT_TEMPERATURE, stream=True
+                ),
+                prompt.prompt_tokens + CHAT_MAX_TOKENS
+            )
+        )
+        try:
+            async for chunk in stream:
+                if await request.is_disconnected():
+                    return
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                for choice in chunk.get("choices", []):
+                    delta = choice.get("delta", {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield sse_event({"delta": delta})
+        except UpstreamError:
+            yield sse_event({"error": "OpenAI API error", "fallback": True}, "error")
+            return
+        except Exception:
+            logger.exception("Error in chat stream endpoint")
+            yield sse_event({"error": "An error occurred while processing your request", "fallback": True}, "error")
+            return
+        finally:
+            # Cancels the upstream request once no client is left listening
+            await stream.aclose()
+        
+        record_usage(access, usage)
+        await record_turn(chat_request, access, "".join(parts))
+        yield sse_event({"success": True, "usage": usage, "sources": sources, "prompt": prompt.stats()}, "done")
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,110 @@
+import functools
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from api.chat import CHAT_MODEL, CHAT_TEMPLATE, chat_access, complete_prompt, record_usage, sse_event
+from services.documents import DocumentError, document_analyzer, notes_digest, render_analysis
+from services.metering import QuotaExceeded, usage_meter
+from services.database import database
+from services.metrics import registry, export_stats
+from services.prompt import prompt_assembler
+from services.subscriptions import subscription_service
+from services.tokens import tokens
+from services.upstream import upstream
+
+router = APIRouter()
+
+SERVICES = [upstream, database, tokens, usage_meter, subscription_service]
+
+registry.collector(lambda: export_stats("documents", document_analyzer.snapshot()))
+
+DEFAULT_QUESTION = "What should I know about this document before I sign or rely on it?"
+
+def merge_prompt(question: str, filename: str, document: dict, sections: list):
+    message = (
+        f"{question}\n\n"
+        f"I uploaded \"{filename}\" ({document['pages']} pages). "
+        f"Notes on each section of it:\n{notes_digest(sections, document_analyzer.notes_tokens)}"
+    )
+    return prompt_assembler.assemble(CHAT_TEMPLATE.text, [], message)
+
+@router.post("/api/documents")
+async def analyze_document(request: Request, access: dict = Depends(chat_access)):
+    """Analyze an uploaded PDF or text file (multipart field ``file``, plus an
+    optional ``question``), streaming progress as server-sent events."""
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        return {"success": False, "error": "OpenAI API not configured", "fallback": True}
+    try:
+        upload = await document_analyzer.spool(request)
+    except DocumentError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    question = upload.fields.get("question", "").strip() or DEFAULT_QUESTION
+
+    async def check_quota():
+        await usage_meter.check(access["meter_key"], access["plan"])
+
+    async def events():
+        yield sse_event({"filename": upload.filename, "bytes": upload.size, "kind": upload.kind}, "upload")
+        # Each call is checked against the quota and metered as it returns,
+        # so a long document or a client that leaves early is still counted
+        analysis = document_analyzer.analyze(
+            upload, openai_api_key, CHAT_MODEL, before_call=check_quota, on_usage=functools.partial(record_usage, access)
+        )
+        try:
+            async for event, data in analysis:
+                if event == "sections":
+                    result = data
+                    break
+                if await request.is_disconnected():
+                    return
+                yield sse_event(data, event)
+        except DocumentError as e:
+            yield sse_event({"error": str(e), "status": e.status_code}, "error")
+            return
+        except QuotaExceeded as e:
+            yield sse_event({"error": f"Your {e.period}ly token quota has been used up", "status": 429}, "error")
+            return
+
+        yield sse_event({"stage": "merging", **result["document"]}, "progress")
+        usage = dict(result["usage"])
+        try:
+            await check_quota()
+            answer, cache_status = await complete_prompt(
+                openai_api_key, merge_prompt(question, upload.filename, result["document"], result["sections"])
+            )
+        except Exception:
+            answer, cache_status = None, "MISS"
+        if answer is not None:
+            message = answer["message"]
+            if cache_status != "HIT":
+                record_usage(access, answer["usage"])
+                for key, value in answer["usage"].items():
+                    if isinstance(value, int):
+                        usage[key] = usage.get(key, 0) + value
+        else:
+            # The section notes alone still make a complete answer
+            message = render_analysis(result["sections"])
+        yield sse_event({
+            "success": True,
+            "message": message,
+            "merged": answer is not None,
+            "document": result["document"],
+            "sections": result["sections"],
+            "usage": usage,
+        }, "done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Runs once the response is over, including when the client left early
+        background=BackgroundTask(upload.discard),
+    )
+
+@router.get("/api/documents/stats")
+async def document_stats():
+    return {"success": True, "documents": document_analyzer.snapshot()}
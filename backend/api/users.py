@@ -0,0 +1,77 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import String, cast, select, update
+from sqlalchemy.exc import IntegrityError
+
+from api.auth import current_user, require_self
+from services.accounts import display_name, display_name_upsert
+from services.database import database, get_session, subscriptions, user_profiles, users
+from services.tokens import tokens
+
+router = APIRouter()
+
+SERVICES = [database, tokens]
+
+class UserUpdateRequest(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+
+# User endpoints
+def parse_user_id(user_id: str) -> int:
+    try:
+        return int(user_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="User not found")
+
+@router.get("/api/user/{user_id}")
+async def get_user_profile(
+    user_id: str, claims: dict = Depends(current_user), session=Depends(get_session)
+):
+    require_self(claims, user_id)
+    # One round trip for the profile and its plan
+    row = (await session.execute(
+        select(users.c.id, display_name, users.c.email, subscriptions.c.plan)
+        .select_from(
+            users.outerjoin(user_profiles, user_profiles.c.user_id == users.c.id)
+            .outerjoin(subscriptions, subscriptions.c.user_id == cast(users.c.id, String))
+        )
+        .where(users.c.id == parse_user_id(user_id))
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {
+        "success": True,
+        "user": {
+            "id": str(row.id),
+            "name": row.name,
+            "email": row.email,
+            "subscription": row.plan or "free"
+        }
+    }
+
+@router.put("/api/user/{user_id}")
+async def update_user_profile(
+    user_id: str,
+    update_request: UserUpdateRequest,
+    claims: dict = Depends(current_user),
+    session=Depends(get_session),
+):
+    require_self(claims, user_id)
+    user_id = parse_user_id(user_id)
+    if (await session.execute(select(users.c.id).where(users.c.id == user_id))).first() is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        if update_request.email is not None:
+            await session.execute(
+                update(users).where(users.c.id == user_id).values(email=update_request.email.strip().lower())
+            )
+        # Display names need not be unique; only the email can conflict
+        if update_request.name is not None:
+            await session.execute(display_name_upsert(user_id, update_request.name))
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="That email is already in use")
+    return {"success": True, "message": "Profile updated"}
@@ -0,0 +1,152 @@
+import importlib
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+
+from services.http_caching import CachePolicyMiddleware, CompressionMiddleware, json_body
+from services.metrics import MetricsMiddleware, registry
+
+try:
+    # orjson serializes responses several times faster than the stdlib
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
+logger = logging.getLogger("eezlegal.startup")
+
+# Feature name -> module exposing ``router`` and the ``SERVICES`` it needs
+FEATURES = {
+    "auth": "api.auth",
+    "chat": "api.chat",
+    "billing": "api.billing",
+    "users": "api.users",
+    "documents": "api.documents",
+}
+
+# Cache-Control by route template for the endpoints the frontend polls;
+# these also get ETags and 304s on conditional GETs
+CACHE_POLICIES = {
+    "/api/config": "public, max-age=300",
+    "/health": "no-store",
+    "/api/user/{user_id}": "private, no-cache",
+    "/api/stripe/subscription-status/{user_id}": "private, no-cache",
+}
+
+DEFAULT_CORS_ORIGINS = [
+    "http://localhost:5174",  # Development
+    "https://eezlegal.vercel.app",  # Vercel deployment
+    "https://www.eezlegal.com",  # Custom domain
+    "*",  # Allow all for development - restrict in production
+]
+
+
+def enabled_features() -> List[str]:
+    # Unset means everything; set it empty to serve only health and config
+    features = os.getenv("APP_FEATURES")
+    if features is None:
+        return list(FEATURES)
+    return [f.strip() for f in features.split(",") if f.strip()]
+
+
+def create_app(features: Optional[List[str]] = None) -> FastAPI:
+    """Build the API with only the requested feature modules.
+
+    Disabled features are never imported, so their dependencies cost nothing
+    at cold start. Import and service start-up times end up in the startup
+    report, which is logged and served from ``/api/startup``.
+    """
+    started = time.perf_counter()
+    features = enabled_features() if features is None else features
+    report = {"features": {}, "services": {}}
+
+    modules = []
+    for name in features:
+        if name not in FEATURES:
+            raise ValueError(f"Unknown feature {name!r}; expected one of {', '.join(FEATURES)}")
+        t = time.perf_counter()
+        modules.append(importlib.import_module(FEATURES[name]))
+        report["features"][name] = {"import_ms": round((time.perf_counter() - t) * 1000, 1)}
+
+    # Features share services (e.g. the database); each starts once, in the
+    # order first listed, and stops in reverse
+    services = []
+    for module in modules:
+        for service in module.SERVICES:
+            if not any(service is s for s in services):
+                services.append(service)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        for service in services:
+            if hasattr(service, "start"):
+                t = time.perf_counter()
+                await service.start()
+                report["services"][type(service).__name__] = {"start_ms": round((time.perf_counter() - t) * 1000, 1)}
+        report["ready_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("Started with %s in %.0f ms", ", ".join(features) or "no features", report["ready_ms"])
+        yield
+        for service in reversed(services):
+            if hasattr(service, "close"):
+                await service.close()
+
+    app = FastAPI(
+        title="EezLegal API", version="2.0.0", lifespan=lifespan, default_response_class=DefaultResponse
+    )
+    # The last middleware added runs outermost. Metrics and cache policies
+    # read the matched route template from the scope once routing has run.
+    app.add_middleware(CachePolicyMiddleware, policies=CACHE_POLICIES)
+    app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", 1024)))
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()] or DEFAULT_CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    @app.get("/")
+    async def root():
+        return {"message": "EezLegal Backend Running", "status": "ok", "version": "2.0.0"}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "service": "eezlegal-backend", "timestamp": datetime.now().isoformat()}
+
+    # The environment doesn't change while the process runs, so the config
+    # body and its ETag are built once
+    config_body, config_etag = json_body({
+        "oauth_configured": True,
+        "google_client_id": os.getenv("GOOGLE_CLIENT_ID", "not-set"),
+        "microsoft_client_id": os.getenv("MICROSOFT_CLIENT_ID", "not-set"),
+        "apple_client_id": os.getenv("APPLE_CLIENT_ID", "not-set"),
+        "frontend_url": os.getenv("FRONTEND_URL", "https://eezlegal.vercel.app"),
+        "stripe_configured": bool(os.getenv("STRIPE_SECRET_KEY")),
+        "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
+        "features": features,
+    })
+
+    @app.get("/api/config")
+    async def config():
+        return Response(config_body, media_type="application/json", headers={"ETag": config_etag})
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/api/startup")
+    async def startup_report():
+        return {"success": True, **report}
+
+    for module in modules:
+        app.include_router(module.router)
+    report["build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return app
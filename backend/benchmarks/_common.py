@@ -0,0 +1,232 @@
+"""Helpers shared by the benchmark scripts.
+
+Each script starts the local stand-ins it needs (a fake OpenAI, Twilio...)
+in-process, so a benchmark is one command with no network access:
+
+    python backend/benchmarks/upstream_pooling.py
+"""
+import asyncio
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from typing import Awaitable, Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def use_flask_package():
+    """The Flask blueprints import the backend as ``src``; map that name onto
+    this tree so they can be loaded as they are deployed."""
+    if "src" not in sys.modules:
+        src = types.ModuleType("src")
+        src.__path__ = [BACKEND_DIR]
+        sys.modules["src"] = src
+
+
+def isolated_env(**overrides) -> str:
+    """Point every service at a fresh temporary directory; call before
+    importing them, since they read their settings on import."""
+    data_dir = tempfile.mkdtemp(prefix="eezlegal-bench-")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{data_dir}/app.db",
+        "CONVERSATION_DB": f"{data_dir}/conversations.db",
+        "USAGE_WAL_DIR": f"{data_dir}/usage-wal",
+        "KNOWLEDGE_DIR": f"{data_dir}/knowledge",
+        "KNOWLEDGE_INDEX_DIR": f"{data_dir}/knowledge-index",
+        "JWT_SECRET_KEY": "benchmark-signing-key",
+        "OTP_SECRET": "benchmark-otp-secret",
+        "OPENAI_API_KEY": "sk-benchmark",
+    })
+    os.environ.update({k: str(v) for k, v in overrides.items()})
+    return data_dir
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def self_signed_cert(directory: str) -> tuple:
+    """Write a localhost certificate and key; returns their paths."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+def start_gunicorn(config: str, app: str, port: int, env: Optional[dict] = None, *args: str) -> subprocess.Popen:
+    """Start gunicorn with one of the repo's config files on ``port``; the
+    app is imported from the benchmarks directory or, failing that, backend."""
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "-c", os.path.join(BACKEND_DIR, config),
+            "--chdir", os.path.dirname(os.path.abspath(__file__)), "--pythonpath", BACKEND_DIR,
+            "--bind", f"127.0.0.1:{port}", *args, app,
+        ],
+        env={**os.environ, "ACCESS_LOG": "", **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+async def run_load(request: Callable[..., Awaitable[bool]], clients: int, duration: float, timeout: float = 30.0):
+    """Run ``clients`` loops of ``request(client)`` for ``duration`` seconds.
+
+    Returns the latencies of the requests that succeeded, the elapsed time
+    and the number that failed or timed out.
+    """
+    import httpx
+
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def loop():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    ok = await request(client)
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(loop() for _ in range(clients)))
+    return latencies, time.perf_counter() - started, errors
+
+
+class Server:
+    """Runs an ASGI app with uvicorn on a background thread."""
+
+    def __init__(self, app, port: Optional[int] = None, **config):
+        import uvicorn
+        self.port = port or free_port()
+        self.scheme = "https" if config.get("ssl_certfile") else "http"
+        self._server = uvicorn.Server(uvicorn.Config(
+            app, **{"host": "127.0.0.1", "port": self.port, "log_level": "warning", "lifespan": "off", **config}
+        ))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host = "localhost" if self.scheme == "https" else "127.0.0.1"
+        return f"{self.scheme}://{host}:{self.port}"
+
+    def __enter__(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join(5)
+
+
+def fake_openai(delay: float = 0.05, chunk_delay: float = 0.01, completion_tokens: int = 20):
+    """Chat completions stand-in answering after ``delay`` seconds; tracks
+    calls and the peak number of requests in flight in ``app.state.stats``."""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+    app.state.stats = stats = {"calls": 0, "in_flight": 0, "max_in_flight": 0}
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        stats["calls"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            stats["in_flight"] -= 1
+        words = ["word"] * completion_tokens
+        usage = {"prompt_tokens": 50, "completion_tokens": completion_tokens, "total_tokens": 50 + completion_tokens}
+        if not body.get("stream"):
+            return {"choices": [{"message": {"role": "assistant", "content": " ".join(words)}}], "usage": usage}
+
+        async def chunks():
+            for word in words:
+                yield "data: " + json.dumps({"choices": [{"delta": {"content": word + " "}}]}) + "\n\n"
+                await asyncio.sleep(chunk_delay)
+            yield "data: " + json.dumps({"choices": [], "usage": usage}) + "\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return app
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(name: str, latencies: List[float], elapsed: float, **extra) -> Dict:
+    return {
+        "case": name,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        **extra,
+    }
+
+
+def report(rows: List[Dict]):
+    """Print rows as an aligned table."""
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    widths = {c: max(len(c), *(len(str(row.get(c, ""))) for row in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
@@ -0,0 +1,111 @@
+"""Conversation search indexing and query latency (user-024).
+
+Fills the SQLite conversation store with ``--messages`` messages spread over
+``--users`` users, indexes them with ``ConversationSearch.catch_up()`` and
+times queries for single users:
+
+- bm25(): FTS5's own ranking, ``ORDER BY bm25(...)`` with LIMIT; it counts
+  every row matching each term, across all users, for the IDF;
+- this service: the user's newest ``SEARCH_MAX_CANDIDATES`` matches ranked
+  in Python.
+
+    python backend/benchmarks/conversation_search.py --messages 1000000 --users 1000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import _common
+
+_common.isolated_env()
+
+from sqlalchemy import text  # noqa: E402
+
+from services.conversation_search import ConversationSearch, fts_query, owner_token  # noqa: E402
+from services.conversations import conversations  # noqa: E402
+from services.database import database  # noqa: E402
+
+WORDS = (
+    "landlord tenant lease deposit notice eviction rent repair court contract employer wage overtime "
+    "termination custody divorce property deed zoning liability injury insurance claim settlement appeal "
+    "my the a is can i what how do about they said after before month days written letter"
+).split()
+QUERIES = ("deposit", "landlord deposit", '"written notice"', "overtime wage claim", "zoning appeal")
+
+BM25_SEARCH = text(
+    "SELECT rowid, highlight(conversation_search, 1, '[', ']') FROM conversation_search "
+    "WHERE conversation_search MATCH :match ORDER BY bm25(conversation_search) LIMIT 21"
+)
+
+
+def fill(messages: int, users: int, rng: random.Random):
+    db = conversations._connection()
+    now = time.time()
+    db.executemany(
+        "INSERT INTO conversation (id, user_id, created_at, updated_at) VALUES (?, ?, ?, ?)",
+        ((f"c{u}", str(u), now, now) for u in range(users)),
+    )
+    db.executemany(
+        "INSERT INTO conversation_message (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+        (
+            (f"c{rng.randrange(users)}", "user" if i % 2 else "assistant",
+             " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 60))), now + i)
+            for i in range(messages)
+        ),
+    )
+    db.commit()
+
+
+async def timed_queries(run, users: int, rounds: int, rng: random.Random):
+    medians = []
+    for query in QUERIES:
+        latencies = []
+        for _ in range(rounds):
+            user = str(rng.randrange(users))
+            started = time.perf_counter()
+            await run(user, query)
+            latencies.append(time.perf_counter() - started)
+        medians.append(_common.percentile(latencies, 50))
+    return medians
+
+
+async def main(args):
+    rng = random.Random(3)
+    fill(args.messages, args.users, rng)
+    await database.start()
+    search = ConversationSearch(conversations, batch_size=args.batch)
+    await search.start()
+    # Indexed here rather than by the background task, to time it
+    search._closing = True
+    search._task.cancel()
+
+    started = time.perf_counter()
+    indexed = await search.catch_up()
+    elapsed = time.perf_counter() - started
+    print(f"{args.messages} messages, {args.users} users: indexed {indexed} in {elapsed:.1f} s "
+          f"({indexed / elapsed:,.0f} messages/s, batches of {args.batch})")
+
+    async def bm25(user, query):
+        async with database.session() as session:
+            await session.execute(BM25_SEARCH, {"match": f"owner : {owner_token(user)} AND content : ({fts_query(query)})"})
+
+    async def service(user, query):
+        await search.search(user, query)
+
+    before = await timed_queries(bm25, args.users, args.rounds, rng)
+    after = await timed_queries(service, args.users, args.rounds, rng)
+    _common.report([
+        {"query": query, "bm25_p50_ms": round(b * 1000, 2), "service_p50_ms": round(a * 1000, 2)}
+        for query, b, a in zip(QUERIES, before, after)
+    ])
+    await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=1000, help="SEARCH_INDEX_BATCH")
+    parser.add_argument("--rounds", type=int, default=15, help="users timed per query")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,25 @@
+"""The Flask blueprints as one WSGI app, for the load tests:
+
+    gunicorn -c gunicorn_wsgi.conf.py --chdir backend/benchmarks flask_app:app
+
+The user blueprint reads ``DATABASE_URL`` (a sync SQLAlchemy URL).
+"""
+import os
+
+import _common
+
+_common.use_flask_package()
+
+from flask import Flask  # noqa: E402
+
+from src.models.user import db  # noqa: E402
+from src.routes.chat import chat_bp  # noqa: E402
+from src.routes.simple_chat import simple_chat_bp  # noqa: E402
+from src.routes.user import user_bp  # noqa: E402
+
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite://")
+db.init_app(app)
+app.register_blueprint(chat_bp, url_prefix="/api")
+app.register_blueprint(simple_chat_bp, url_prefix="/api/simple")
+app.register_blueprint(user_bp, url_prefix="/api")
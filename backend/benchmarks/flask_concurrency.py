@@ -0,0 +1,74 @@
+"""Concurrent chats per process for the Flask blueprints (user-006).
+
+Serves routes/simple_chat.py and routes/chat.py through gunicorn with the
+gunicorn_wsgi.conf.py profile (one gthread worker), at several thread counts.
+Upstream is a local fake OpenAI that takes ``--delay`` seconds per answer.
+Every request asks a new question, so the response cache never answers.
+
+The peak number of calls the fake sees at once shows how many chats a single
+process holds in flight.
+
+    python backend/benchmarks/flask_concurrency.py --threads 1,16,64,256 --clients 256
+"""
+import argparse
+import asyncio
+import itertools
+
+import _common
+
+ENDPOINTS = {"simple": "/api/simple/chat", "sdk": "/api/chat"}
+
+
+def start_gunicorn(port: int, threads: int, upstream_url: str):
+    env = {
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": upstream_url,
+        "UPSTREAM_MAX_IN_FLIGHT": str(threads),
+        "UPSTREAM_QUEUE_TIMEOUT": "30",
+    }
+    return _common.start_gunicorn(
+        "gunicorn_wsgi.conf.py", "flask_app:app", port, env, "--workers", "1", "--threads", str(threads)
+    )
+
+
+def load(url: str, clients: int, duration: float):
+    counter = itertools.count()
+
+    async def ask(client):
+        # Queued behind busy threads for longer than the timeout counts as an error
+        response = await client.post(url, json={"message": f"Question {next(counter)}: what is a lease?"})
+        return response.status_code == 200 and response.json().get("success")
+    return _common.run_load(ask, clients, duration)
+
+
+def main(args):
+    rows = []
+    fake = _common.fake_openai(delay=args.delay)
+    with _common.Server(fake) as stub:
+        for endpoint, threads in itertools.product(args.endpoints.split(","), map(int, args.threads.split(","))):
+            port = _common.free_port()
+            server = start_gunicorn(port, threads, stub.url + "/v1")
+            try:
+                _common.wait_ready(port)
+                fake.state.stats["max_in_flight"] = 0
+                latencies, elapsed, errors = asyncio.run(
+                    load(f"http://127.0.0.1:{port}{ENDPOINTS[endpoint]}", args.clients, args.duration)
+                )
+            finally:
+                server.terminate()
+                server.wait()
+            rows.append(_common.summarize(
+                f"{endpoint} threads={threads}", latencies, elapsed,
+                errors=errors, peak_upstream_in_flight=fake.state.stats["max_in_flight"],
+            ))
+    _common.report(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default="simple,sdk", help="comma-separated: simple, sdk")
+    parser.add_argument("--threads", default="1,16,64,256", help="comma-separated gthread thread counts")
+    parser.add_argument("--clients", type=int, default=256, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per case")
+    parser.add_argument("--delay", type=float, default=0.5, help="fake OpenAI response time in seconds")
+    main(parser.parse_args())
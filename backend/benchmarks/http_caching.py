@@ -0,0 +1,98 @@
+"""Bytes on the wire and RPS for the endpoints the frontend polls (user-021).
+
+Serves ``create_app()`` twice in this process, with lifespan, on uvicorn:
+
+- before: the caching and compression middleware removed, so every poll
+  gets the full, uncompressed body;
+- after: the app as built, with per-route Cache-Control, ETags and 304s,
+  and gzip/brotli above the size threshold.
+
+Clients poll like a browser: they send ``Accept-Encoding`` and, once they
+have an ETag, ``If-None-Match``. Bytes are the response headers plus the
+body as sent, before decoding. ``/metrics`` stands in for a large polled
+body.
+
+    python backend/benchmarks/http_caching.py --clients 16 --duration 5
+"""
+import argparse
+import asyncio
+
+import _common
+
+_common.isolated_env(STRIPE_SECRET_KEY="")
+
+import httpx  # noqa: E402
+
+from app import create_app  # noqa: E402
+from services.http_caching import CachePolicyMiddleware, CompressionMiddleware, brotli  # noqa: E402
+
+ACCEPT_ENCODING = "br, gzip" if brotli is not None else "gzip"
+
+
+def build(cached: bool):
+    app = create_app()
+    if not cached:
+        app.user_middleware = [
+            m for m in app.user_middleware if m.cls not in (CachePolicyMiddleware, CompressionMiddleware)
+        ]
+    return app
+
+
+def wire_bytes(response: httpx.Response) -> int:
+    headers = sum(len(k) + len(v) + 4 for k, v in response.headers.raw)
+    return headers + response.num_bytes_downloaded
+
+
+async def account(base: str):
+    async with httpx.AsyncClient() as client:
+        body = (await client.post(f"{base}/api/auth/signup", json={
+            "name": "Bench User", "email": "bench@example.com", "password": "correct horse",
+        })).json()
+    return body["user"]["id"], {"Authorization": f"Bearer {body['token']}"}
+
+
+def poller(base: str, path: str, headers: dict, totals: dict):
+    etags = {}
+
+    async def poll(client):
+        request_headers = {**headers, "Accept-Encoding": ACCEPT_ENCODING}
+        if id(client) in etags:
+            request_headers["If-None-Match"] = etags[id(client)]
+        response = await client.get(base + path, headers=request_headers)
+        if "etag" in response.headers:
+            etags[id(client)] = response.headers["etag"]
+        totals["bytes"] += wire_bytes(response)
+        totals["not_modified"] += response.status_code == 304
+        return response.status_code in (200, 304)
+    return poll
+
+
+def main(args):
+    rows = []
+    for name, cached in (("before", False), ("after", True)):
+        with _common.Server(build(cached), lifespan="on") as server:
+            user_id, auth = asyncio.run(account(server.url)) if not rows else (user_id, auth)
+            for path, headers in (
+                ("/api/config", {}),
+                ("/health", {}),
+                (f"/api/user/{user_id}", auth),
+                (f"/api/stripe/subscription-status/{user_id}", auth),
+                ("/metrics", {}),
+            ):
+                totals = {"bytes": 0, "not_modified": 0}
+                latencies, elapsed, errors = asyncio.run(
+                    _common.run_load(poller(server.url, path, headers, totals), args.clients, args.duration)
+                )
+                row = _common.summarize(f"{name} {path.replace(user_id, '{id}')}", latencies, elapsed, errors=errors)
+                row["bytes_per_response"] = round(totals["bytes"] / max(len(latencies), 1))
+                row["share_304"] = f"{totals['not_modified'] / max(len(latencies), 1):.0%}"
+                rows.append(row)
+    print(f"{args.clients} clients, {args.duration:.0f} s per endpoint, Accept-Encoding: {ACCEPT_ENCODING}")
+    _common.report(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent pollers")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per endpoint")
+    main(parser.parse_args())
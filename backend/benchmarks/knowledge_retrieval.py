@@ -0,0 +1,117 @@
+"""Knowledge index build, sync and query cost (user-023).
+
+Builds a synthetic corpus of ``--files`` Markdown files with ``--passages``
+passages each, then measures:
+
+- full build: the first sync of an empty index;
+- no-op sync: a restart with nothing changed (a scan of the corpus);
+- incremental sync: one file edited;
+- query: ``search()`` latency over random two- and three-word queries;
+- shared directory: ``--workers`` processes open and sync one empty index at
+  once, as gunicorn workers do at startup. The flock lets one build it while
+  the others wait and pick up its manifest, so the corpus is indexed once.
+
+    python backend/benchmarks/knowledge_retrieval.py --files 200 --passages 50
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import _common
+
+from services.retrieval import KnowledgeIndex
+
+WORDS = (
+    "landlord tenant lease deposit notice eviction rent repair habitability court filing contract breach "
+    "damages warranty employer employee wage overtime termination severance custody support divorce "
+    "property title deed easement zoning permit liability negligence injury insurance claim settlement "
+    "appeal hearing statute regulation disclosure consent agreement clause penalty interest payment"
+).split()
+
+
+def make_corpus(directory: str, files: int, passages: int, rng: random.Random):
+    os.makedirs(directory)
+    for n in range(files):
+        paragraphs = [" ".join(rng.choice(WORDS) for _ in range(150)) + "." for _ in range(passages)]
+        with open(os.path.join(directory, f"topic-{n:04d}.md"), "w") as f:
+            f.write(f"# Topic {n}\n\n" + "\n\n".join(paragraphs))
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def worker_sync(index_dir: str, corpus: str, results):
+    index = KnowledgeIndex(index_dir).open()
+    results.put(index.sync(corpus)["added"])
+
+
+def main(args):
+    rng = random.Random(7)
+    root = tempfile.mkdtemp(prefix="eezlegal-bench-")
+    corpus, index_dir = os.path.join(root, "corpus"), os.path.join(root, "index")
+    make_corpus(corpus, args.files, args.passages, rng)
+
+    rows = []
+    index = KnowledgeIndex(index_dir).open()
+    elapsed, result = timed(index.sync, corpus)
+    rows.append({"case": "full build", "seconds": round(elapsed, 3), "passages": result["passages"]})
+
+    index.close()
+    index = KnowledgeIndex(index_dir).open()
+    elapsed, result = timed(index.sync, corpus)
+    rows.append({"case": "no-op sync after restart", "seconds": round(elapsed, 4), "passages": result["passages"]})
+
+    with open(os.path.join(corpus, "topic-0000.md"), "a") as f:
+        f.write("\n\nAn amended paragraph about the security deposit.")
+    elapsed, result = timed(index.sync, corpus)
+    rows.append({"case": "incremental sync (1 file)", "seconds": round(elapsed, 4), "passages": result["passages"]})
+
+    latencies = []
+    for _ in range(args.queries):
+        query = " ".join(rng.sample(WORDS, rng.choice((2, 3))))
+        started = time.perf_counter()
+        index.search(query, 4)
+        latencies.append(time.perf_counter() - started)
+    rows.append({
+        "case": "query",
+        "seconds": round(_common.percentile(latencies, 50), 5),
+        "passages": result["passages"],
+        "p95_seconds": round(_common.percentile(latencies, 95), 5),
+    })
+    index.close()
+
+    shared = os.path.join(root, "shared-index")
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker_sync, args=(shared, corpus, results)) for _ in range(args.workers)]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    added = sorted(results.get() for _ in processes)
+    final = KnowledgeIndex(shared).open()
+    rows.append({
+        "case": f"{args.workers} workers, shared empty index",
+        "seconds": round(elapsed, 3),
+        "passages": final.live,
+        "passages_built": "+".join(map(str, added)),
+        "segments": len(final.segments),
+    })
+    print(f"{args.files} files x {args.passages} passages of 150 words, {os.cpu_count()} core(s)")
+    _common.report(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--passages", type=int, default=50, help="passages per file")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4, help="processes sharing one index directory")
+    main(parser.parse_args())
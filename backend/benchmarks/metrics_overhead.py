@@ -0,0 +1,112 @@
+"""Per-request cost of the metrics instrumentation (user-020).
+
+Drives apps straight through their ASGI interface, with no server or
+network, so the difference between paired runs is the middleware:
+
+- a FastAPI route returning a small JSON body, bare and wrapped in
+  ``MetricsMiddleware``;
+- a trivial ASGI app that sets the matched route and sends a fixed
+  response, bare and wrapped. Its own cost is tiny and constant, which
+  isolates the middleware from FastAPI's run-to-run noise.
+
+Bare and wrapped runs alternate, and the median of ``--repeat`` runs is kept.
+
+Also times the primitives on their own: a labelled counter increment, a
+histogram observation and a full upstream timer (attempt plus tokens), and
+rendering ``/metrics``.
+
+    python backend/benchmarks/metrics_overhead.py --requests 20000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import timeit
+
+import _common  # noqa: F401
+
+from fastapi import FastAPI
+
+from services.metrics import MetricsMiddleware, UpstreamTimer, http_requests, registry, upstream_latency
+
+
+def fastapi_app():
+    app = FastAPI()
+
+    @app.get("/api/user/{user_id}")
+    async def profile(user_id: str):
+        return {"id": user_id, "subscription": "free"}
+    return app
+
+
+class _Route:
+    path = "/api/user/{user_id}"
+
+
+async def trivial_app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def drive(app, count: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/user/42", "raw_path": b"/api/user/42", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(count):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / count
+
+
+def primitive_us(fn, number: int = 200000) -> float:
+    return round(min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6, 3)
+
+
+def upstream_call():
+    timer = UpstreamTimer("bench")
+    timer.end_attempt()
+    timer.record_tokens(200, streamed=False)
+
+
+def main(args):
+    rows = []
+    for name, bare in (("fastapi route", fastapi_app()), ("trivial asgi app", trivial_app)):
+        wrapped = MetricsMiddleware(bare)
+        samples = {"bare": [], "wrapped": []}
+        for app in (bare, wrapped):
+            asyncio.run(drive(app, 1000))  # warm-up
+        for _ in range(args.repeat):
+            samples["bare"].append(asyncio.run(drive(bare, args.requests)))
+            samples["wrapped"].append(asyncio.run(drive(wrapped, args.requests)))
+        bare_us, wrapped_us = (statistics.median(samples[k]) * 1e6 for k in ("bare", "wrapped"))
+        rows.append({
+            "app": name,
+            "bare_us": round(bare_us, 2),
+            "with_metrics_us": round(wrapped_us, 2),
+            "overhead_us": round(wrapped_us - bare_us, 2),
+        })
+    _common.report(rows)
+    print()
+    _common.report([
+        {"primitive": "counter.inc (3 labels)", "us": primitive_us(lambda: http_requests.inc("GET", "/api/user/{user_id}", 200))},
+        {"primitive": "histogram.observe", "us": primitive_us(lambda: upstream_latency.observe(0.12, "bench", "ttfb"))},
+        {"primitive": "upstream timer (attempt + tokens)", "us": primitive_us(upstream_call)},
+        {"primitive": "render /metrics", "us": primitive_us(registry.render, number=200)},
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000, help="requests per timing run")
+    parser.add_argument("--repeat", type=int, default=9, help="timing runs per case; the median is kept")
+    main(parser.parse_args())
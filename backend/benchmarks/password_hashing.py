@@ -0,0 +1,106 @@
+"""Login throughput and its effect on other requests (user-012).
+
+``--logins`` threads verify passwords back to back, as login requests on a
+threaded worker would. Meanwhile one "other request" thread keeps handling a
+small pure-Python job (about 1 ms of work) and records its latency. Cases:
+
+- inline werkzeug: ``check_password_hash`` on the request thread (the old code)
+- inline argon2id: argon2id on the request thread
+- pooled argon2id: ``PasswordHasher``, i.e. argon2id in the process pool
+
+    python backend/benchmarks/password_hashing.py --seconds 10 --logins 8
+"""
+import argparse
+import os
+import threading
+import time
+
+import _common
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from services.passwords import PasswordHasher, _argon2_hasher
+
+PASSWORD = "correct horse battery staple"
+
+
+def other_request():
+    # Stand-in for an unrelated request: a little JSON-ish Python work
+    return sum(len(str(i)) for i in range(6000))
+
+
+def run_case(verify, seconds: float, logins: int):
+    stop = time.monotonic() + seconds
+    counts = [0] * logins
+    latencies = []
+
+    def login_worker(index):
+        while time.monotonic() < stop:
+            assert verify()
+            counts[index] += 1
+
+    def other_worker():
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            other_request()
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=login_worker, args=(i,)) for i in range(logins)]
+    threads.append(threading.Thread(target=other_worker))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return sum(counts) / elapsed, latencies
+
+
+def main(args):
+    cores = os.cpu_count() or 1
+    pooled = PasswordHasher(
+        workers=args.workers or cores, max_pending=args.logins * 2, queue_timeout=60,
+        argon2_time_cost=args.time_cost, argon2_memory_cost=args.memory_cost,
+    )
+    argon2 = _argon2_hasher(args.time_cost, args.memory_cost, 1)
+    werkzeug_hash = generate_password_hash(PASSWORD)
+    argon2_hash = argon2.hash(PASSWORD)
+    pooled.verify(PASSWORD, argon2_hash)  # start the pool
+
+    baseline = []
+    for _ in range(200):
+        started = time.perf_counter()
+        other_request()
+        baseline.append(time.perf_counter() - started)
+
+    cases = (
+        ("inline werkzeug", lambda: check_password_hash(werkzeug_hash, PASSWORD)),
+        ("inline argon2id", lambda: argon2.verify(argon2_hash, PASSWORD)),
+        ("pooled argon2id", lambda: pooled.verify(PASSWORD, argon2_hash)[0]),
+    )
+    rows = [{"case": "no login load", "logins_per_s_per_core": "-", **latency_columns(baseline)}]
+    for name, verify in cases:
+        rate, latencies = run_case(verify, args.seconds, args.logins)
+        rows.append({"case": name, "logins_per_s_per_core": round(rate / cores, 1), **latency_columns(latencies)})
+    pooled.shutdown()
+    print(f"{cores} core(s), {args.logins} login threads, argon2id t={args.time_cost} m={args.memory_cost} KiB")
+    _common.report(rows)
+
+
+def latency_columns(latencies):
+    return {
+        "other_p50_ms": round(_common.percentile(latencies, 50) * 1000, 2),
+        "other_p99_ms": round(_common.percentile(latencies, 99) * 1000, 2),
+        "other_max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of each case")
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login threads")
+    parser.add_argument("--workers", type=int, default=0, help="hashing processes (default: one per core)")
+    parser.add_argument("--time-cost", type=int, default=3)
+    parser.add_argument("--memory-cost", type=int, default=65536)
+    main(parser.parse_args())
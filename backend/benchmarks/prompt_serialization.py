@@ -0,0 +1,63 @@
+"""Per-request prompt assembly and serialization cost (user-010).
+
+"before" rebuilds the system message and history as fresh dicts and encodes
+the whole request body, as the handlers used to via ``httpx``'s ``json=``.
+"after" renders the same body through the registry template, which only
+encodes the messages after its pre-serialized prefix and reuses already
+encoded history turns.
+
+    python backend/benchmarks/prompt_serialization.py --turns 0,10,40
+"""
+import argparse
+import json
+import timeit
+
+import _common  # noqa: F401
+
+from services.prompt_registry import prompt_registry
+
+TEMPLATE = prompt_registry.get("legal_assistant")
+
+
+def history(turns: int):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Turn {i}: " + "lease deposit clause " * 20}
+        for i in range(turns)
+    ]
+
+
+def before(chat_history, message):
+    messages = [{"role": "system", "content": TEMPLATE.text}]
+    for msg in chat_history:
+        messages.append({"role": msg.get("role", "user"), "content": msg.get("content", "")})
+    messages.append({"role": "user", "content": message})
+    return json.dumps({
+        "model": "gpt-4o-mini", "messages": messages, "max_tokens": 1000, "temperature": 0.7,
+    }).encode("utf-8")
+
+
+def after(chat_history, message):
+    messages = [*chat_history, {"role": "user", "content": message}]
+    return TEMPLATE.render_body(messages, "gpt-4o-mini", 1000, 0.7)
+
+
+def main(args):
+    rows = []
+    for turns in map(int, args.turns.split(",")):
+        chat_history = history(turns)
+        message = "Can my landlord keep the whole deposit?"
+        assert json.loads(before(chat_history, message)) == json.loads(after(chat_history, message))
+        row = {"history_turns": turns}
+        for name, fn in (("before", before), ("after", after)):
+            best = min(timeit.repeat(lambda: fn(chat_history, message), number=args.number, repeat=5))
+            row[f"{name}_us"] = round(best / args.number * 1e6, 2)
+        row["speedup"] = f"{row['before_us'] / row['after_us']:.1f}x"
+        rows.append(row)
+    _common.report(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", default="0,10,40", help="comma-separated history lengths")
+    parser.add_argument("--number", type=int, default=2000, help="calls per timing run")
+    main(parser.parse_args())
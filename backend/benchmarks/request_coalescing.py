@@ -0,0 +1,87 @@
+"""Upstream calls versus client requests with request coalescing (user-007).
+
+Serves the app in-process against the local fake OpenAI, which counts the
+calls it gets. Each wave sends ``--clients`` concurrent requests:
+
+- identical: every client in the wave asks the same question, so
+  ``SingleFlight`` (/api/chat) and ``StreamFlight`` (/api/chat/stream)
+  collapse them into one upstream call;
+- distinct: every client asks its own question, i.e. what the upstream
+  sees without coalescing.
+
+Chat requests send ``Cache-Control: no-cache`` so the response cache never
+answers them; only in-flight requests are shared.
+
+    python backend/benchmarks/request_coalescing.py --clients 50 --waves 20
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import _common
+
+_common.isolated_env(
+    OPENAI_RPM=10**9, OPENAI_TPM=10**12, UPSTREAM_CONCURRENCY=256,
+    # Every request comes from one address; leave it unmetered
+    QUOTA_ANON_DAILY=0, QUOTA_ANON_MONTHLY=0, STRIPE_SECRET_KEY="",
+)
+
+import httpx  # noqa: E402
+
+
+async def wave(client: httpx.AsyncClient, url: str, questions, stream: bool):
+    async def one(question):
+        started = time.perf_counter()
+        if stream:
+            async with client.stream("POST", url, json={"message": question}, headers={"Cache-Control": "no-cache"}) as response:
+                body = b"".join([chunk async for chunk in response.aiter_bytes()])
+            ok = response.status_code == 200 and b"event: done" in body
+        else:
+            response = await client.post(url, json={"message": question}, headers={"Cache-Control": "no-cache"})
+            ok = response.status_code == 200 and response.json().get("success")
+        return time.perf_counter() - started, ok
+    return await asyncio.gather(*(one(question) for question in questions))
+
+
+async def run(base: str, stub_stats: dict, args):
+    rows = []
+    async with httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=args.clients)) as client:
+        for path, stream in (("/api/chat", False), ("/api/chat/stream", True)):
+            for mode in ("distinct", "identical"):
+                calls_before = stub_stats["calls"]
+                latencies, errors = [], 0
+                started = time.perf_counter()
+                for w in range(args.waves):
+                    if mode == "identical":
+                        questions = [f"{path} wave {w}: can my landlord keep the deposit?"] * args.clients
+                    else:
+                        questions = [f"{path} wave {w} client {c}: can my landlord keep the deposit?" for c in range(args.clients)]
+                    for latency, ok in await wave(client, base + path, questions, stream):
+                        latencies.append(latency)
+                        errors += not ok
+                elapsed = time.perf_counter() - started
+                row = _common.summarize(f"{path} {mode}", latencies, elapsed, errors=errors)
+                row["upstream_calls"] = stub_stats["calls"] - calls_before
+                row["calls_per_request"] = round(row["upstream_calls"] / len(latencies), 3)
+                rows.append(row)
+    return rows
+
+
+def main(args):
+    fake = _common.fake_openai(delay=args.delay)
+    with _common.Server(fake) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.url + "/v1"
+        from app import create_app
+        with _common.Server(create_app(), lifespan="on") as server:
+            rows = asyncio.run(run(server.url, fake.state.stats, args))
+    print(f"{args.clients} concurrent clients per wave, {args.waves} waves, upstream delay {args.delay * 1000:.0f} ms")
+    _common.report(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50, help="concurrent requests per wave")
+    parser.add_argument("--waves", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.1, help="fake upstream response time in seconds")
+    main(parser.parse_args())
@@ -0,0 +1,97 @@
+"""RPS and latency for the production serving profile (user-019).
+
+Serves the full app (``main:app``) two ways against a local fake OpenAI:
+
+- gunicorn: gunicorn.conf.py, i.e. ``--workers`` uvicorn workers on uvloop
+  and httptools with orjson responses;
+- uvicorn: the old single ``uvicorn main:app`` process on the stdlib
+  asyncio loop and the h11 parser.
+
+Each is loaded on ``/health``, ``/api/config`` and ``/api/chat`` in turn.
+Chat requests send ``Cache-Control: no-cache`` so every one reaches the fake
+upstream.
+
+    python backend/benchmarks/server_profile.py --workers 4 --clients 64
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+
+import _common
+
+_common.isolated_env()
+
+
+def gunicorn(port: int, env: dict, args):
+    return _common.start_gunicorn("gunicorn.conf.py", "main:app", port, env, "--workers", str(args.workers))
+
+
+def uvicorn(port: int, env: dict, args):
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--app-dir", _common.BACKEND_DIR,
+            "--host", "127.0.0.1", "--port", str(port), "--loop", "asyncio", "--http", "h11", "--no-access-log",
+        ],
+        env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def requests(base: str):
+    counter = itertools.count()
+
+    async def health(client):
+        return (await client.get(f"{base}/health")).status_code == 200
+
+    async def config(client):
+        return (await client.get(f"{base}/api/config")).status_code == 200
+
+    async def chat(client):
+        response = await client.post(
+            f"{base}/api/chat",
+            json={"message": f"Question {next(counter)}: can my landlord keep the deposit?"},
+            headers={"Cache-Control": "no-cache"},
+        )
+        return response.status_code == 200 and response.json().get("success")
+
+    return {"/health": health, "/api/config": config, "/api/chat": chat}
+
+
+def main(args):
+    rows = []
+    with _common.Server(_common.fake_openai(delay=args.delay)) as stub:
+        env = {
+            "OPENAI_BASE_URL": stub.url + "/v1",
+            "OPENAI_RPM": str(10**9),
+            "OPENAI_TPM": str(10**12),
+            "UPSTREAM_CONCURRENCY": "256",
+            "UPSTREAM_CONCURRENCY_MAX": "1024",
+            # Every request comes from one address; leave it unmetered
+            "QUOTA_ANON_DAILY": "0",
+            "QUOTA_ANON_MONTHLY": "0",
+        }
+        for profile, start in (("gunicorn", gunicorn), ("uvicorn", uvicorn)):
+            port = _common.free_port()
+            server = start(port, env, args)
+            try:
+                _common.wait_ready(port)
+                for path, request in requests(f"http://127.0.0.1:{port}").items():
+                    asyncio.run(_common.run_load(request, args.clients, 1.0))  # warm-up
+                    latencies, elapsed, errors = asyncio.run(_common.run_load(request, args.clients, args.duration))
+                    rows.append(_common.summarize(f"{profile} {path}", latencies, elapsed, errors=errors))
+            finally:
+                server.terminate()
+                server.wait()
+    print(f"gunicorn workers={args.workers}, {args.clients} clients, fake upstream delay {args.delay * 1000:.0f} ms")
+    _common.report(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="gunicorn workers")
+    parser.add_argument("--clients", type=int, default=64, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument("--delay", type=float, default=0.2, help="fake OpenAI response time in seconds")
+    main(parser.parse_args())
@@ -0,0 +1,67 @@
+"""Bearer token verification rate with and without the verified-token cache (user-014).
+
+Issues ``--tokens`` distinct tokens and verifies them round-robin, as a worker
+would see requests from that many signed-in users. "uncached" is a
+``TokenService`` whose cache holds nothing, so every call checks the
+signature and parses the claims; "cached" is the default service. A last
+row times ``current_user`` end to end on a request with the header set.
+
+    python backend/benchmarks/token_verification.py --tokens 1000
+"""
+import argparse
+import asyncio
+import time
+
+import _common
+
+_common.isolated_env()
+
+from starlette.requests import Request  # noqa: E402
+
+from api.auth import current_user  # noqa: E402
+from services.tokens import KeyRing, TokenService  # noqa: E402
+
+
+def rate(fn, items, seconds: float) -> float:
+    calls = 0
+    stop = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < stop:
+        for item in items:
+            fn(item)
+        calls += len(items)
+    return calls / (time.perf_counter() - started)
+
+
+def main(args):
+    keyring = KeyRing({"bench": "benchmark-signing-key"})
+    services = {
+        "uncached": TokenService(keyring, cache_size=0),
+        "cached": TokenService(keyring, cache_size=max(args.tokens, 1)),
+    }
+    issued = [services["cached"].issue(f"user{i}", {"subscription": "free"}) for i in range(args.tokens)]
+
+    rows = []
+    for name, service in services.items():
+        per_second = rate(service.verify, issued, args.seconds)
+        rows.append({"case": name, "verifies_per_s": round(per_second), "us_per_verify": round(1e6 / per_second, 2)})
+
+    from services.tokens import tokens
+    requests = [
+        Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+        for token in (tokens.issue(f"user{i}") for i in range(args.tokens))
+    ]
+    loop = asyncio.new_event_loop()
+    per_second = rate(lambda request: loop.run_until_complete(current_user(request)), requests, args.seconds)
+    rows.append({"case": "current_user (cached)", "verifies_per_s": round(per_second), "us_per_verify": round(1e6 / per_second, 2)})
+
+    print(f"{args.tokens} distinct tokens, HS256")
+    _common.report(rows)
+    print(f"cache speedup: {rows[1]['verifies_per_s'] / rows[0]['verifies_per_s']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=1000, help="distinct tokens in rotation")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each case")
+    main(parser.parse_args())
@@ -0,0 +1,75 @@
+"""Pooled vs per-request upstream clients (user-001).
+
+Sends the same completion requests to a local TLS stub of the OpenAI API,
+once with a new ``httpx.AsyncClient`` per request (the old /api/chat
+behaviour, paying a TCP and TLS handshake each time) and once through the
+shared ``UpstreamClient``. Prints requests/sec and latency percentiles.
+
+    python backend/benchmarks/upstream_pooling.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import ssl
+import tempfile
+import time
+
+import _common
+
+# Only the transport is measured, so rate limits are out of the way
+_common.isolated_env(OPENAI_RPM=10**9, OPENAI_TPM=10**12, UPSTREAM_CONCURRENCY=256)
+
+import httpx  # noqa: E402
+
+from services.upstream import UpstreamClient  # noqa: E402
+
+BODY = b'{"model":"gpt-4o-mini","messages":[{"role":"user","content":"What is a tort?"}],"max_tokens":20}'
+
+
+async def run(send, total: int, concurrency: int):
+    latencies = []
+    queue = iter(range(total))
+
+    async def worker():
+        for _ in queue:
+            started = time.perf_counter()
+            response = await send()
+            assert response.status_code == 200, response.status_code
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def main(args):
+    cert, key = _common.self_signed_cert(tempfile.mkdtemp())
+    context = ssl.create_default_context(cafile=cert)
+
+    with _common.Server(_common.fake_openai(delay=args.delay), ssl_certfile=cert, ssl_keyfile=key) as stub:
+        base_url = stub.url + "/v1"
+
+        async def per_request():
+            async with httpx.AsyncClient(base_url=base_url, verify=context) as client:
+                return await client.post("/chat/completions", content=BODY)
+
+        pooled = UpstreamClient(base_url=base_url, max_connections=args.concurrency, http2=False)
+        pooled._client = httpx.AsyncClient(base_url=base_url, limits=pooled.limits, verify=context)
+
+        async def shared():
+            return await pooled.chat_completion("sk-benchmark", BODY, 100)
+
+        rows = []
+        for name, send in (("client per request", per_request), ("shared pooled client", shared)):
+            await run(send, min(50, args.requests), args.concurrency)  # warm-up
+            latencies, elapsed = await run(send, args.requests, args.concurrency)
+            rows.append(_common.summarize(name, latencies, elapsed))
+        await pooled.close()
+    _common.report(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.005, help="stub response time in seconds")
+    asyncio.run(main(parser.parse_args()))
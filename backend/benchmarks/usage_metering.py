@@ -0,0 +1,97 @@
+"""Database writes per chat request for usage metering (user-017).
+
+``--clients`` tasks each run "check the quota, then record the usage" back
+to back for ``--duration`` seconds, spread over ``--users`` users:
+
+- per request: one upsert transaction per request, as a naive meter would;
+- metered: ``UsageMeter`` with its write-ahead log, flushing every
+  ``--flush-interval`` seconds.
+
+Both write to the same SQLite database. Prints requests, database
+transactions and rows written, i.e. the write amplification.
+
+    python backend/benchmarks/usage_metering.py --duration 10 --users 500
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import _common
+
+DATA_DIR = _common.isolated_env()
+
+from services.database import database  # noqa: E402
+from services.metering import UsageMeter, current_periods  # noqa: E402
+
+USAGE = {"prompt_tokens": 50, "completion_tokens": 200}
+
+
+async def per_request(meter: UsageMeter, user_id: str):
+    await meter.check(user_id, "free")
+    now = time.time()
+    counters = {(user_id, period): [USAGE["prompt_tokens"], USAGE["completion_tokens"], 1] for period in current_periods()}
+    async with database.session() as session:
+        await session.execute(meter._upsert(meter._rows(counters, now)))
+        await session.commit()
+
+
+async def metered(meter: UsageMeter, user_id: str):
+    await meter.check(user_id, "free")
+    meter.record(user_id, USAGE)
+
+
+async def run_case(name, handle, args, meter: UsageMeter):
+    latencies = []
+    deadline = time.monotonic() + args.duration
+
+    async def client():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            await handle(meter, f"user{random.randrange(args.users)}")
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    flushes_before = meter.stats["flushes"]
+    await meter.close()
+    if handle is per_request:
+        transactions, rows = len(latencies), len(latencies) * 2
+    else:
+        transactions, rows = meter.stats["flushes"], meter.stats["rows_written"]
+    row = _common.summarize(name, latencies, elapsed)
+    row.update({
+        "db_transactions": transactions,
+        "rows_written": rows,
+        "requests_per_write": round(len(latencies) / max(transactions, 1), 1),
+    })
+    if handle is metered:
+        row["flushes_during_run"] = flushes_before
+    return row
+
+
+async def main(args):
+    await database.start()
+    rows = []
+    for name, handle in (("per request", per_request), ("metered", metered)):
+        meter = UsageMeter(
+            wal_dir=f"{DATA_DIR}/wal-{handle.__name__}",
+            flush_interval=args.flush_interval,
+            limits={"free": (10**12, 10**12), "paid": (0, 0)},
+        )
+        await meter.start()
+        rows.append(await run_case(name, handle, args, meter))
+    await database.close()
+    print(f"{args.clients} clients, {args.users} users, {args.duration:.0f} s per case, flush every {args.flush_interval} s")
+    _common.report(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent request loops")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per case")
+    parser.add_argument("--flush-interval", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
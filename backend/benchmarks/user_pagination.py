@@ -0,0 +1,118 @@
+"""Keyset pages and the streamed export over a large user table (user-011).
+
+Seeds ``--users`` rows into a fresh SQLite database and serves routes/user.py
+through Flask's test client. Prints:
+
+- per-page latency at increasing depths, for the keyset cursor (``after=``)
+  and, for comparison, an OFFSET query of the same page;
+- peak RSS growth while streaming the full NDJSON export, against loading the
+  table with ``User.query.all()`` as the old listing did.
+
+The export runs before the full load, since peak RSS only ever goes up.
+
+    python backend/benchmarks/user_pagination.py --users 1000000
+"""
+import argparse
+import os
+import resource
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import _common
+
+_common.use_flask_package()
+
+from flask import Flask  # noqa: E402
+
+from src.models.user import User, db  # noqa: E402
+from src.routes.user import user_bp  # noqa: E402
+
+
+def seed(path: str, count: int):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, "
+        "email VARCHAR(120) NOT NULL UNIQUE)"
+    )
+    batch = 50000
+    for start in range(1, count + 1, batch):
+        rows = ((i, f"user{i}", f"user{i}@example.com") for i in range(start, min(start + batch, count + 1)))
+        conn.executemany("INSERT INTO user (id, username, email) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def main(args):
+    path = os.path.join(tempfile.mkdtemp(), "app.db")
+    started = time.perf_counter()
+    seed(path, args.users)
+    print(f"seeded {args.users} users in {time.perf_counter() - started:.1f} s")
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    app.register_blueprint(user_bp, url_prefix="/api")
+    client = app.test_client()
+
+    rows = []
+    with app.app_context():
+        for depth in (0.0, 0.25, 0.5, 0.75, 0.999):
+            after = int(args.users * depth)
+
+            def keyset():
+                response = client.get(f"/api/users?after={after}&limit={args.page_size}")
+                assert response.status_code == 200 and len(response.get_json()) > 0
+
+            def offset():
+                users = User.query.order_by(User.id).offset(after).limit(args.page_size).all()
+                assert users
+
+            rows.append({
+                "page_at_row": after,
+                "keyset_ms": timed(keyset, args.repeat),
+                "offset_ms": timed(offset, args.repeat),
+            })
+        _common.report(rows)
+        print()
+
+        baseline_rss = peak_rss_mb()
+        started = time.perf_counter()
+        response = client.get("/api/users/export")
+        lines = sum(chunk.count(b"\n") for chunk in response.response)
+        export_s = time.perf_counter() - started
+        assert lines == args.users
+        export_rss = peak_rss_mb()
+
+        started = time.perf_counter()
+        everyone = [user.to_dict() for user in User.query.all()]
+        load_s = time.perf_counter() - started
+        assert len(everyone) == args.users
+        load_rss = peak_rss_mb()
+
+    _common.report([
+        {"mode": "streamed export", "seconds": round(export_s, 1), "peak_rss_growth_mb": round(export_rss - baseline_rss, 1)},
+        {"mode": "User.query.all()", "seconds": round(load_s, 1), "peak_rss_growth_mb": round(load_rss - export_rss, 1)},
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20, help="timed requests per depth")
+    main(parser.parse_args())
@@ -0,0 +1,99 @@
+"""Profile reads: the async FastAPI path against the sync Flask path (user-015).
+
+Seeds ``--users`` rows into one SQLite database and serves it two ways, each
+as a single gunicorn worker:
+
+- fastapi: ``GET /api/user/{id}`` from api/users.py on the async engine and
+  its connection pool, with a bearer token for that user;
+- flask: ``GET /api/users/{id}`` from routes/user.py via Flask-SQLAlchemy on
+  a gthread worker.
+
+Clients read random profiles back to back.
+
+    python backend/benchmarks/user_profiles.py --clients 64 --duration 10
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+
+import _common
+
+DATA_DIR = _common.isolated_env()
+DB_PATH = f"{DATA_DIR}/app.db"
+
+from services.tokens import tokens  # noqa: E402
+
+
+def seed(count: int):
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute(
+        'CREATE TABLE "user" (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, '
+        "email VARCHAR(120) NOT NULL UNIQUE)"
+    )
+    conn.executemany(
+        'INSERT INTO "user" (id, username, email) VALUES (?, ?, ?)',
+        ((i, f"user{i}", f"user{i}@example.com") for i in range(1, count + 1)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def fastapi_server(port: int, args):
+    env = {"APP_FEATURES": "users", "DATABASE_URL": f"sqlite:///{DB_PATH}", "DB_POOL_SIZE": str(args.pool_size)}
+    return _common.start_gunicorn("gunicorn.conf.py", "main:app", port, env, "--workers", "1")
+
+
+def flask_server(port: int, args):
+    env = {"DATABASE_URL": f"sqlite:///{DB_PATH}"}
+    return _common.start_gunicorn(
+        "gunicorn_wsgi.conf.py", "flask_app:app", port, env, "--workers", "1", "--threads", str(args.threads)
+    )
+
+
+def main(args):
+    seed(args.users)
+    headers = {i: {"Authorization": f"Bearer {tokens.issue(str(i))}"} for i in range(1, args.users + 1)}
+
+    def fastapi_request(base):
+        async def read(client):
+            user_id = random.randint(1, args.users)
+            response = await client.get(f"{base}/api/user/{user_id}", headers=headers[user_id])
+            return response.status_code == 200
+        return read
+
+    def flask_request(base):
+        async def read(client):
+            response = await client.get(f"{base}/api/users/{random.randint(1, args.users)}")
+            return response.status_code == 200
+        return read
+
+    rows = []
+    for name, start, request in (
+        ("fastapi async engine", fastapi_server, fastapi_request),
+        (f"flask sync, {args.threads} threads", flask_server, flask_request),
+    ):
+        port = _common.free_port()
+        server = start(port, args)
+        try:
+            _common.wait_ready(port)
+            base = f"http://127.0.0.1:{port}"
+            # Warm-up: pool connections, statement caches, token cache
+            asyncio.run(_common.run_load(request(base), args.clients, 1.0))
+            latencies, elapsed, errors = asyncio.run(_common.run_load(request(base), args.clients, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        rows.append(_common.summarize(name, latencies, elapsed, errors=errors))
+    print(f"{args.users} users, {args.clients} clients, one worker each")
+    _common.report(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=64, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per case")
+    parser.add_argument("--threads", type=int, default=16, help="gthread threads for the Flask worker")
+    parser.add_argument("--pool-size", type=int, default=10, help="async engine pool size")
+    main(parser.parse_args())
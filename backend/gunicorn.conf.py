@@ -0,0 +1,26 @@
+# Production profile: gunicorn -c gunicorn.conf.py main:app
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Async workers, so one per core is enough to keep every core busy
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "server.Worker"
+
+# Chat completions can take a while; let them finish on deploys and scale-in
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 60))
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+keepalive = int(os.getenv("KEEPALIVE_TIMEOUT", 5))
+
+# Railway's edge proxy is the only peer, so the client address for anonymous
+# quotas and OTP send caps comes from X-Forwarded-For. Narrow this to the
+# proxy's addresses where they are known.
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+
+# Recycle workers now and then so slow leaks never build up
+max_requests = int(os.getenv("MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 0))
+
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+errorlog = "-"
@@ -0,0 +1,20 @@
+# Profile for the Flask blueprints in routes/:
+#   gunicorn -c gunicorn_wsgi.conf.py <module>:app
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# A chat request holds its thread while it waits on OpenAI. Threaded workers
+# with one thread per allowed in-flight call let each process keep up to
+# UPSTREAM_MAX_IN_FLIGHT completions going; the limiter sheds the rest.
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.getenv("WSGI_THREADS", os.getenv("UPSTREAM_MAX_IN_FLIGHT", 256)))
+
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 60))
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+keepalive = int(os.getenv("KEEPALIVE_TIMEOUT", 5))
+
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+errorlog = "-"
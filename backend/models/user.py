@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 
 db = SQLAlchemy()
 
@@ -10,9 +11,26 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+    @classmethod
+    def get_by_email(cls, email):
+        # Cached, case-insensitive lookup; see services/user_repository.py
+        from src.services.user_repository import user_repository
+        return user_repository.get_by_email(email)
+
     def to_dict(self):
         return {
             'id': self.id,
             'username': self.username,
             'email': self.email
         }
+
+# Case-insensitive email lookups go through this functional index
+email_lookup_index = db.Index('ix_user_email_normalized', db.func.lower(User.email))
+
+def _invalidate_cached_lookups(mapper, connection, user):
+    # Keeps cached email lookups coherent with every write path
+    from src.services.user_repository import invalidate_user
+    invalidate_user(user)
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(User, _event_name, _invalidate_cached_lookups)
@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
-from src.models.user import User
+from src.models.user import User, db
+from src.services.passwords import password_hasher, login_limiter, HasherBusy
 import re
 
 auth = Blueprint('auth', __name__)
@@ -24,9 +24,25 @@ def login():
         if not is_valid_email(email):
             return render_template('login.html', error='Please enter a valid email address')
         
-        # Check if user exists and password is correct
+        if not login_limiter.allow(email):
+            return render_template('login.html', error='Too many failed attempts. Please try again in a few minutes')
+        
+        # Check if user exists and password is correct. Hashing runs in the
+        # password hasher's process pool, not on this request thread; unknown
+        # emails are checked against a dummy hash so timing gives nothing away.
         user = User.get_by_email(email)
-        if user and check_password_hash(user.password_hash, password):
+        try:
+            valid, new_hash = password_hasher.verify(password, user.password_hash if user else None)
+        except HasherBusy:
+            return render_template('login.html', error='We are experiencing high load. Please try again in a moment')
+        
+        if valid:
+            login_limiter.reset(email)
+            if new_hash:
+                # Transparently upgrade legacy or weaker hashes
+                user.password_hash = new_hash
+                db.session.commit()
+            
             # Login successful
             session['user_id'] = user.id
             session['user_name'] = user.name
@@ -36,6 +52,7 @@ def login():
             next_page = request.args.get('next')
             return redirect(next_page or url_for('main.dashboard'))
         else:
+            login_limiter.record_failure(email)
             return render_template('login.html', error='Invalid email or password')
     
     # If user is already logged in, redirect to dashboard
@@ -71,7 +88,7 @@ def signup():
         
         # Create new user
         try:
-            password_hash = generate_password_hash(password)
+            password_hash = password_hasher.hash(password)
             user = User.create(name=name, email=email, password_hash=password_hash)
             
             # Login the user
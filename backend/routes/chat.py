@@ -1,11 +1,47 @@
 import os
-from flask import Blueprint, request, jsonify
-from openai import OpenAI
+import json
+import logging
+import threading
+import httpx
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from src.services.concurrency import upstream_limiter, LimiterBusy
+from src.services.response_cache import response_cache, make_key, should_bypass
+from src.services.prompt import prompt_assembler
+from src.services.prompt_registry import prompt_registry
 
 chat_bp = Blueprint('chat', __name__)
+logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+SYSTEM_PROMPT = prompt_registry.get('legal_assistant_brief').text
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    # Built on first use so importing the blueprint stays cheap. Every worker
+    # thread shares its connection pool, sized so the in-flight limit is
+    # never starved of connections; the lock keeps concurrent first
+    # requests from each building (and leaking) a pool.
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'),
+                    timeout=float(os.getenv('OPENAI_CHAT_TIMEOUT', 30)),
+                    http_client=httpx.Client(limits=httpx.Limits(
+                        max_connections=upstream_limiter.max_in_flight,
+                        max_keepalive_connections=int(os.getenv('UPSTREAM_MAX_KEEPALIVE', 20))
+                    ))
+                )
+    return _client
+
+def busy_response():
+    return jsonify({
+        'error': 'The assistant is busy right now, please try again in a moment',
+        'success': False
+    }), 503, {'Retry-After': '1'}
 
 @chat_bp.route('/chat', methods=['POST'])
 def chat():
@@ -19,50 +55,101 @@ def chat():
         # Get chat history from request (optional)
         chat_history = data.get('history', [])
         
-        # Build messages for OpenAI API
-        messages = [
-            {
-                "role": "system", 
-                "content": "You are EezLegal, a helpful AI legal assistant. Provide clear, accurate legal information and guidance. Always remind users that this is general information and they should consult with a qualified attorney for specific legal advice. Be professional, empathetic, and helpful."
-            }
-        ]
+        # Fit system prompt and history into the token budget
+        prompt = prompt_assembler.assemble(SYSTEM_PROMPT, chat_history, user_message)
+        messages = prompt.messages
         
-        # Add chat history
-        for msg in chat_history:
-            messages.append({
-                "role": msg.get('role', 'user'),
-                "content": msg.get('content', '')
-            })
+        # Serve repeated questions from the response cache
+        cache_key = make_key("gpt-4o-mini", 0.7, messages)
+        bypass_cache = should_bypass(request.headers)
+        cached = None if bypass_cache else response_cache.get(cache_key)
+        if cached is not None:
+            return jsonify({**cached, 'prompt': prompt.stats(), 'success': True}), 200, {'X-Cache': 'HIT'}
         
-        # Add current user message
-        messages.append({
-            "role": "user",
-            "content": user_message
-        })
-        
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=1000,
-            temperature=0.7
-        )
+        # Call OpenAI API, bounded by the per-process in-flight limit
+        with upstream_limiter.slot():
+            response = get_client().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                max_tokens=1000,
+                temperature=0.7
+            )
         
         assistant_message = response.choices[0].message.content
+        response_cache.set(cache_key, {'message': assistant_message})
         
         return jsonify({
             'message': assistant_message,
+            'prompt': prompt.stats(),
             'success': True
-        })
+        }), 200, {'X-Cache': 'BYPASS' if bypass_cache else 'MISS'}
         
-    except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
+    except LimiterBusy:
+        return busy_response()
+    except Exception:
+        logger.exception("Error in chat endpoint")
         return jsonify({
             'error': 'An error occurred while processing your request',
             'success': False
         }), 500
 
-@chat_bp.route('/health', methods=['GET'])
-def health():
-    return jsonify({'status': 'healthy', 'service': 'eezlegal-chat'})
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@chat_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.get_json()
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+    
+    prompt = prompt_assembler.assemble(SYSTEM_PROMPT, data.get('history', []), user_message)
+    messages = prompt.messages
+    
+    def events():
+        stream = None
+        usage = {}
+        try:
+            with upstream_limiter.slot():
+                stream = get_client().chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    max_tokens=1000,
+                    temperature=0.7,
+                    stream=True,
+                    extra_body={"stream_options": {"include_usage": True}}
+                )
+                # The WSGI server pulls one event at a time, so the upstream stream
+                # is only read as fast as the client consumes it.
+                for chunk in stream:
+                    # Older SDKs keep the final usage chunk as an untyped extra field
+                    usage = chunk.model_dump().get('usage') or usage
+                    for choice in chunk.choices:
+                        if choice.delta and choice.delta.content:
+                            yield sse_event({'delta': choice.delta.content})
+            yield sse_event({'success': True, 'usage': usage, 'prompt': prompt.stats()}, 'done')
+        except LimiterBusy:
+            yield sse_event({
+                'error': 'The assistant is busy right now, please try again in a moment',
+                'success': False
+            }, 'error')
+        except Exception:
+            logger.exception("Error in chat stream endpoint")
+            yield sse_event({
+                'error': 'An error occurred while processing your request',
+                'success': False
+            }, 'error')
+        finally:
+            # Runs on client disconnect too (GeneratorExit), dropping the
+            # upstream connection instead of letting the completion run on.
+            if stream is not None:
+                stream.response.close()
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
@@ -1,9 +1,27 @@
+import logging
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Blueprint, request, jsonify
+from src.services.concurrency import upstream_limiter, LimiterBusy
+from src.services.response_cache import response_cache, make_key, should_bypass
+from src.services.prompt import prompt_assembler
+from src.services.prompt_registry import prompt_registry
+
+logger = logging.getLogger(__name__)
 
 simple_chat_bp = Blueprint('simple_chat', __name__)
 
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+
+# One keep-alive session shared by all worker threads, with a connection pool
+# as large as the in-flight limit so threads never queue on the pool itself
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_maxsize=upstream_limiter.max_in_flight))
+session.mount('http://', HTTPAdapter(pool_maxsize=upstream_limiter.max_in_flight))
+
+CHAT_TEMPLATE = prompt_registry.get('legal_assistant_brief')
+
 @simple_chat_bp.route('/chat', methods=['POST'])
 def chat():
     try:
@@ -25,26 +43,16 @@ def chat():
         # Get chat history from request (optional)
         chat_history = data.get('history', [])
         
-        # Build messages for OpenAI API
-        messages = [
-            {
-                "role": "system", 
-                "content": "You are EezLegal, a helpful AI legal assistant. Provide clear, accurate legal information and guidance. Always remind users that this is general information and they should consult with a qualified attorney for specific legal advice. Be professional, empathetic, and helpful."
-            }
-        ]
+        # Fit system prompt and history into the token budget
+        prompt = prompt_assembler.assemble(CHAT_TEMPLATE.text, chat_history, user_message)
+        messages = prompt.messages
         
-        # Add chat history
-        for msg in chat_history:
-            messages.append({
-                "role": msg.get('role', 'user'),
-                "content": msg.get('content', '')
-            })
-        
-        # Add current user message
-        messages.append({
-            "role": "user",
-            "content": user_message
-        })
+        # Serve repeated questions from the response cache
+        cache_key = make_key('gpt-4o-mini', 0.7, messages)
+        bypass_cache = should_bypass(request.headers)
+        cached = None if bypass_cache else response_cache.get(cache_key)
+        if cached is not None:
+            return jsonify({**cached, 'prompt': prompt.stats(), 'success': True}), 200, {'X-Cache': 'HIT'}
         
         # Call OpenAI API using requests
         headers = {
@@ -52,42 +60,42 @@ def chat():
             'Content-Type': 'application/json'
         }
         
-        payload = {
-            'model': 'gpt-4o-mini',
-            'messages': messages,
-            'max_tokens': 1000,
-            'temperature': 0.7
-        }
+        # Only the messages after the pre-serialized system prompt are encoded
+        payload = CHAT_TEMPLATE.render_body(messages, 'gpt-4o-mini', 1000, 0.7)
         
-        response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        with upstream_limiter.slot():
+            response = session.post(
+                f'{OPENAI_BASE_URL}/chat/completions',
+                headers=headers,
+                data=payload,
+                timeout=30
+            )
         
         if response.status_code == 200:
             result = response.json()
             assistant_message = result['choices'][0]['message']['content']
+            response_cache.set(cache_key, {'message': assistant_message})
             
             return jsonify({
                 'message': assistant_message,
+                'prompt': prompt.stats(),
                 'success': True
-            })
+            }), 200, {'X-Cache': 'BYPASS' if bypass_cache else 'MISS'}
         else:
             return jsonify({
                 'message': 'I apologize, but I\'m having trouble processing your request right now. Please try again in a moment.',
                 'success': True
             })
         
-    except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
+    except LimiterBusy:
+        return jsonify({
+            'message': 'I\'m helping a lot of people right now. Please try again in a moment.',
+            'success': False
+        }), 503, {'Retry-After': '1'}
+    except Exception:
+        logger.exception("Error in chat endpoint")
         return jsonify({
             'message': 'I\'m here to help with your legal questions. This is a demonstration of the EezLegal interface. To enable full AI functionality, please set up your OpenAI API key.',
             'success': True
         })
 
-@simple_chat_bp.route('/health', methods=['GET'])
-def health():
-    return jsonify({'status': 'healthy', 'service': 'eezlegal-chat'})
-
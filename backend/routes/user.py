@@ -1,12 +1,85 @@
-from flask import Blueprint, jsonify, request
+import json
+from urllib.parse import urlencode
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from src.models.user import User, db
 
 user_bp = Blueprint('user', __name__)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+USER_FIELDS = ('id', 'username', 'email')
+
+def parse_fields():
+    fields = request.args.get('fields')
+    if not fields:
+        return USER_FIELDS
+    fields = tuple(f.strip() for f in fields.split(',') if f.strip())
+    unknown = set(fields) - set(USER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+def user_columns(fields):
+    # The id is always selected because it is the pagination cursor
+    return [User.id] + [getattr(User, f) for f in fields if f != 'id']
+
+def row_to_dict(row, fields):
+    return {f: getattr(row, f) for f in fields}
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    try:
+        fields = parse_fields()
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        after = int(request.args.get('after', 0))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Keyset pagination on the primary key: every page is an index range
+    # scan, no matter how deep into the table it is
+    rows = (
+        db.session.query(*user_columns(fields))
+        .filter(User.id > after)
+        .order_by(User.id)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    headers = {}
+    if has_more:
+        next_cursor = rows[-1].id
+        headers['X-Next-Cursor'] = str(next_cursor)
+        query = urlencode({**request.args.to_dict(), 'after': next_cursor, 'limit': limit})
+        headers['Link'] = f'<{request.base_url}?{query}>; rel="next"'
+    return jsonify([row_to_dict(row, fields) for row in rows]), 200, headers
+
+@user_bp.route('/users/export', methods=['GET'])
+def export_users():
+    try:
+        fields = parse_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def lines():
+        # Server-side cursor: rows are fetched in batches as the client reads,
+        # so memory stays flat regardless of table size. Through the ORM
+        # session only yield_per does that; stream_results alone still
+        # buffers the whole result.
+        result = db.session.execute(
+            db.select(*user_columns(fields))
+            .order_by(User.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        try:
+            for row in result:
+                yield json.dumps(row_to_dict(row, fields)) + '\n'
+        finally:
+            result.close()
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():
@@ -0,0 +1,21 @@
+import os
+
+from uvicorn.workers import UvicornWorker
+
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", 60))
+
+
+class Worker(UvicornWorker):
+    """Gunicorn worker running uvicorn on uvloop with the httptools parser.
+
+    On SIGTERM uvicorn stops accepting connections and gives in-flight
+    requests, chat streams included, a few seconds less than gunicorn's
+    ``graceful_timeout`` to finish. That leaves time for the app's shutdown
+    hooks (usage flush, pool close) before gunicorn kills the worker.
+    """
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "timeout_graceful_shutdown": max(GRACEFUL_TIMEOUT - 5, 1),
+    }
@@ -0,0 +1,156 @@
+import re
+import secrets
+import time
+from typing import Optional
+
+from sqlalchemy import String, cast, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from services.database import credentials, database, subscriptions, user_phones, user_profiles, users
+from services.passwords import PasswordHasher, password_hasher
+
+
+# Phone-only accounts have no email; the column is required and unique, so
+# they get a placeholder under a reserved domain that can never receive mail
+PHONE_EMAIL_DOMAIN = "phone.invalid"
+
+
+# Accounts made before display names had their own table, and phone accounts,
+# are shown by username
+display_name = func.coalesce(user_profiles.c.display_name, users.c.username).label("name")
+
+
+def new_username(email: str) -> str:
+    """A unique ``user.username`` from the email's local part and a random suffix."""
+    local = re.sub(r"[^a-z0-9._-]+", "", email.split("@")[0].lower())[:60] or "user"
+    return f"{local}-{secrets.token_hex(4)}"
+
+
+def display_name_upsert(user_id: int, name: str):
+    if database.is_sqlite:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    stmt = dialect_insert(user_profiles).values(user_id=user_id, display_name=name)
+    return stmt.on_conflict_do_update(
+        index_elements=[user_profiles.c.user_id], set_={"display_name": stmt.excluded.display_name}
+    )
+
+
+class AccountExists(Exception):
+    def __init__(self, field: str):
+        super().__init__(f"An account with this {field} already exists")
+        self.field = field
+
+
+def _profile(row) -> dict:
+    return {
+        "id": str(row.id),
+        "name": row.name,
+        "email": row.email,
+        "subscription": row.plan or "free",
+    }
+
+
+class AccountStore:
+    """Email and password accounts on the shared ``user`` table.
+
+    Hashing blocks on the password hasher's process pool, so it is awaited
+    from a worker thread rather than on the event loop.
+    """
+
+    def __init__(self, hasher: PasswordHasher):
+        self.hasher = hasher
+
+    def _select(self, *columns):
+        return (
+            select(users.c.id, display_name, users.c.email, subscriptions.c.plan, *columns)
+            .select_from(
+                users.join(credentials, credentials.c.user_id == users.c.id)
+                .outerjoin(user_profiles, user_profiles.c.user_id == users.c.id)
+                .outerjoin(subscriptions, subscriptions.c.user_id == cast(users.c.id, String))
+            )
+        )
+
+    async def create(self, name: str, email: str, password: str) -> dict:
+        """Create an account; raises ``AccountExists`` for a taken email.
+        Display names need not be unique."""
+        password_hash = await run_in_threadpool(self.hasher.hash, password)
+        async with database.session() as session:
+            try:
+                result = await session.execute(insert(users).values(username=new_username(email), email=email))
+                user_id = result.inserted_primary_key[0]
+                await session.execute(insert(user_profiles).values(user_id=user_id, display_name=name))
+                await session.execute(
+                    insert(credentials).values(user_id=user_id, password_hash=password_hash, updated_at=time.time())
+                )
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                taken = (await session.execute(
+                    select(users.c.id).where(func.lower(users.c.email) == email)
+                )).first()
+                if not taken:
+                    raise
+                raise AccountExists("email")
+        return {"id": str(user_id), "name": name, "email": email, "subscription": "free"}
+
+    async def authenticate(self, email: str, password: str) -> Optional[dict]:
+        """Return the profile if the password matches, else None.
+
+        Unknown emails are checked against the hasher's dummy hash, so both
+        failures take as long as a real check.
+        """
+        async with database.session() as session:
+            row = (await session.execute(
+                self._select(credentials.c.password_hash).where(func.lower(users.c.email) == email)
+            )).first()
+        valid, new_hash = await run_in_threadpool(
+            self.hasher.verify, password, row.password_hash if row else None
+        )
+        if not valid:
+            return None
+        if new_hash:
+            async with database.session() as session:
+                await session.execute(
+                    update(credentials)
+                    .where(credentials.c.user_id == row.id)
+                    .values(password_hash=new_hash, updated_at=time.time())
+                )
+                await session.commit()
+        return _profile(row)
+
+
+    async def for_phone(self, phone: str) -> dict:
+        """The account linked to a verified ``phone``, created on first sign-in."""
+        query = (
+            select(users.c.id, display_name, subscriptions.c.plan)
+            .select_from(
+                users.join(user_phones, user_phones.c.user_id == users.c.id)
+                .outerjoin(user_profiles, user_profiles.c.user_id == users.c.id)
+                .outerjoin(subscriptions, subscriptions.c.user_id == cast(users.c.id, String))
+            )
+            .where(user_phones.c.phone == phone)
+        )
+        async with database.session() as session:
+            row = (await session.execute(query)).first()
+            if row is None:
+                try:
+                    result = await session.execute(insert(users).values(
+                        username=phone, email=f"{phone.lstrip('+')}@{PHONE_EMAIL_DOMAIN}"
+                    ))
+                    await session.execute(insert(user_phones).values(
+                        phone=phone, user_id=result.inserted_primary_key[0], created_at=time.time()
+                    ))
+                    await session.commit()
+                except IntegrityError:
+                    # Another request signed this number in first
+                    await session.rollback()
+                row = (await session.execute(query)).first()
+                if row is None:
+                    raise AccountExists("phone number")
+        return {"id": str(row.id), "name": row.name, "phone": phone, "subscription": row.plan or "free"}
+
+
+accounts = AccountStore(password_hasher)
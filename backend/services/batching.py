@@ -0,0 +1,100 @@
+import asyncio
+import os
+from typing import AsyncIterator, List, Optional
+
+from services.resilience import resilience
+
+
+class BatchQueue:
+    """Bulk lane for non-interactive completions.
+
+    A fixed pool of workers drains one shared queue, so bulk traffic never has
+    more than ``workers`` upstream calls in flight. Workers also hold back
+    while interactive requests use more than ``max_share`` of the adaptive
+    upstream concurrency limit, keeping bulk jobs out of the way of users.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 10000, max_share: float = 0.5):
+        self.workers = workers
+        self.max_share = max_share
+        self._queue: Optional[asyncio.Queue] = None
+        self._max_queue = max_queue
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=int(os.getenv("BATCH_WORKERS", 4)),
+            max_queue=int(os.getenv("BATCH_MAX_QUEUE", 10000)),
+            max_share=float(os.getenv("BATCH_MAX_UPSTREAM_SHARE", 0.5)),
+        )
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self._max_queue)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "workers": self.workers,
+        }
+
+    async def _yield_to_interactive(self):
+        limiter = resilience.limiter
+        while limiter.in_flight >= max(1, int(limiter.limit * self.max_share)):
+            await asyncio.sleep(0.05)
+
+    async def _worker(self):
+        while True:
+            job_id, fn, results, cancelled = await self._queue.get()
+            try:
+                if cancelled.is_set():
+                    self.stats["cancelled"] += 1
+                    continue
+                await self._yield_to_interactive()
+                try:
+                    result = await fn()
+                    self.stats["completed"] += 1
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+                    self.stats["failed"] += 1
+                await results.put((job_id, result))
+            finally:
+                self._queue.task_done()
+
+    async def run(self, jobs: List[tuple]) -> AsyncIterator[tuple]:
+        """Queue ``(job_id, fn)`` pairs and yield ``(job_id, result)`` as each
+        finishes, in completion order. Jobs still queued when the consumer
+        stops iterating are dropped."""
+        if not self._tasks:
+            await self.start()
+        results: asyncio.Queue = asyncio.Queue()
+        cancelled = asyncio.Event()
+
+        async def feed():
+            # Enqueue in the background so results stream out while a large
+            # batch is still waiting for room in the queue
+            for job_id, fn in jobs:
+                await self._queue.put((job_id, fn, results, cancelled))
+                self.stats["submitted"] += 1
+
+        feeder = asyncio.ensure_future(feed())
+        try:
+            for _ in range(len(jobs)):
+                yield await results.get()
+        finally:
+            cancelled.set()
+            feeder.cancel()
+
+
+batch_queue = BatchQueue.from_env()
@@ -0,0 +1,61 @@
+import os
+import threading
+from contextlib import contextmanager
+
+# How long a caller waits for an upstream slot before it is shed; shared by
+# the Flask limiter here and the FastAPI limiter in services/resilience.py
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", 5.0))
+
+
+class LimiterBusy(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight upstream calls per process.
+
+    Callers wait up to ``queue_timeout`` seconds for a slot and are shed with
+    ``LimiterBusy`` after that, so a burst turns into fast 503s instead of a
+    pile of threads all stuck on the upstream.
+    """
+
+    def __init__(self, max_in_flight: int = 256, queue_timeout: float = 5.0):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_in_flight=int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", 256)),
+            queue_timeout=UPSTREAM_QUEUE_TIMEOUT,
+        )
+
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise LimiterBusy()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "rejected": self.rejected,
+            }
+
+
+upstream_limiter = ConcurrencyLimiter.from_env()
@@ -0,0 +1,321 @@
+import asyncio
+import html
+import logging
+import os
+import re
+from typing import List, Optional
+
+from sqlalchemy import select, text, update
+from starlette.concurrency import run_in_threadpool
+
+from services.conversations import ConversationStore, conversations
+from services.database import conversation_search_state, database
+
+logger = logging.getLogger("eezlegal.conversation_search")
+
+# Snippet markers that can't occur in stored text; swapped for <mark> tags
+# after the snippet has been HTML-escaped
+MARK_OPEN, MARK_CLOSE = "\x02", "\x03"
+
+_TERM = re.compile(r'"([^"]+)"|(\w+)', re.UNICODE)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SQLITE_DDL = [
+    # Messages are copied rather than referenced (external content), as the
+    # conversation store may live in a different database file
+    "CREATE VIRTUAL TABLE IF NOT EXISTS conversation_search USING fts5("
+    "owner, content, conversation_id UNINDEXED, role UNINDEXED, created_at UNINDEXED, "
+    "tokenize = 'porter unicode61 remove_diacritics 2')",
+]
+
+POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS conversation_search ("
+    "message_id BIGINT PRIMARY KEY, user_id VARCHAR(64) NOT NULL, "
+    "conversation_id VARCHAR(64) NOT NULL, role VARCHAR(16) NOT NULL, "
+    "content TEXT NOT NULL, created_at DOUBLE PRECISION NOT NULL, "
+    "document TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', content)) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_conversation_search_document ON conversation_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_conversation_search_user_id ON conversation_search (user_id)",
+]
+
+SQLITE_INSERT = text(
+    "INSERT INTO conversation_search (rowid, owner, content, conversation_id, role, created_at) "
+    "VALUES (:id, :owner, :content, :conversation_id, :role, :created_at)"
+)
+
+POSTGRES_INSERT = text(
+    "INSERT INTO conversation_search (message_id, user_id, conversation_id, role, content, created_at) "
+    "VALUES (:id, :user_id, :conversation_id, :role, :content, :created_at) "
+    "ON CONFLICT (message_id) DO NOTHING"
+)
+
+# FTS5's bm25() counts every row matching each term across all users to
+# get its IDF, which takes seconds for common words at millions of rows.
+# Instead the newest matches of the one user are fetched (cheap, as the
+# owner token narrows the match) and ranked in Python.
+SQLITE_SEARCH = text(
+    "SELECT rowid, conversation_id, role, created_at, highlight(conversation_search, 1, :open, :close) "
+    "FROM conversation_search WHERE conversation_search MATCH :match "
+    "ORDER BY rowid DESC LIMIT :candidates"
+)
+
+POSTGRES_SEARCH = text(
+    "SELECT message_id, conversation_id, role, created_at, ts_headline('english', content, q, :headline) "
+    "FROM conversation_search, websearch_to_tsquery('english', :query) AS q "
+    "WHERE user_id = :user_id AND document @@ q "
+    "ORDER BY ts_rank_cd(document, q) DESC, message_id DESC LIMIT :limit OFFSET :offset"
+)
+
+
+def owner_token(user_id: str) -> str:
+    # One hex token per user, so the owner filter is a single exact FTS term
+    return "u" + str(user_id).encode("utf-8").hex()
+
+
+def fts_query(query: str) -> Optional[str]:
+    """FTS5 expression for a search box query: words and "quoted phrases",
+    all required. Everything is quoted, so FTS5 operators typed by users are
+    taken literally. Prefix queries are left out; without a prefix index
+    they merge the postings of every matching term."""
+    terms = []
+    for phrase, word in _TERM.findall(query):
+        terms.append('"' + (phrase or word).replace('"', "") + '"')
+    return " ".join(terms) or None
+
+
+def rank_matches(rows: List[tuple]) -> List[tuple]:
+    """Order highlighted matches by BM25-style saturation of their hit count
+    against message length; ties go to the newer message."""
+    lengths = [len(row[4].split()) for row in rows]
+    average = sum(lengths) / len(lengths)
+
+    def score(item):
+        row, length = item
+        hits = row[4].count(MARK_OPEN)
+        return hits * (BM25_K1 + 1) / (hits + BM25_K1 * (1 - BM25_B + BM25_B * length / average))
+
+    ranked = sorted(zip(rows, lengths), key=score, reverse=True)
+    return [row for row, _ in ranked]
+
+
+def snippet(highlighted: str, words: int) -> str:
+    """About ``words`` words of a highlighted message around its first hit."""
+    tokens = highlighted.split()
+    first = next((i for i, token in enumerate(tokens) if MARK_OPEN in token), 0)
+    start = max(0, first - words // 3)
+    text = " ".join(tokens[start:start + words])
+    # Keep marks balanced when the window cuts through a highlighted phrase
+    if text.find(MARK_CLOSE) != -1 and (text.find(MARK_OPEN) == -1 or text.find(MARK_CLOSE) < text.find(MARK_OPEN)):
+        text = MARK_OPEN + text
+    if text.count(MARK_OPEN) > text.count(MARK_CLOSE):
+        text += MARK_CLOSE
+    return ("…" if start else "") + text + ("…" if start + words < len(tokens) else "")
+
+
+def render_snippet(text: str) -> str:
+    return html.escape(text).replace(MARK_OPEN, "<mark>").replace(MARK_CLOSE, "</mark>")
+
+
+class ConversationSearch:
+    """Ranked, highlighted full-text search over each user's saved messages.
+
+    Writes never touch the index: ``notify()`` just wakes a background task
+    that copies new messages from the conversation store in batches, and a
+    poll every ``interval`` seconds picks up messages written by other
+    worker processes. The high-water mark lives in the database and is
+    advanced with a compare-and-set in the same transaction as the insert,
+    so concurrent indexers never add a message twice.
+
+    SQLite uses an FTS5 table with the owner as an indexed token; Postgres
+    a generated ``tsvector`` column with a GIN index.
+
+    The in-memory conversation store is not indexed: its message ids start
+    over in every process, so they can't advance the shared mark. Nor is a
+    SQLite store under a Postgres ``DATABASE_URL``: each host would have its
+    own conversation file but share the mark, so startup refuses that setup
+    unless search is turned off with ``CONVERSATION_SEARCH=off``.
+    """
+
+    def __init__(
+        self,
+        store: ConversationStore,
+        batch_size: int = 1000,
+        interval: float = 2.0,
+        snippet_words: int = 24,
+        max_limit: int = 50,
+        max_candidates: int = 1000,
+        enabled: bool = True,
+    ):
+        self.store = store
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.interval = interval
+        self.snippet_words = snippet_words
+        self.max_limit = max_limit
+        self.max_candidates = max_candidates
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.stats = {"indexed": 0, "batches": 0, "conflicts": 0, "errors": 0, "searches": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            conversations,
+            batch_size=int(os.getenv("SEARCH_INDEX_BATCH", 1000)),
+            interval=float(os.getenv("SEARCH_INDEX_INTERVAL", 2.0)),
+            snippet_words=int(os.getenv("SEARCH_SNIPPET_WORDS", 24)),
+            max_candidates=int(os.getenv("SEARCH_MAX_CANDIDATES", 1000)),
+            enabled=os.getenv("CONVERSATION_SEARCH", "on").lower() != "off",
+        )
+
+    @property
+    def indexed(self) -> bool:
+        return self.enabled and self.store.searchable
+
+    async def start(self):
+        if not self.enabled:
+            logger.warning("Conversation search is off (CONVERSATION_SEARCH=off)")
+            return
+        if not self.store.searchable:
+            logger.warning("Conversation search is off: %s is not indexed", type(self.store).__name__)
+            return
+        if not database.is_sqlite:
+            # The searchable store is a SQLite file local to this host
+            raise RuntimeError(
+                "Conversation search can't index a local conversation store into a shared Postgres database; "
+                "set CONVERSATION_SEARCH=off or use a SQLite DATABASE_URL"
+            )
+        async with database.engine.begin() as conn:
+            for statement in SQLITE_DDL if database.is_sqlite else POSTGRES_DDL:
+                await conn.execute(text(statement))
+            await conn.execute(text(
+                "INSERT INTO conversation_search_state (id, last_message_id) "
+                "SELECT 1, 0 WHERE NOT EXISTS (SELECT 1 FROM conversation_search_state WHERE id = 1)"
+            ))
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._closing = True
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self):
+        """Call after storing messages to index them without waiting for the poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        # Checked as well as cancelling: before Python 3.12, wait_for() can
+        # swallow a cancellation that lands just as the event is set
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.catch_up()
+            except Exception:
+                # Retried on the next wake-up or poll
+                self.stats["errors"] += 1
+
+    async def catch_up(self) -> int:
+        """Index every stored message not indexed yet; returns how many were read."""
+        total = 0
+        while True:
+            count = await self._index_batch()
+            total += count
+            if count < self.batch_size:
+                return total
+
+    async def _index_batch(self) -> int:
+        async with database.session() as session:
+            last_id = (await session.execute(
+                select(conversation_search_state.c.last_message_id).where(conversation_search_state.c.id == 1)
+            )).scalar_one()
+        rows = await run_in_threadpool(self.store.messages_since, last_id, self.batch_size)
+        if not rows:
+            return 0
+
+        # Conversations without an owner can't be searched by anyone
+        owned = [
+            {**row, "user_id": str(row["user_id"]), "owner": owner_token(row["user_id"])}
+            for row in rows if row["user_id"] is not None
+        ]
+        async with database.session() as session:
+            advanced = await session.execute(
+                update(conversation_search_state)
+                .where(conversation_search_state.c.id == 1, conversation_search_state.c.last_message_id == last_id)
+                .values(last_message_id=rows[-1]["id"])
+            )
+            if advanced.rowcount != 1:
+                # Another worker indexed this batch first
+                await session.rollback()
+                self.stats["conflicts"] += 1
+                return len(rows)
+            if owned:
+                await session.execute(SQLITE_INSERT if database.is_sqlite else POSTGRES_INSERT, owned)
+            await session.commit()
+        self.stats["indexed"] += len(owned)
+        self.stats["batches"] += 1
+        return len(rows)
+
+    async def search(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> dict:
+        """One page of ``user_id``'s messages matching ``query``, best first.
+
+        On SQLite only the newest ``max_candidates`` matches are ranked.
+        """
+        limit = min(max(limit, 1), self.max_limit)
+        offset = max(offset, 0)
+        self.stats["searches"] += 1
+        if not self.indexed:
+            return {"results": [], "next_offset": None}
+        if database.is_sqlite:
+            terms = fts_query(query)
+            if terms is None:
+                return {"results": [], "next_offset": None}
+            params = {
+                "match": f"owner : {owner_token(user_id)} AND content : ({terms})",
+                "open": MARK_OPEN,
+                "close": MARK_CLOSE,
+                "candidates": self.max_candidates,
+            }
+            async with database.session() as session:
+                rows = (await session.execute(SQLITE_SEARCH, params)).all()
+            rows = rank_matches(rows)[offset:offset + limit + 1] if rows else []
+            rows = [row[:4] + (snippet(row[4], self.snippet_words),) for row in rows]
+        else:
+            params = {
+                "query": query,
+                "user_id": str(user_id),
+                "headline": f"StartSel={MARK_OPEN}, StopSel={MARK_CLOSE}, MaxWords={self.snippet_words}, MinWords=8",
+                "limit": limit + 1,
+                "offset": offset,
+            }
+            async with database.session() as session:
+                rows = (await session.execute(POSTGRES_SEARCH, params)).all()
+
+        results: List[dict] = [
+            {
+                "message_id": message_id,
+                "conversation_id": conversation_id,
+                "role": role,
+                "created_at": created_at,
+                "snippet": render_snippet(text),
+            }
+            for message_id, conversation_id, role, created_at, text in rows[:limit]
+        ]
+        # One extra row tells whether another page exists without a COUNT(*)
+        return {"results": results, "next_offset": offset + limit if len(rows) > limit else None}
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+
+conversation_search = ConversationSearch.from_env()
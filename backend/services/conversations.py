@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional
+
+DEFAULT_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "app.db"
+)
+
+
+class ConversationNotFound(Exception):
+    pass
+
+
+class ConversationStore(ABC):
+    """Server-side chat history, so clients only send the newest message.
+
+    A conversation created for a user can only be read or extended by that
+    user; to anyone else it doesn't exist. Anonymous conversations are
+    reachable by whoever holds their (random) id.
+    """
+
+    # Whether message ids are stable across processes and restarts, so the
+    # search index can keep a shared high-water mark over them. Searchable
+    # stores provide ``messages_since(after_id, limit)``.
+    searchable = False
+
+    @abstractmethod
+    def create(self, user_id: Optional[str] = None) -> str:
+        ...
+
+    @abstractmethod
+    def append(self, conversation_id: str, role: str, content: str, user_id: Optional[str] = None):
+        ...
+
+    @abstractmethod
+    def messages(self, conversation_id: str, user_id: Optional[str] = None) -> List[dict]:
+        ...
+
+
+def check_owner(conversation_id: str, owner: Optional[str], user_id: Optional[str]):
+    if owner is not None and owner != user_id:
+        raise ConversationNotFound(conversation_id)
+
+
+class MemoryConversationStore(ConversationStore):
+    def __init__(self):
+        self._conversations = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id=None):
+        conversation_id = uuid.uuid4().hex
+        with self._lock:
+            self._conversations[conversation_id] = []
+            self._owners[conversation_id] = user_id
+        return conversation_id
+
+    def append(self, conversation_id, role, content, user_id=None):
+        with self._lock:
+            if conversation_id not in self._conversations:
+                raise ConversationNotFound(conversation_id)
+            check_owner(conversation_id, self._owners[conversation_id], user_id)
+            self._conversations[conversation_id].append({"role": role, "content": content})
+
+    def messages(self, conversation_id, user_id=None):
+        with self._lock:
+            if conversation_id not in self._conversations:
+                raise ConversationNotFound(conversation_id)
+            check_owner(conversation_id, self._owners[conversation_id], user_id)
+            return list(self._conversations[conversation_id])
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Persists turns in SQLite and keeps recently active conversations in memory.
+
+    A cached transcript remembers the last row it has seen, so an active
+    conversation only ever reads the turns added since (possibly by another
+    worker process) instead of its full history.
+    """
+
+    searchable = True
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, cache_size: int = 512):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _create_schema(self, db):
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation ("
+            "id TEXT PRIMARY KEY, user_id TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_message ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "conversation_id TEXT NOT NULL REFERENCES conversation (id), "
+            "role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS ix_conversation_message_conversation_id "
+            "ON conversation_message (conversation_id, id)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS ix_conversation_user_id ON conversation (user_id)")
+        db.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        if not self._schema_ready:
+            self._create_schema(db)
+            self._schema_ready = True
+        return db
+
+    def _remember(self, conversation_id, messages):
+        # Caller holds the lock
+        self._recent[conversation_id] = messages
+        self._recent.move_to_end(conversation_id)
+        while len(self._recent) > self.cache_size:
+            self._recent.popitem(last=False)
+
+    def create(self, user_id=None):
+        conversation_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as db:
+            db.execute(
+                "INSERT INTO conversation (id, user_id, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, user_id, now, now),
+            )
+        with self._lock:
+            self._remember(conversation_id, {"owner": user_id, "last_id": 0, "messages": []})
+        return conversation_id
+
+    def append(self, conversation_id, role, content, user_id=None):
+        now = time.time()
+        with self._connection() as db:
+            updated = db.execute(
+                "UPDATE conversation SET updated_at = ? WHERE id = ? AND (user_id IS NULL OR user_id = ?)",
+                (now, conversation_id, user_id),
+            ).rowcount
+            if not updated:
+                raise ConversationNotFound(conversation_id)
+            db.execute(
+                "INSERT INTO conversation_message (conversation_id, role, content, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (conversation_id, role, content, now),
+            )
+
+    def messages(self, conversation_id, user_id=None):
+        db = self._connection()
+        with self._lock:
+            cached = self._recent.get(conversation_id)
+            last_id = cached["last_id"] if cached else 0
+        # The lock only guards the cache; queries run outside it so one slow
+        # read doesn't hold up every other conversation
+        if cached is None:
+            row = db.execute("SELECT user_id FROM conversation WHERE id = ?", (conversation_id,)).fetchone()
+            if row is None:
+                raise ConversationNotFound(conversation_id)
+            cached = {"owner": row[0], "last_id": 0, "messages": []}
+        check_owner(conversation_id, cached["owner"], user_id)
+        rows = db.execute(
+            "SELECT id, role, content FROM conversation_message "
+            "WHERE conversation_id = ? AND id > ? ORDER BY id",
+            (conversation_id, last_id),
+        ).fetchall()
+        with self._lock:
+            # Another thread may have caught up the same transcript meanwhile
+            for row_id, role, content in rows:
+                if row_id > cached["last_id"]:
+                    cached["messages"].append({"role": role, "content": content})
+                    cached["last_id"] = row_id
+            self._remember(conversation_id, cached)
+            return list(cached["messages"])
+
+    def messages_since(self, after_id: int, limit: int) -> List[dict]:
+        """Messages of all conversations with an id above ``after_id``, oldest
+        first, with the owning ``user_id``; feeds the search index."""
+        rows = self._connection().execute(
+            "SELECT m.id, m.conversation_id, c.user_id, m.role, m.content, m.created_at "
+            "FROM conversation_message m JOIN conversation c ON c.id = m.conversation_id "
+            "WHERE m.id > ? ORDER BY m.id LIMIT ?",
+            (after_id, limit),
+        ).fetchall()
+        keys = ("id", "conversation_id", "user_id", "role", "content", "created_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+
+def store_from_env() -> ConversationStore:
+    if os.getenv("CONVERSATION_STORE", "sqlite") == "memory":
+        return MemoryConversationStore()
+    return SQLiteConversationStore(
+        db_path=os.getenv("CONVERSATION_DB", DEFAULT_DB_PATH),
+        cache_size=int(os.getenv("CONVERSATION_CACHE_SIZE", 512)),
+    )
+
+
+conversations = store_from_env()
@@ -0,0 +1,289 @@
+import os
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, event
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+DEFAULT_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "app.db"
+)
+
+metadata = MetaData()
+
+# Same table the Flask app maps in models/user.py
+users = Table(
+    "user",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(80), unique=True, nullable=False),
+    Column("email", String(120), unique=True, nullable=False),
+)
+
+# Display names of the FastAPI accounts. ``user.username`` is unique, so
+# signup derives it from the email and keeps the name people chose here.
+user_profiles = Table(
+    "user_profile",
+    metadata,
+    Column("user_id", Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
+    Column("display_name", String(120), nullable=False),
+)
+
+# Password hashes for the FastAPI accounts, kept beside the Flask table
+credentials = Table(
+    "user_credential",
+    metadata,
+    Column("user_id", Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
+    Column("password_hash", Text, nullable=False),
+    Column("updated_at", Float, nullable=False),
+)
+
+# Verified phone numbers; a number signs in to the account it is linked to
+user_phones = Table(
+    "user_phone",
+    metadata,
+    Column("phone", String(32), primary_key=True),
+    Column("user_id", Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("created_at", Float, nullable=False),
+)
+
+subscriptions = Table(
+    "subscription",
+    metadata,
+    Column("user_id", String(64), primary_key=True),
+    Column("status", String(32), nullable=False, default="active"),
+    Column("plan", String(32), nullable=False, default="free"),
+    Column("expires_at", Float),
+    Column("stripe_customer_id", String(64)),
+    Column("updated_at", Float, nullable=False),
+)
+
+# Token usage per user and period ("day:2024-06-01", "month:2024-06")
+usage = Table(
+    "usage",
+    metadata,
+    Column("user_id", String(64), primary_key=True),
+    Column("period", String(16), primary_key=True),
+    Column("prompt_tokens", Integer, nullable=False, default=0),
+    Column("completion_tokens", Integer, nullable=False, default=0),
+    Column("requests", Integer, nullable=False, default=0),
+    Column("updated_at", Float, nullable=False),
+)
+
+# Write-ahead log segments already folded into ``usage``
+usage_flushes = Table(
+    "usage_flush",
+    metadata,
+    Column("segment", String(64), primary_key=True),
+    Column("flushed_at", Float, nullable=False),
+)
+
+# How far the conversation search index has caught up with stored messages
+conversation_search_state = Table(
+    "conversation_search_state",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("last_message_id", Integer, nullable=False),
+)
+
+# Background jobs (SMS, email); rows stay after success until the retention
+# window ends so a repeated idempotency key is still recognised
+jobs = Table(
+    "job",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("kind", String(32), nullable=False),
+    Column("payload", Text),
+    Column("idempotency_key", String(128), unique=True),
+    Column("status", String(16), nullable=False, default="queued"),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("run_at", Float, nullable=False),
+    Column("locked_until", Float),
+    Column("last_error", Text),
+    Column("created_at", Float, nullable=False),
+    Column("updated_at", Float, nullable=False),
+    Index("ix_job_status_run_at", "status", "run_at"),
+    # Ids double as dead-letter ids, so SQLite must never reuse them
+    sqlite_autoincrement=True,
+)
+
+# Jobs that ran out of attempts or failed permanently, kept for inspection
+job_dead_letters = Table(
+    "job_dead_letter",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("kind", String(32), nullable=False),
+    Column("payload", Text),
+    Column("idempotency_key", String(128)),
+    Column("attempts", Integer, nullable=False),
+    Column("last_error", Text),
+    Column("created_at", Float, nullable=False),
+    Column("failed_at", Float, nullable=False),
+)
+
+# Ids of logged-out tokens, kept until the tokens would have expired anyway
+revoked_tokens = Table(
+    "revoked_token",
+    metadata,
+    Column("jti", String(32), primary_key=True),
+    Column("expires_at", Float, nullable=False, index=True),
+)
+
+# Outstanding phone verification codes, stored as keyed hashes
+phone_verifications = Table(
+    "phone_verification",
+    metadata,
+    Column("phone", String(32), primary_key=True),
+    Column("code_hash", String(64), nullable=False),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("sent_at", Float, nullable=False),
+    Column("expires_at", Float, nullable=False),
+)
+
+# Recent code sends per number and per client address, for the rolling caps;
+# keys are keyed hashes, so neither is stored in plain text
+phone_verification_sends = Table(
+    "phone_verification_send",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("key", String(64), nullable=False),
+    Column("sent_at", Float, nullable=False),
+    Index("ix_phone_verification_send_key_sent_at", "key", "sent_at"),
+    Index("ix_phone_verification_send_sent_at", "sent_at"),
+)
+
+
+def async_url(url: str) -> str:
+    """Map the URLs hosting platforms hand out onto async drivers."""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+class Database:
+    """Async SQLAlchemy engine shared by the FastAPI app.
+
+    SQLite runs in WAL mode so readers never block on the writer, and keeps
+    a per-connection prepared statement cache. Postgres gets a bounded pool
+    with pre-ping and asyncpg's statement cache.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = 10,
+        max_overflow: int = 10,
+        pool_timeout: float = 10.0,
+        pool_recycle: int = 1800,
+        statement_cache_size: int = 256,
+        echo: bool = False,
+    ):
+        self.url = async_url(url)
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self.statement_cache_size = statement_cache_size
+        self.echo = echo
+        self._engine: Optional["AsyncEngine"] = None
+        self._sessions = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("DATABASE_URL") or f"sqlite+aiosqlite:///{DEFAULT_DB_PATH}",
+            pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)),
+            statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", 256)),
+            echo=os.getenv("DB_ECHO", "").lower() in ("1", "true"),
+        )
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.url.startswith("sqlite")
+
+    def _create_engine(self) -> "AsyncEngine":
+        # The asyncio extension is imported here, at start-up, rather than
+        # by every feature module that only needs the table definitions
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+        if self.is_sqlite:
+            # aiosqlite defaults to NullPool, which takes no pool arguments
+            engine = create_async_engine(
+                self.url,
+                echo=self.echo,
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=self.pool_size,
+                max_overflow=self.max_overflow,
+                pool_timeout=self.pool_timeout,
+                connect_args={"cached_statements": self.statement_cache_size, "timeout": 15},
+            )
+
+            @event.listens_for(engine.sync_engine, "connect")
+            def _sqlite_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA foreign_keys=ON")
+                cursor.close()
+
+            return engine
+
+        return create_async_engine(
+            self.url,
+            echo=self.echo,
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=True,
+            connect_args={"statement_cache_size": self.statement_cache_size},
+        )
+
+    @property
+    def engine(self) -> "AsyncEngine":
+        # Created lazily so the engine binds to the running event loop
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+            self._engine = self._create_engine()
+            self._sessions = async_sessionmaker(self._engine, expire_on_commit=False)
+        return self._engine
+
+    async def start(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+
+    async def close(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+            self._sessions = None
+
+    def session(self) -> "AsyncSession":
+        if self._sessions is None:
+            self.engine
+        return self._sessions()
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        return {
+            "driver": self.engine.dialect.driver,
+            "pool_size": self.pool_size,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        }
+
+
+database = Database.from_env()
+
+
+async def get_session() -> AsyncIterator["AsyncSession"]:
+    """FastAPI dependency: one pooled session per request."""
+    async with database.session() as session:
+        yield session
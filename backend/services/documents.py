@@ -0,0 +1,511 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from services.prompt import MESSAGE_OVERHEAD, text_tokens
+from services.prompt_registry import prompt_registry
+from services.upstream import upstream
+
+SECTION_TEMPLATE = prompt_registry.get("document_section")
+
+logger = logging.getLogger("eezlegal.documents")
+
+PDF_MAGIC = b"%PDF-"
+# Form fields sent alongside the file (e.g. ``question``) are small
+MAX_FIELD_BYTES = 4096
+# Plain-text uploads are read in blocks of about this size
+TEXT_BLOCK_CHARS = 32 * 1024
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+")
+_JSON_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+ATTORNEY_STEP = "Consider consulting with a qualified attorney"
+DISCLAIMER = "*I'm an AI legal assistant, not a lawyer. This is general info, not legal advice.*"
+
+
+class DocumentError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class SpooledUpload:
+    path: str
+    filename: str
+    kind: str
+    size: int
+    fields: Dict[str, str] = field(default_factory=dict)
+
+    def discard(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _MultipartSpooler:
+    """python-multipart callbacks that write the file part straight to disk."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.fields: Dict[str, str] = {}
+        self.path: Optional[str] = None
+        self.filename: Optional[str] = None
+        self.size = 0
+        self._file = None
+        self._field_name: Optional[str] = None
+        self._field_value = bytearray()
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": lambda data, start, end: self._header_field.extend(data[start:end]),
+            "on_header_value": lambda data, start, end: self._header_value.extend(data[start:end]),
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._field_name = None
+        self._field_value = bytearray()
+
+    def on_header_end(self):
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if filename is None:
+            self._field_name = name
+            return
+        if self.path is not None:
+            raise DocumentError(400, "Upload one document at a time")
+        self.filename = os.path.basename(filename.decode("utf-8", "replace")) or "document"
+        fd, self.path = tempfile.mkstemp(prefix="upload-", dir=self.directory)
+        self._file = os.fdopen(fd, "wb")
+
+    def on_part_data(self, data, start, end):
+        if self._file is not None:
+            self._file.write(data[start:end])
+            self.size += end - start
+        elif self._field_name is not None:
+            self._field_value.extend(data[start:end])
+            if len(self._field_value) > MAX_FIELD_BYTES:
+                raise DocumentError(413, f"Form field {self._field_name!r} is too large")
+
+    def on_part_end(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self._field_name is not None:
+            self.fields[self._field_name] = self._field_value.decode("utf-8", "replace")
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None:
+            os.unlink(self.path)
+            self.path = None
+
+
+def _sniff(path: str, filename: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(1024)
+    if head.startswith(PDF_MAGIC):
+        return "pdf"
+    if b"\x00" in head or filename.lower().endswith((".doc", ".docx", ".pdf")):
+        raise DocumentError(415, "Upload a PDF or a plain-text document")
+    return "text"
+
+
+async def spool_upload(request, directory: str, max_bytes: int) -> SpooledUpload:
+    """Stream a multipart upload to a file in ``directory``.
+
+    The body is parsed as it arrives, so memory use does not depend on the
+    document's size. The caller owns the file and must ``discard()`` it.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise DocumentError(415, "Send the document as multipart/form-data")
+
+    spooler = _MultipartSpooler(directory)
+    parser = MultipartParser(params[b"boundary"], spooler.callbacks())
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes:
+                raise DocumentError(413, f"Documents can be at most {max_bytes // (1024 * 1024)} MB")
+            parser.write(chunk)
+        parser.finalize()
+        if spooler.path is None or spooler._file is not None:
+            raise DocumentError(400, "No document found in the upload")
+        kind = _sniff(spooler.path, spooler.filename)
+    except Exception:
+        spooler.abort()
+        raise
+    return SpooledUpload(spooler.path, spooler.filename, kind, spooler.size, spooler.fields)
+
+
+def extract_pages(upload: SpooledUpload) -> Iterator[str]:
+    """Yield the document's text a page at a time.
+
+    Plain-text files have no pages and come out in blocks of roughly
+    ``TEXT_BLOCK_CHARS`` that end on a blank line where possible.
+    """
+    if upload.kind == "pdf":
+        # pypdf is only needed for document uploads
+        from pypdf import PdfReader
+        from pypdf.errors import PdfReadError
+
+        with open(upload.path, "rb") as f:
+            try:
+                reader = PdfReader(f)
+                if reader.is_encrypted:
+                    raise DocumentError(422, "Password-protected PDFs are not supported")
+                for page in reader.pages:
+                    yield page.extract_text() or ""
+            except PdfReadError as e:
+                raise DocumentError(422, f"Could not read the PDF: {e}")
+        return
+
+    block: List[str] = []
+    size = 0
+    with open(upload.path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= TEXT_BLOCK_CHARS and (not line.strip() or size >= 2 * TEXT_BLOCK_CHARS):
+                yield "".join(block)
+                block, size = [], 0
+    if block:
+        yield "".join(block)
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    tokens: int
+    first_page: int
+    last_page: int
+
+
+class TextChunker:
+    """Packs paragraphs into chunks of at most ``max_tokens`` tokens.
+
+    Text is fed a page at a time and finished chunks are returned right away,
+    so only the chunk being filled is held in memory. Paragraphs that are too
+    long on their own are split by sentence, then by word.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.count = 0
+        self._parts: List[str] = []
+        self._tokens = 0
+        self._first_page = 0
+
+    def _pieces(self, paragraph: str) -> Iterator[Tuple[str, int]]:
+        tokens = text_tokens(paragraph)
+        if tokens <= self.max_tokens:
+            yield paragraph, tokens
+            return
+        for sentence in _SENTENCE_END.split(paragraph):
+            tokens = text_tokens(sentence)
+            if tokens <= self.max_tokens:
+                yield sentence, tokens
+                continue
+            words = sentence.split()
+            # Rough words-per-token ratio of this sentence, with some margin
+            step = max(1, int(len(words) * self.max_tokens / tokens * 0.9))
+            for i in range(0, len(words), step):
+                piece = " ".join(words[i:i + step])
+                yield piece, text_tokens(piece)
+
+    def _emit(self, page: int) -> Chunk:
+        chunk = Chunk(self.count, "\n\n".join(self._parts), self._tokens, self._first_page, page)
+        self.count += 1
+        self._parts, self._tokens = [], 0
+        return chunk
+
+    def add(self, text: str, page: int) -> List[Chunk]:
+        chunks = []
+        for paragraph in _PARAGRAPH.split(text):
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+            for piece, tokens in self._pieces(paragraph):
+                if self._parts and self._tokens + tokens > self.max_tokens:
+                    chunks.append(self._emit(page))
+                if not self._parts:
+                    self._first_page = page
+                self._parts.append(piece)
+                self._tokens += tokens
+        return chunks
+
+    def finish(self, page: int) -> List[Chunk]:
+        return [self._emit(page)] if self._parts else []
+
+
+def parse_notes(content: str) -> dict:
+    """Read a section analysis, tolerating code fences and non-JSON replies."""
+    try:
+        data = json.loads(_JSON_FENCE.sub("", content.strip()))
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return {"summary": " ".join(content.split())[:300], "points": [], "risks": [], "next_steps": []}
+    notes = {"summary": str(data.get("summary") or "")}
+    for key in ("points", "risks", "next_steps"):
+        values = data.get(key) or []
+        notes[key] = [str(v) for v in (values if isinstance(values, list) else [values]) if v]
+    return notes
+
+
+def _unique(items: List[str], limit: int) -> List[str]:
+    seen, result = set(), []
+    for item in items:
+        key = " ".join(item.lower().split())
+        if key not in seen:
+            seen.add(key)
+            result.append(item)
+        if len(result) == limit:
+            break
+    return result
+
+
+def render_analysis(sections: List[dict]) -> str:
+    """Merge section notes into the chat answer format without another call."""
+    summaries = [s["summary"] for s in sections if s["summary"]]
+    points = _unique([p for s in sections for p in s["points"]], 5)
+    risks = _unique([r for s in sections for r in s["risks"]], 5)
+    steps = _unique([n for s in sections for n in s["next_steps"]], 3) + [ATTORNEY_STEP]
+    lines = ["**TL;DR:**", " ".join(summaries[:2]) or "No notable terms were found.", ""]
+    lines += ["**What this means:**", *[f"• {p}" for p in points], ""]
+    lines += ["**Risks & gotchas:**", *([f"• {r}" for r in risks] or ["• None found"]), ""]
+    lines += ["**Next steps:**", *[f"{i}. {step}" for i, step in enumerate(steps, 1)], ""]
+    lines.append(DISCLAIMER)
+    return "\n".join(lines)
+
+
+def notes_digest(sections: List[dict], max_tokens: int) -> str:
+    """Section notes as compact text for the final merge prompt."""
+    lines, used = [], 0
+    for i, notes in enumerate(sections):
+        parts = [f"Section {i + 1} (pages {notes['pages']}): {notes['summary']}"]
+        for key, label in (("points", "Terms"), ("risks", "Risks"), ("next_steps", "Actions")):
+            if notes[key]:
+                parts.append(f"{label}: " + "; ".join(notes[key]))
+        line = " | ".join(parts)
+        cost = text_tokens(line)
+        if used + cost > max_tokens:
+            lines.append(f"({len(sections) - i} more sections omitted for length)")
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+
+def _add_usage(total: dict, usage: dict):
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        total[key] = total.get(key, 0) + usage.get(key, 0)
+
+
+class DocumentAnalyzer:
+    """Map-reduce analysis of an uploaded document.
+
+    Pages are extracted on a worker thread and packed into token-bounded
+    chunks, and ``parallelism`` tasks analyze chunks concurrently. The chunk
+    queue is bounded, so extraction waits for analysis instead of reading
+    ahead, and only the short per-section notes are kept. Those are merged
+    into the usual TL;DR / risks / next steps answer by one final call.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        max_bytes: int = 25 * 1024 * 1024,
+        max_pages: int = 300,
+        chunk_tokens: int = 3000,
+        parallelism: int = 4,
+        section_max_tokens: int = 400,
+        notes_tokens: int = 3000,
+    ):
+        self.spool_dir = spool_dir
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.chunk_tokens = chunk_tokens
+        self.parallelism = parallelism
+        self.section_max_tokens = section_max_tokens
+        self.notes_tokens = notes_tokens
+        self.stats = {"documents": 0, "pages": 0, "chunks": 0, "failed_chunks": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            spool_dir=os.getenv("DOCUMENT_SPOOL_DIR") or tempfile.gettempdir(),
+            max_bytes=int(os.getenv("DOCUMENT_MAX_MB", 25)) * 1024 * 1024,
+            max_pages=int(os.getenv("DOCUMENT_MAX_PAGES", 300)),
+            chunk_tokens=int(os.getenv("DOCUMENT_CHUNK_TOKENS", 3000)),
+            parallelism=int(os.getenv("DOCUMENT_PARALLELISM", 4)),
+            section_max_tokens=int(os.getenv("DOCUMENT_SECTION_MAX_TOKENS", 400)),
+            notes_tokens=int(os.getenv("DOCUMENT_NOTES_TOKENS", 3000)),
+        )
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+    async def spool(self, request) -> SpooledUpload:
+        try:
+            return await spool_upload(request, self.spool_dir, self.max_bytes)
+        except DocumentError:
+            self.stats["rejected"] += 1
+            raise
+
+    async def _analyze_chunk(self, api_key: str, model: str, chunk: Chunk) -> Tuple[dict, dict]:
+        messages = [{"role": "user", "content": chunk.text}]
+        body = SECTION_TEMPLATE.render_body(messages, model, self.section_max_tokens, 0.2)
+        tokens = chunk.tokens + text_tokens(SECTION_TEMPLATE.text) + 2 * MESSAGE_OVERHEAD
+        response = await upstream.chat_completion(api_key, body, tokens + self.section_max_tokens)
+        if response.status_code != 200:
+            raise DocumentError(502, "OpenAI API error")
+        result = response.json()
+        notes = parse_notes(result["choices"][0]["message"]["content"])
+        pages = str(chunk.first_page) if chunk.first_page == chunk.last_page else f"{chunk.first_page}-{chunk.last_page}"
+        notes["pages"] = pages
+        return notes, result.get("usage", {})
+
+    async def analyze(
+        self,
+        upload: SpooledUpload,
+        api_key: str,
+        model: str,
+        before_call: Optional[Callable[[], Awaitable[None]]] = None,
+        on_usage: Optional[Callable[[dict], None]] = None,
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """Yield ``(event, data)`` pairs: ``progress`` while pages are read and
+        sections analyzed, then ``sections`` with the merged notes. Raises
+        ``DocumentError`` when the document cannot be analyzed.
+
+        ``before_call`` is awaited before each chunk call (an exception it
+        raises ends the analysis) and ``on_usage`` gets each chunk's usage as
+        soon as the call returns."""
+        events: asyncio.Queue = asyncio.Queue()
+        chunks: asyncio.Queue = asyncio.Queue(self.parallelism)
+        sections: Dict[int, dict] = {}
+        usage: dict = {}
+        progress = {"pages": 0, "chunks": 0, "analyzed": 0, "failed": 0}
+
+        async def produce():
+            chunker = TextChunker(self.chunk_tokens)
+            pages = extract_pages(upload)
+            reading = None
+            try:
+                while True:
+                    reading = asyncio.ensure_future(run_in_threadpool(next, pages, None))
+                    text = await asyncio.shield(reading)
+                    if text is None:
+                        break
+                    progress["pages"] += 1
+                    if progress["pages"] > self.max_pages:
+                        raise DocumentError(413, f"Documents can have at most {self.max_pages} pages")
+                    for chunk in chunker.add(text, progress["pages"]):
+                        progress["chunks"] += 1
+                        await chunks.put(chunk)
+                    await events.put(("progress", {"stage": "extracting", **progress}))
+            finally:
+                # On cancellation the page being read is still running in its
+                # thread; closing the generator before it returns would raise
+                # "generator already executing"
+                if reading is not None and not reading.done():
+                    reading.add_done_callback(lambda _: pages.close())
+                else:
+                    pages.close()
+            for chunk in chunker.finish(progress["pages"]):
+                progress["chunks"] += 1
+                await chunks.put(chunk)
+            for _ in range(self.parallelism):
+                await chunks.put(None)
+
+        async def work():
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    return
+                if before_call is not None:
+                    await before_call()
+                try:
+                    notes, chunk_usage = await self._analyze_chunk(api_key, model, chunk)
+                    if on_usage is not None:
+                        on_usage(chunk_usage)
+                    sections[chunk.index] = notes
+                    _add_usage(usage, chunk_usage)
+                    progress["analyzed"] += 1
+                except Exception:
+                    logger.exception("Analyzing pages %s-%s failed", chunk.first_page, chunk.last_page)
+                    progress["failed"] += 1
+                await events.put(("progress", {"stage": "analyzing", **progress}))
+
+        async def run():
+            tasks = [asyncio.ensure_future(produce())]
+            tasks += [asyncio.ensure_future(work()) for _ in range(self.parallelism)]
+            try:
+                await asyncio.gather(*tasks)
+                await events.put(None)
+            except Exception as e:
+                await events.put(e)
+            finally:
+                for t in tasks:
+                    t.cancel()
+
+        task = asyncio.ensure_future(run())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+        finally:
+            # Stops extraction and pending chunk calls if the client went away
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        self.stats["documents"] += 1
+        self.stats["pages"] += progress["pages"]
+        self.stats["chunks"] += progress["chunks"]
+        self.stats["failed_chunks"] += progress["failed"]
+        if not progress["chunks"]:
+            raise DocumentError(422, "No text found in the document; scanned PDFs are not supported")
+        if not sections:
+            raise DocumentError(502, "OpenAI API error")
+        yield "sections", {
+            "sections": [sections[i] for i in sorted(sections)],
+            "usage": usage,
+            "document": {"filename": upload.filename, "bytes": upload.size, **progress},
+        }
+
+
+document_analyzer = DocumentAnalyzer.from_env()
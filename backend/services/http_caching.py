@@ -0,0 +1,226 @@
+import hashlib
+import json
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Never compressed: SSE must reach the client event by event, and these
+# formats are compressed already
+SKIP_COMPRESSION = ("text/event-stream", "image/", "video/", "audio/", "application/zip", "application/gzip")
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def json_body(data) -> Tuple[bytes, str]:
+    """Serialize once and return ``(body, etag)`` for responses built at startup."""
+    body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return body, make_etag(body)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers: List[Tuple[bytes, bytes]], *names: bytes) -> List[Tuple[bytes, bytes]]:
+    return [(k, v) for k, v in headers if k.lower() not in names]
+
+
+def _etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    etag = etag[2:] if etag.startswith(b"W/") else etag
+    for candidate in if_none_match.split(b","):
+        candidate = candidate.strip()
+        if candidate == b"*":
+            return True
+        if (candidate[2:] if candidate.startswith(b"W/") else candidate) == etag:
+            return True
+    return False
+
+
+class CachePolicyMiddleware:
+    """Validators and ``Cache-Control`` for polled GET endpoints.
+
+    ``policies`` maps a route template to its ``Cache-Control`` value. For
+    those routes a complete 200 body gets a strong ETag (unless the endpoint
+    set one, e.g. for a response built at startup) and a matching
+    ``If-None-Match`` is answered with an empty 304.
+    """
+
+    def __init__(self, app, policies: Dict[str, str]):
+        self.app = app
+        self.policies = {route: value.encode("latin-1") for route, value in policies.items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+
+        start = None
+        policy = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start, policy
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                policy = self.policies.get(route.path) if route is not None else None
+                if policy is None:
+                    return await send(message)
+                start = message
+                return
+            if start is None:
+                return await send(message)
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            await self._finish(scope, start, b"".join(chunks), policy, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _finish(self, scope, start, body, policy, send):
+        headers = _without(list(start["headers"]), b"cache-control")
+        headers.append((b"cache-control", policy))
+        if start["status"] != 200 or policy.startswith(b"no-store"):
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        etag = _header(headers, b"etag")
+        if etag is None:
+            etag = make_etag(body).encode("latin-1")
+            headers.append((b"etag", etag))
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            headers = [(k, v) for k, v in headers if k.lower() in (b"etag", b"cache-control", b"vary")]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+class _Encoder:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        # Flushed per chunk so streamed NDJSON lines are not held back
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """Brotli or gzip for responses of at least ``minimum_size`` bytes.
+
+    Streamed bodies (NDJSON exports, batch results) are compressed chunk by
+    chunk. Server-sent events and already-encoded bodies pass through. Each
+    encoding gets its own strong ETag (``"<etag>-br"``), and the suffix is
+    stripped from ``If-None-Match`` on the way in so revalidation still works.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose(self, accept_encoding: bytes) -> Optional[str]:
+        accepted = set()
+        for token in accept_encoding.lower().split(b","):
+            name, _, params = token.partition(b";")
+            if params.replace(b" ", b"") not in (b"q=0", b"q=0.0", b"q=0.00", b"q=0.000"):
+                accepted.add(name.strip())
+        if brotli is not None and b"br" in accepted:
+            return "br"
+        if b"gzip" in accepted:
+            return "gzip"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_headers = dict(scope["headers"])
+        encoding = self._choose(request_headers.get(b"accept-encoding", b""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        # The scope is edited in place: routing fills in scope["route"] on this
+        # same dict, and the metrics middleware reads it from there
+        suffix = b"-" + encoding.encode() + b'"'
+        if_none_match = request_headers.get(b"if-none-match", b"")
+        revalidating = suffix in if_none_match
+        if revalidating:
+            stripped = if_none_match.replace(suffix, b'"')
+            scope["headers"] = [(k, stripped if k == b"if-none-match" else v) for k, v in scope["headers"]]
+
+        start = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = message["headers"]
+                content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+                if (
+                    _header(headers, b"content-encoding") is not None
+                    or content_type.startswith(SKIP_COMPRESSION)
+                    or message["status"] in (204, 304)
+                ):
+                    passthrough = True
+                    etag = _header(headers, b"etag")
+                    if message["status"] == 304 and revalidating and etag is not None and etag.endswith(b'"'):
+                        # Echo the validator the client holds for this encoding
+                        headers = _without(list(headers), b"etag") + [(b"etag", etag[:-1] + suffix)]
+                        message = {**message, "headers": headers}
+                    return await send(message)
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality)
+                headers = _without(list(start["headers"]), b"content-length")
+                headers.append((b"content-encoding", encoding.encode()))
+                headers.append((b"vary", b"Accept-Encoding"))
+                etag = _header(headers, b"etag")
+                if etag is not None and etag.endswith(b'"'):
+                    headers = _without(headers, b"etag")
+                    headers.append((b"etag", etag[:-1] + suffix))
+                if not more_body:
+                    compressed = encoder.finish(body)
+                    headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start, "headers": headers})
+                    return await send({"type": "http.response.body", "body": compressed})
+                await send({**start, "headers": headers})
+
+            data = encoder.chunk(body) if more_body else encoder.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,339 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+
+from services.database import database, job_dead_letters, jobs
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("eezlegal.jobs")
+
+Handler = Callable[[dict], Awaitable[None]]
+Redactor = Callable[[dict], dict]
+
+
+class JobQueue:
+    """Durable queue for slow side effects (SMS, email) run off the request path.
+
+    ``enqueue`` is a single insert, so endpoints return as soon as the job is
+    stored. One dispatcher task per process claims due jobs in batches and
+    runs up to ``concurrency`` of them at once; it wakes on ``enqueue`` and
+    otherwise polls every ``interval`` seconds, which also picks up retries
+    and jobs enqueued by other worker processes.
+
+    A claim is a single ``UPDATE ... RETURNING`` that bumps the attempt
+    count and takes a lease of ``lease`` seconds; a job whose worker died is
+    claimed again once the lease runs out, so delivery is at least once. Failures are retried with
+    exponential backoff and jitter. After ``max_attempts``, or at once for
+    exceptions with ``retryable = False``, a job moves to the dead-letter
+    table, keeping only what its kind's ``redact`` lets through of the
+    payload, for ``dead_letter_retention`` seconds. An ``idempotency_key``
+    makes repeated enqueues of the same work a no-op for as long as the
+    finished job is retained.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        interval: float = 1.0,
+        lease: float = 60.0,
+        max_attempts: int = 5,
+        base_backoff: float = 2.0,
+        max_backoff: float = 300.0,
+        retention: float = 86400.0,
+        dead_letter_retention: float = 7 * 86400.0,
+        shutdown_grace: float = 5.0,
+    ):
+        self.concurrency = concurrency
+        self.interval = interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retention = retention
+        self.dead_letter_retention = dead_letter_retention
+        self.shutdown_grace = shutdown_grace
+        self._handlers: Dict[str, Tuple[Handler, int, Optional[Redactor]]] = {}
+        self._running: Dict[asyncio.Task, dict] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._purged_at = 0.0
+        self.stats = {
+            "enqueued": 0, "deduplicated": 0, "claimed": 0, "succeeded": 0,
+            "retried": 0, "dead_lettered": 0, "errors": 0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            concurrency=int(os.getenv("JOB_CONCURRENCY", 8)),
+            interval=float(os.getenv("JOB_POLL_INTERVAL", 1.0)),
+            lease=float(os.getenv("JOB_LEASE", 60)),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", 5)),
+            base_backoff=float(os.getenv("JOB_BACKOFF", 2.0)),
+            max_backoff=float(os.getenv("JOB_MAX_BACKOFF", 300)),
+            retention=float(os.getenv("JOB_RETENTION", 86400)),
+            dead_letter_retention=float(os.getenv("JOB_DEAD_LETTER_RETENTION", 7 * 86400)),
+        )
+
+    def register(
+        self, kind: str, handler: Handler, max_attempts: Optional[int] = None, redact: Optional[Redactor] = None
+    ):
+        """Run ``handler(payload)`` for jobs of ``kind``. Only registered kinds
+        are claimed, so processes without a feature leave its jobs alone.
+
+        ``redact(payload)`` returns what a dead letter may keep of the
+        payload; without it the payload is dropped."""
+        self._handlers[kind] = (handler, max_attempts or self.max_attempts, redact)
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._closing = True
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._running:
+            await asyncio.wait(list(self._running), timeout=self.shutdown_grace)
+        # Jobs cut off mid-run go back to the queue without using up an attempt
+        interrupted = list(self._running.items())
+        for task, _ in interrupted:
+            task.cancel()
+        await asyncio.gather(*(task for task, _ in interrupted), return_exceptions=True)
+        if interrupted:
+            async with database.session() as session:
+                for _, job in interrupted:
+                    await session.execute(
+                        update(jobs)
+                        .where(jobs.c.id == job["id"], jobs.c.attempts == job["attempts"])
+                        .values(status="queued", attempts=job["attempts"] - 1, locked_until=None, run_at=time.time())
+                    )
+                await session.commit()
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    # Producing
+
+    def _insert_ignoring_duplicates(self, row: dict):
+        if database.is_sqlite:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(jobs).values(row).on_conflict_do_nothing(index_elements=[jobs.c.idempotency_key])
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        idempotency_key: Optional[str] = None,
+        delay: float = 0.0,
+        session: Optional["AsyncSession"] = None,
+    ) -> Tuple[int, bool]:
+        """Store a job and return ``(job_id, created)``; ``created`` is False
+        when a job with the same ``idempotency_key`` already exists.
+
+        With ``session`` the job joins the caller's transaction, so it exists
+        only if that commits; call ``notify()`` after the commit.
+        """
+        if session is None:
+            async with database.session() as session:
+                job_id, created = await self.enqueue(kind, payload, idempotency_key, delay, session)
+                await session.commit()
+            if created and delay <= 0:
+                self.notify()
+            return job_id, created
+
+        now = time.time()
+        row = {
+            "kind": kind,
+            "payload": json.dumps(payload),
+            "idempotency_key": idempotency_key,
+            "status": "queued",
+            "attempts": 0,
+            "run_at": now + delay,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if idempotency_key is None:
+            result = await session.execute(insert(jobs).values(row))
+        else:
+            result = await session.execute(self._insert_ignoring_duplicates(row))
+        if result.rowcount == 1:
+            job_id, created = result.inserted_primary_key[0], True
+        else:
+            job_id = (await session.execute(
+                select(jobs.c.id).where(jobs.c.idempotency_key == idempotency_key)
+            )).scalar_one()
+            created = False
+        self.stats["enqueued" if created else "deduplicated"] += 1
+        return job_id, created
+
+    # Consuming
+
+    async def _run(self):
+        # Checked as well as cancelling: before Python 3.12, wait_for() can
+        # swallow a cancellation that lands just as the event is set
+        while not self._closing:
+            free = self.concurrency - len(self._running)
+            claimed = []
+            try:
+                if free > 0 and self._handlers:
+                    claimed = await self._claim(free)
+                await self._purge()
+            except Exception:
+                logger.exception("Claiming jobs failed")
+                self.stats["errors"] += 1
+            for job in claimed:
+                task = asyncio.ensure_future(self._execute(job))
+                self._running[task] = job
+                task.add_done_callback(self._finished)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _finished(self, task: asyncio.Task):
+        self._running.pop(task, None)
+        # A free slot may be filled straight away
+        self.notify()
+
+    async def _claim(self, limit: int) -> List[dict]:
+        now = time.time()
+        due = or_(
+            and_(jobs.c.status == "queued", jobs.c.run_at <= now),
+            # Abandoned by a worker that died mid-run
+            and_(jobs.c.status == "running", jobs.c.locked_until < now),
+        )
+        candidates = (
+            select(jobs.c.id)
+            .where(due, jobs.c.kind.in_(list(self._handlers)))
+            .order_by(jobs.c.run_at)
+            .limit(limit)
+        )
+        if not database.is_sqlite:
+            # SQLite serialises writers anyway; Postgres workers skip each
+            # other's rows instead of waiting on them
+            candidates = candidates.with_for_update(skip_locked=True)
+        # One statement, so SQLite's write lock is held only briefly; ``due``
+        # is checked again on the rows themselves in case another worker
+        # claimed one in the meantime
+        claim = (
+            update(jobs)
+            .where(jobs.c.id.in_(candidates.scalar_subquery()), due)
+            .values(status="running", attempts=jobs.c.attempts + 1, locked_until=now + self.lease, updated_at=now)
+            .returning(jobs.c.id, jobs.c.kind, jobs.c.payload, jobs.c.attempts, jobs.c.idempotency_key, jobs.c.created_at)
+        )
+        async with database.session() as session:
+            claimed = [row._asdict() for row in (await session.execute(claim)).all()]
+            await session.commit()
+        self.stats["claimed"] += len(claimed)
+        return claimed
+
+    async def _execute(self, job: dict):
+        handler, max_attempts, _ = self._handlers[job["kind"]]
+        try:
+            try:
+                await asyncio.wait_for(handler(json.loads(job["payload"])), self.lease)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"[:1000]
+                if job["attempts"] >= max_attempts or not getattr(e, "retryable", True):
+                    await self._dead_letter(job, error)
+                else:
+                    await self._retry(job, error)
+                return
+            # Payloads can hold personal data (phone numbers, codes), so only
+            # the idempotency key outlives a finished job
+            await self._settle(job, status="done", payload=None, last_error=None)
+            self.stats["succeeded"] += 1
+        except Exception:
+            # The outcome wasn't stored; the job runs again once its lease ends
+            logger.exception("Recording the outcome of job %s failed", job["id"])
+            self.stats["errors"] += 1
+
+    async def _settle(self, job: dict, **values) -> bool:
+        # Guarded by the attempt count, so a worker whose lease ran out can't
+        # overwrite the outcome of the run that replaced it
+        async with database.session() as session:
+            result = await session.execute(
+                update(jobs)
+                .where(jobs.c.id == job["id"], jobs.c.attempts == job["attempts"])
+                .values(locked_until=None, updated_at=time.time(), **values)
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+    async def _retry(self, job: dict, error: str):
+        backoff = min(self.max_backoff, self.base_backoff * 2 ** (job["attempts"] - 1))
+        run_at = time.time() + backoff * random.uniform(0.5, 1.0)
+        await self._settle(job, status="queued", run_at=run_at, last_error=error)
+        self.stats["retried"] += 1
+
+    async def _dead_letter(self, job: dict, error: str):
+        now = time.time()
+        # Payloads can hold personal data, so dead letters only keep what the
+        # kind's redactor lets through
+        redact = self._handlers[job["kind"]][2]
+        payload = json.dumps(redact(json.loads(job["payload"]))) if redact else None
+        async with database.session() as session:
+            result = await session.execute(
+                update(jobs)
+                .where(jobs.c.id == job["id"], jobs.c.attempts == job["attempts"])
+                .values(status="failed", payload=None, locked_until=None, last_error=error, updated_at=now)
+            )
+            if result.rowcount == 1:
+                await session.execute(insert(job_dead_letters).values(
+                    id=job["id"],
+                    kind=job["kind"],
+                    payload=payload,
+                    idempotency_key=job["idempotency_key"],
+                    attempts=job["attempts"],
+                    last_error=error,
+                    created_at=job["created_at"],
+                    failed_at=now,
+                ))
+            await session.commit()
+        logger.warning("Job %s (%s) dead-lettered after %d attempts: %s", job["id"], job["kind"], job["attempts"], error)
+        self.stats["dead_lettered"] += 1
+
+    async def _purge(self):
+        now = time.time()
+        if now - self._purged_at < 60:
+            return
+        self._purged_at = now
+        async with database.session() as session:
+            await session.execute(
+                delete(jobs).where(jobs.c.status.in_(("done", "failed")), jobs.c.updated_at < now - self.retention)
+            )
+            await session.execute(
+                delete(job_dead_letters).where(job_dead_letters.c.failed_at < now - self.dead_letter_retention)
+            )
+            await session.commit()
+
+    async def dead_letters(self, limit: int = 50) -> List[dict]:
+        async with database.session() as session:
+            rows = (await session.execute(
+                select(job_dead_letters).order_by(job_dead_letters.c.failed_at.desc()).limit(limit)
+            )).all()
+        return [row._asdict() for row in rows]
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "running": len(self._running), "kinds": sorted(self._handlers)}
+
+
+job_queue = JobQueue.from_env()
@@ -0,0 +1,83 @@
+import os
+import smtplib
+from email.message import EmailMessage
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+
+class MailError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class Mailer:
+    """Plain SMTP delivery; smtplib blocks, so each send runs in a thread."""
+
+    def __init__(
+        self,
+        host: Optional[str],
+        port: int = 587,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        sender: str = "EezLegal <no-reply@eezlegal.com>",
+        starttls: bool = True,
+        timeout: float = 10.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.starttls = starttls
+        self.timeout = timeout
+        self.stats = {"sent": 0, "failed": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("SMTP_HOST"),
+            port=int(os.getenv("SMTP_PORT", 587)),
+            username=os.getenv("SMTP_USERNAME"),
+            password=os.getenv("SMTP_PASSWORD"),
+            sender=os.getenv("SMTP_FROM", "EezLegal <no-reply@eezlegal.com>"),
+            starttls=os.getenv("SMTP_STARTTLS", "1") == "1",
+            timeout=float(os.getenv("SMTP_TIMEOUT", 10)),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host)
+
+    def _send(self, message: EmailMessage):
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(message)
+
+    async def send(self, to: str, subject: str, body: str):
+        if not self.configured:
+            raise MailError("SMTP is not configured", retryable=False)
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = to
+        message["Subject"] = subject
+        message.set_content(body)
+        try:
+            await run_in_threadpool(self._send, message)
+        except smtplib.SMTPRecipientsRefused as e:
+            self.stats["failed"] += 1
+            raise MailError(f"Recipient refused: {e}", retryable=False)
+        except (smtplib.SMTPException, OSError) as e:
+            self.stats["failed"] += 1
+            raise MailError(f"SMTP failed: {type(e).__name__}: {e}")
+        self.stats["sent"] += 1
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "configured": self.configured}
+
+
+mailer = Mailer.from_env()
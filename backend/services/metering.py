@@ -0,0 +1,373 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, tuple_
+
+from services.database import DEFAULT_DB_PATH, database, usage, usage_flushes
+
+logger = logging.getLogger("eezlegal.metering")
+
+DEFAULT_WAL_DIR = os.path.join(os.path.dirname(DEFAULT_DB_PATH), "usage-wal")
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, period: str, limit: int):
+        super().__init__(f"{period} token quota of {limit} exceeded")
+        self.period = period
+        self.limit = limit
+
+
+def current_periods(now: Optional[float] = None) -> Tuple[str, str]:
+    now = time.gmtime(now)
+    return time.strftime("day:%Y-%m-%d", now), time.strftime("month:%Y-%m", now)
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (user_id, period) -> [prompt_tokens, completion_tokens, requests]
+        self.pending: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0, 0])
+
+
+class UsageMeter:
+    """Per-user token usage with quotas and batched persistence.
+
+    Every chat adds its tokens to an in-memory counter (sharded by user so
+    threads rarely contend) and appends one line to a write-ahead log segment.
+    A background task flushes all counters in one batched upsert per interval,
+    recording the flushed segment ids in the same transaction so a crash
+    between commit and cleanup cannot double count on replay. A segment stays
+    locked until the flush that covers it has committed and deleted it.
+
+    Quota checks read a per-process running total, loaded from the database
+    once per ``totals_ttl`` and bumped locally on every record.
+    """
+
+    def __init__(
+        self,
+        wal_dir: str = DEFAULT_WAL_DIR,
+        shards: int = 16,
+        flush_interval: float = 5.0,
+        totals_ttl: float = 60.0,
+        limits: Optional[Dict[str, Tuple[int, int]]] = None,
+    ):
+        self.wal_dir = wal_dir
+        self.flush_interval = flush_interval
+        self.totals_ttl = totals_ttl
+        # plan -> (daily, monthly) token limits; 0 means unlimited. Plans
+        # not listed get the "paid" limits.
+        self.limits = limits or {"anonymous": (5000, 50000), "free": (20000, 200000), "paid": (0, 0)}
+        self._shards = [_Shard() for _ in range(shards)]
+        self._totals: Dict[tuple, Tuple[float, int]] = {}
+        self._wal_lock = threading.Lock()
+        self._wal = None
+        self._segment: Optional[str] = None
+        # (segment, open and locked file) awaiting a flush
+        self._sealed: List[tuple] = []
+        # Segments left by earlier processes, applied one transaction each
+        self._replayed: List[tuple] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"records": 0, "flushes": 0, "rows_written": 0, "replayed": 0, "rejected": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            wal_dir=os.getenv("USAGE_WAL_DIR", DEFAULT_WAL_DIR),
+            shards=int(os.getenv("USAGE_SHARDS", 16)),
+            flush_interval=float(os.getenv("USAGE_FLUSH_INTERVAL", 5)),
+            totals_ttl=float(os.getenv("USAGE_TOTALS_TTL", 60)),
+            limits={
+                "anonymous": (int(os.getenv("QUOTA_ANON_DAILY", 5000)), int(os.getenv("QUOTA_ANON_MONTHLY", 50000))),
+                "free": (int(os.getenv("QUOTA_FREE_DAILY", 20000)), int(os.getenv("QUOTA_FREE_MONTHLY", 200000))),
+                "paid": (int(os.getenv("QUOTA_PAID_DAILY", 0)), int(os.getenv("QUOTA_PAID_MONTHLY", 0))),
+            },
+        )
+
+    def _shard(self, user_id: str) -> _Shard:
+        return self._shards[hash(user_id) % len(self._shards)]
+
+    # Write-ahead log
+
+    def _open_segment(self):
+        self._segment = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        self._wal = open(os.path.join(self.wal_dir, self._segment + ".wal"), "a", buffering=1)
+        # Held for the life of the segment so other workers sharing the
+        # directory never replay a log that is still being written
+        fcntl.flock(self._wal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _seal_segment(self):
+        # Called with _wal_lock held. The sealed file stays open, and so
+        # locked, until its flush commits.
+        if self._wal is None:
+            return
+        self._wal.flush()
+        self._sealed.append((self._segment, self._wal))
+        self._open_segment()
+
+    def _release(self, segments: List[tuple]):
+        for segment, f in segments:
+            try:
+                os.remove(os.path.join(self.wal_dir, segment + ".wal"))
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _replay(self, flushed: set):
+        for filename in sorted(os.listdir(self.wal_dir)):
+            if not filename.endswith(".wal"):
+                continue
+            segment = filename[:-4]
+            try:
+                f = open(os.path.join(self.wal_dir, filename))
+            except FileNotFoundError:
+                # Flushed and deleted by another worker since the listing
+                continue
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            if segment in flushed:
+                self._release([(segment, f)])
+                continue
+            counters: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0, 0])
+            for line in f:
+                try:
+                    user_id, period, prompt_tokens, completion_tokens = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    continue
+                counter = counters[(user_id, period)]
+                counter[0] += prompt_tokens
+                counter[1] += completion_tokens
+                counter[2] += 1
+                self.stats["replayed"] += 1
+            self._replayed.append((segment, f, counters))
+
+    async def _apply_replayed(self):
+        # Each segment commits with its usage_flush row. If another worker
+        # already recorded that row, its counts are in and are skipped.
+        while self._replayed:
+            segment, f, counters = self._replayed[0]
+            now = time.time()
+            async with database.session() as session:
+                claimed = await session.execute(
+                    self._insert(usage_flushes).values(segment=segment, flushed_at=now).on_conflict_do_nothing()
+                )
+                if claimed.rowcount and counters:
+                    await session.execute(self._upsert(self._rows(counters, now)))
+                await session.commit()
+            self._replayed.pop(0)
+            self._release([(segment, f)])
+
+    async def start(self):
+        os.makedirs(self.wal_dir, exist_ok=True)
+        self._flush_lock = asyncio.Lock()
+        async with database.session() as session:
+            flushed = set((await session.execute(select(usage_flushes.c.segment))).scalars())
+        self._replay(flushed)
+        await self._apply_replayed()
+        with self._wal_lock:
+            self._open_segment()
+        self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        with self._wal_lock:
+            if self._wal is not None:
+                # Everything was just flushed, so the fresh segment is empty
+                self._release([(self._segment, self._wal)])
+                self._wal = None
+
+    # Recording and quotas
+
+    def _add(self, user_id: str, period: str, prompt_tokens: int, completion_tokens: int):
+        shard = self._shard(user_id)
+        with shard.lock:
+            counter = shard.pending[(user_id, period)]
+            counter[0] += prompt_tokens
+            counter[1] += completion_tokens
+            counter[2] += 1
+            total = self._totals.get((user_id, period))
+            if total is not None:
+                self._totals[(user_id, period)] = (total[0], total[1] + prompt_tokens + completion_tokens)
+
+    def record(self, user_id: str, usage_info: dict):
+        prompt_tokens = int(usage_info.get("prompt_tokens") or 0)
+        completion_tokens = int(usage_info.get("completion_tokens") or 0)
+        periods = current_periods()
+        lines = "".join(
+            json.dumps([user_id, period, prompt_tokens, completion_tokens]) + "\n" for period in periods
+        )
+        # The counters and their log lines must land on the same side of a
+        # flush, or a replay after a crash would count them twice
+        with self._wal_lock:
+            for period in periods:
+                self._add(user_id, period, prompt_tokens, completion_tokens)
+            if self._wal is not None:
+                self._wal.write(lines)
+        self.stats["records"] += 1
+
+    async def _load_totals(self, keys: List[tuple]):
+        async with database.session() as session:
+            rows = (await session.execute(
+                select(usage.c.user_id, usage.c.period, usage.c.prompt_tokens + usage.c.completion_tokens)
+                .where(tuple_(usage.c.user_id, usage.c.period).in_(keys))
+            )).all()
+        stored = {(user_id, period): total for user_id, period, total in rows}
+        now = time.monotonic()
+        for key in keys:
+            shard = self._shard(key[0])
+            with shard.lock:
+                pending = shard.pending.get(key, (0, 0))
+                self._totals[key] = (now, stored.get(key, 0) + pending[0] + pending[1])
+
+    async def _current_totals(self, user_id: str, plan: str):
+        limits = self.limits[plan if plan in self.limits else "paid"]
+        periods = current_periods()
+        now = time.monotonic()
+        stale = []
+        for period, limit in zip(periods, limits):
+            total = self._totals.get((user_id, period))
+            if limit and (total is None or total[0] <= now - self.totals_ttl):
+                stale.append((user_id, period))
+        if stale:
+            await self._load_totals(stale)
+        return [
+            (period.split(":")[0], limit, self._totals[(user_id, period)][1] if limit else None)
+            for period, limit in zip(periods, limits)
+        ]
+
+    async def check(self, user_id: str, plan: str):
+        """Raise ``QuotaExceeded`` if the user is over a daily or monthly limit."""
+        for period, limit, used in await self._current_totals(user_id, plan):
+            if limit and used >= limit:
+                self.stats["rejected"] += 1
+                raise QuotaExceeded(period, limit)
+
+    async def remaining(self, user_id: str, plan: str) -> dict:
+        return {
+            period: max(limit - used, 0) if limit else None
+            for period, limit, used in await self._current_totals(user_id, plan)
+        }
+
+    # Persistence
+
+    def _insert(self, table):
+        if database.is_sqlite:
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        return insert(table)
+
+    def _rows(self, counters: Dict[tuple, List[int]], now: float) -> List[dict]:
+        return [
+            {
+                "user_id": user_id,
+                "period": period,
+                "prompt_tokens": counter[0],
+                "completion_tokens": counter[1],
+                "requests": counter[2],
+                "updated_at": now,
+            }
+            for (user_id, period), counter in counters.items()
+        ]
+
+    def _upsert(self, rows: List[dict]):
+        stmt = self._insert(usage).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[usage.c.user_id, usage.c.period],
+            set_={
+                "prompt_tokens": usage.c.prompt_tokens + stmt.excluded.prompt_tokens,
+                "completion_tokens": usage.c.completion_tokens + stmt.excluded.completion_tokens,
+                "requests": usage.c.requests + stmt.excluded.requests,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+
+    async def flush(self):
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            await self._apply_replayed()
+            batch: Dict[tuple, List[int]] = {}
+            with self._wal_lock:
+                self._seal_segment()
+                segments, self._sealed = self._sealed, []
+                for shard in self._shards:
+                    with shard.lock:
+                        batch.update(shard.pending)
+                        shard.pending = defaultdict(lambda: [0, 0, 0])
+            if not batch and not segments:
+                return
+
+            now = time.time()
+            rows = self._rows(batch, now)
+            try:
+                async with database.session() as session:
+                    if rows:
+                        await session.execute(self._upsert(rows))
+                    if segments:
+                        await session.execute(
+                            usage_flushes.insert(),
+                            [{"segment": segment, "flushed_at": now} for segment, _ in segments],
+                        )
+                        # Ids are only needed until their files are deleted
+                        await session.execute(
+                            delete(usage_flushes).where(usage_flushes.c.flushed_at < now - 86400)
+                        )
+                    await session.commit()
+            except Exception:
+                # Put everything back; the next interval retries
+                for (user_id, period), counter in batch.items():
+                    shard = self._shard(user_id)
+                    with shard.lock:
+                        pending = shard.pending[(user_id, period)]
+                        for i in range(3):
+                            pending[i] += counter[i]
+                self._sealed = segments + self._sealed
+                raise
+
+            self._release(segments)
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(rows)
+            self._prune_totals()
+
+    def _prune_totals(self):
+        periods = set(current_periods())
+        for key in [key for key in self._totals if key[1] not in periods]:
+            self._totals.pop(key, None)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                # flush() put the batch back; the next interval retries it
+                logger.exception("Flushing usage failed")
+                self.stats["errors"] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "pending": sum(len(shard.pending) for shard in self._shards),
+            "tracked_totals": len(self._totals),
+            "flush_interval": self.flush_interval,
+        }
+
+
+usage_meter = UsageMeter.from_env()
@@ -0,0 +1,258 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+# Latency buckets in seconds, from cache hits up to slow completions
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+# Updates below are plain dict/list operations with no locks. They run on
+# the event loop thread, and a rare lost increment from a worker thread is an
+# acceptable price for keeping the hot path to a few hundred nanoseconds.
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = defaultdict(int)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] += amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] -= amount
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {cumulative}")
+            suffix = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+            lines.append(f"{self.name}_sum{suffix} {_number(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def collector(self, fn: Callable[[], None]):
+        """Run ``fn`` at scrape time, e.g. to copy a service's stats into gauges."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "Time to the last byte of the response.", ("method", "route")
+)
+http_in_flight = registry.gauge("http_requests_in_flight", "Requests being served, streams included.")
+http_errors = registry.counter(
+    "http_exceptions_total", "Unhandled exceptions by route and class.", ("route", "exception")
+)
+upstream_latency = registry.histogram(
+    "upstream_request_duration_seconds",
+    "OpenAI latency per request attempt by phase: connect, ttfb (first byte) and total.",
+    ("operation", "phase"),
+)
+upstream_errors = registry.counter(
+    "upstream_errors_total", "Failed upstream calls by error class.", ("operation", "error")
+)
+completion_tokens = registry.counter(
+    "chat_completion_tokens_total", "Completion tokens generated.", ("operation",)
+)
+tokens_per_second = registry.histogram(
+    "chat_tokens_per_second", "Completion tokens per second of generation.", ("operation",), RATE_BUCKETS
+)
+service_stats = registry.gauge(
+    "service_stat", "Counters reported by internal services (caches, limiters, queues).", ("service", "stat")
+)
+
+
+def export_stats(service: str, stats: dict):
+    """Copy the numeric entries of a ``snapshot()``/``stats`` dict into gauges."""
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        service_stats.set(value, service, key)
+
+
+class UpstreamTimer:
+    """Times upstream requests through httpx's ``trace`` extension.
+
+    ``Resilience`` brackets every attempt with ``start_attempt`` and
+    ``end_attempt``, so the phases time single requests to OpenAI and never
+    the queueing or retry backoff around them.
+    """
+
+    __slots__ = ("operation", "started", "connected", "first_byte", "ended")
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.start_attempt()
+
+    def start_attempt(self):
+        self.started = time.perf_counter()
+        self.connected = None
+        self.first_byte = None
+        self.ended = None
+
+    async def trace(self, event_name: str, info: dict):
+        # Only calls that open a new connection report a connect phase (TCP
+        # plus TLS); pooled keep-alive connections skip straight to sending
+        if event_name == "connection.connect_tcp.started":
+            self.connected = time.perf_counter()
+        elif event_name.endswith("send_request_headers.started") and self.connected is not None:
+            upstream_latency.observe(time.perf_counter() - self.connected, self.operation, "connect")
+            self.connected = None
+        elif event_name.endswith("receive_response_headers.complete"):
+            self.first_byte = time.perf_counter()
+            upstream_latency.observe(self.first_byte - self.started, self.operation, "ttfb")
+
+    def end_attempt(self):
+        self.ended = time.perf_counter()
+        upstream_latency.observe(self.ended - self.started, self.operation, "total")
+
+    def record_tokens(self, tokens: int, streamed: bool):
+        if not tokens:
+            return
+        completion_tokens.inc(self.operation, amount=tokens)
+        # A stream generates after its first byte; a plain completion is
+        # generated before the headers, so its whole attempt counts
+        ended = self.ended or time.perf_counter()
+        generating = ended - (self.first_byte if streamed and self.first_byte else self.started)
+        if generating > 0:
+            tokens_per_second.observe(tokens / generating, self.operation)
+
+    def error(self, error: str):
+        upstream_errors.inc(self.operation, error)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route counts, latency and in-flight requests.
+
+    Routes are labelled by their template (``/api/user/{user_id}``), never the
+    raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+        http_in_flight.inc()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            http_errors.inc(self._route(scope), type(e).__name__)
+            raise
+        finally:
+            http_in_flight.dec()
+            route = self._route(scope)
+            http_requests.inc(scope["method"], route, status)
+            http_latency.observe(time.perf_counter() - started, scope["method"], route)
+
+    @staticmethod
+    def _route(scope) -> str:
+        route = scope.get("route")
+        return route.path if route is not None else "unmatched"
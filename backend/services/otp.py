@@ -0,0 +1,187 @@
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from sqlalchemy import case, delete, func, insert, select, update
+
+from services.database import database, phone_verification_sends, phone_verifications
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class OTPThrottled(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Try again in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class OTPStore:
+    """One-time phone verification codes that only exist as keyed hashes.
+
+    A six-digit code is trivial to brute-force from a plain hash, so codes
+    are hashed with HMAC under a server secret and bound to their phone
+    number. Each code expires after ``ttl`` seconds, allows ``max_attempts``
+    guesses and is deleted when used; a new code for the same number can't
+    be requested within ``resend_interval`` seconds. A resend keeps the
+    guesses already used until the previous code has expired.
+
+    Sends are also capped per number and per client address over a rolling
+    ``send_window``, so the resend interval can't be walked through to run
+    up SMS costs.
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        digits: int = 6,
+        ttl: float = 300.0,
+        max_attempts: int = 5,
+        resend_interval: float = 30.0,
+        send_window: float = 3600.0,
+        max_sends_per_number: int = 5,
+        max_sends_per_ip: int = 20,
+    ):
+        if not secret:
+            raise ValueError("OTPStore needs a secret")
+        self.secret = secret
+        self.digits = digits
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.resend_interval = resend_interval
+        self.send_window = send_window
+        self.max_sends_per_number = max_sends_per_number
+        self.max_sends_per_ip = max_sends_per_ip
+        self._pruned_at = 0.0
+        self.stats = {"issued": 0, "throttled": 0, "capped": 0, "verified": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls):
+        # Codes hashed on one worker are checked on another, so the secret must
+        # be configured; the token keyring's active key can rotate per process
+        secret = os.getenv("OTP_SECRET") or os.getenv("JWT_SECRET_KEY")
+        if not secret:
+            raise ValueError("Set OTP_SECRET (or JWT_SECRET_KEY); every worker must share it")
+        return cls(
+            secret,
+            digits=int(os.getenv("OTP_DIGITS", 6)),
+            ttl=float(os.getenv("OTP_TTL", 300)),
+            max_attempts=int(os.getenv("OTP_MAX_ATTEMPTS", 5)),
+            resend_interval=float(os.getenv("OTP_RESEND_INTERVAL", 30)),
+            send_window=float(os.getenv("OTP_SEND_WINDOW", 3600)),
+            max_sends_per_number=int(os.getenv("OTP_MAX_SENDS_PER_NUMBER", 5)),
+            max_sends_per_ip=int(os.getenv("OTP_MAX_SENDS_PER_IP", 20)),
+        )
+
+    def digest(self, phone: str, code: str) -> str:
+        return hmac.new(self.secret.encode("utf-8"), f"{phone}:{code}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    async def _check_send_caps(self, session: "AsyncSession", keys: Dict[str, int], now: float):
+        since = now - self.send_window
+        for key, limit in keys.items():
+            count, oldest = (await session.execute(
+                select(func.count(), func.min(phone_verification_sends.c.sent_at))
+                .where(phone_verification_sends.c.key == key, phone_verification_sends.c.sent_at > since)
+            )).one()
+            if count >= limit:
+                self.stats["capped"] += 1
+                raise OTPThrottled(max(1, int(oldest + self.send_window - now + 1)))
+
+    def _upsert(self, row: dict):
+        if database.is_sqlite:
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(phone_verifications).values(row)
+        # Only replaces a code whose resend interval has passed
+        return stmt.on_conflict_do_update(
+            index_elements=[phone_verifications.c.phone],
+            set_={
+                "code_hash": stmt.excluded.code_hash,
+                # Resending must not hand out fresh guesses
+                "attempts": case(
+                    (phone_verifications.c.expires_at <= row["sent_at"], 0),
+                    else_=phone_verifications.c.attempts,
+                ),
+                "sent_at": stmt.excluded.sent_at,
+                "expires_at": stmt.excluded.expires_at,
+            },
+            where=phone_verifications.c.sent_at <= row["sent_at"] - self.resend_interval,
+        )
+
+    async def issue(
+        self, phone: str, session: Optional["AsyncSession"] = None, client_ip: Optional[str] = None
+    ) -> str:
+        """Store and return a fresh code for ``phone``; raises ``OTPThrottled``
+        if one was sent within the resend interval or a send cap is reached.
+        With ``session`` the code is stored in the caller's transaction and
+        the caller commits."""
+        if session is None:
+            async with database.session() as session:
+                code = await self.issue(phone, session, client_ip)
+                await session.commit()
+            return code
+
+        code = f"{secrets.randbelow(10 ** self.digits):0{self.digits}d}"
+        now = time.time()
+        # Counted under keyed hashes, like the codes themselves
+        caps = {self.digest("phone", phone): self.max_sends_per_number}
+        if client_ip:
+            caps[self.digest("ip", client_ip)] = self.max_sends_per_ip
+        await self._check_send_caps(session, caps, now)
+        row = {
+            "phone": phone,
+            "code_hash": self.digest(phone, code),
+            "attempts": 0,
+            "sent_at": now,
+            "expires_at": now + self.ttl,
+        }
+        result = await session.execute(self._upsert(row))
+        if result.rowcount != 1:
+            sent_at = (await session.execute(
+                select(phone_verifications.c.sent_at).where(phone_verifications.c.phone == phone)
+            )).scalar_one()
+            self.stats["throttled"] += 1
+            raise OTPThrottled(max(1, int(sent_at + self.resend_interval - now + 1)))
+        await session.execute(insert(phone_verification_sends), [{"key": key, "sent_at": now} for key in caps])
+        if now - self._pruned_at >= 60:
+            self._pruned_at = now
+            await session.execute(
+                delete(phone_verification_sends).where(phone_verification_sends.c.sent_at <= now - self.send_window)
+            )
+        self.stats["issued"] += 1
+        return code
+
+    async def verify(self, phone: str, code: str) -> bool:
+        """Consume the code if it matches; every miss counts as an attempt."""
+        now = time.time()
+        code_hash = self.digest(phone, code.strip())
+        async with database.session() as session:
+            # A conditional delete, so two requests racing with the right code
+            # can't both succeed
+            used = await session.execute(
+                delete(phone_verifications).where(
+                    phone_verifications.c.phone == phone,
+                    phone_verifications.c.code_hash == code_hash,
+                    phone_verifications.c.expires_at > now,
+                    phone_verifications.c.attempts < self.max_attempts,
+                )
+            )
+            if used.rowcount != 1:
+                await session.execute(
+                    update(phone_verifications)
+                    .where(phone_verifications.c.phone == phone)
+                    .values(attempts=phone_verifications.c.attempts + 1)
+                )
+            await session.commit()
+        self.stats["verified" if used.rowcount == 1 else "rejected"] += 1
+        return used.rowcount == 1
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+
+otp_store = OTPStore.from_env()
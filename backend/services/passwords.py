@@ -0,0 +1,208 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _argon2_hasher(time_cost, memory_cost, parallelism):
+    from argon2 import PasswordHasher
+    return PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+
+# The functions below run inside the worker processes, so they only take
+# picklable arguments and import the hashing libraries there.
+
+def _hash(scheme: str, params: dict, password: str) -> str:
+    if scheme == "argon2id":
+        return _argon2_hasher(**params).hash(password)
+    if scheme == "bcrypt":
+        import bcrypt
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(params["rounds"])).decode("ascii")
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash(password)
+
+
+def _verify(scheme: str, params: dict, password: str, stored: str) -> Tuple[bool, bool]:
+    """Return ``(matches, needs_rehash)``."""
+    if stored.startswith("$argon2"):
+        from argon2 import PasswordHasher as Argon2Hasher
+        from argon2.exceptions import VerificationError, InvalidHashError
+        # Verification reads the cost parameters from the hash itself
+        hasher = _argon2_hasher(**params) if scheme == "argon2id" else Argon2Hasher()
+        try:
+            hasher.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False, False
+        return True, scheme != "argon2id" or hasher.check_needs_rehash(stored)
+    if stored.startswith(("$2a$", "$2b$", "$2y$")):
+        import bcrypt
+        if not bcrypt.checkpw(password.encode("utf-8"), stored.encode("ascii")):
+            return False, False
+        rounds = int(stored.split("$")[2])
+        return True, scheme != "bcrypt" or rounds != params.get("rounds")
+    # Legacy werkzeug pbkdf2/scrypt hashes, only ever written by the Flask app
+    from werkzeug.security import check_password_hash
+    if not check_password_hash(stored, password):
+        return False, False
+    return True, scheme in ("argon2id", "bcrypt")
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords in a bounded process pool.
+
+    argon2 releases the GIL while it hashes, so inline hashing barely delays
+    other requests (see benchmarks/password_hashing.py). Each hash does take
+    a core and ``memory_cost`` KiB for its whole run, though, so the pool
+    caps concurrent hashes at ``workers``. At most ``max_pending`` jobs may
+    be queued; beyond that callers get ``HasherBusy`` rather than piling up
+    behind a burst of logins.
+    """
+
+    def __init__(
+        self,
+        scheme: str = "argon2id",
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        queue_timeout: float = 5.0,
+        argon2_time_cost: int = 3,
+        argon2_memory_cost: int = 65536,
+        argon2_parallelism: int = 1,
+        bcrypt_rounds: int = 12,
+    ):
+        self.scheme = scheme
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_timeout = queue_timeout
+        if scheme == "argon2id":
+            self.params = {
+                "time_cost": argon2_time_cost,
+                "memory_cost": argon2_memory_cost,
+                "parallelism": argon2_parallelism,
+            }
+        elif scheme == "bcrypt":
+            self.params = {"rounds": bcrypt_rounds}
+        else:
+            self.params = {}
+        self._pending = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._dummy_hash = None
+
+    @classmethod
+    def from_env(cls):
+        workers = os.getenv("PASSWORD_HASH_WORKERS")
+        return cls(
+            scheme=os.getenv("PASSWORD_HASH_SCHEME", "argon2id"),
+            workers=int(workers) if workers else None,
+            queue_timeout=float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 5.0)),
+            argon2_time_cost=int(os.getenv("ARGON2_TIME_COST", 3)),
+            argon2_memory_cost=int(os.getenv("ARGON2_MEMORY_COST", 65536)),
+            argon2_parallelism=int(os.getenv("ARGON2_PARALLELISM", 1)),
+            bcrypt_rounds=int(os.getenv("BCRYPT_ROUNDS", 12)),
+        )
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Created on first use so importing this module never forks
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _run(self, fn, *args):
+        if not self._pending.acquire(timeout=self.queue_timeout):
+            raise HasherBusy()
+        try:
+            return self._executor().submit(fn, *args).result()
+        finally:
+            self._pending.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, self.scheme, self.params, password)
+
+    def verify(self, password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Check a password; on success with an outdated hash, also return a
+        fresh hash to store in its place.
+
+        Pass ``stored=None`` for an unknown account: a dummy hash is checked
+        instead, so the response takes as long as for a real one.
+        """
+        if stored is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash(secrets.token_urlsafe(16))
+            self._run(_verify, self.scheme, self.params, password, self._dummy_hash)
+            return False, None
+        matches, needs_rehash = self._run(_verify, self.scheme, self.params, password, stored)
+        if matches and needs_rehash:
+            return True, self.hash(password)
+        return matches, None
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+class LoginRateLimiter:
+    """Sliding-window cap on failed login attempts per account.
+
+    Keys are whatever email was typed, so at most ``max_keys`` are tracked;
+    the least recently failed are forgotten first.
+    """
+
+    def __init__(self, max_attempts: int = 5, window: float = 300.0, max_keys: int = 100000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_attempts=int(os.getenv("LOGIN_MAX_ATTEMPTS", 5)),
+            window=float(os.getenv("LOGIN_ATTEMPT_WINDOW", 300)),
+            max_keys=int(os.getenv("LOGIN_LIMITER_SIZE", 100000)),
+        )
+
+    def _prune(self, failures: deque, now: float):
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(key)
+            if not failures:
+                return True
+            self._prune(failures, now)
+            if not failures:
+                del self._failures[key]
+                return True
+            return len(failures) < self.max_attempts
+
+    def record_failure(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(key)
+            if failures is None:
+                failures = self._failures[key] = deque(maxlen=self.max_attempts)
+            self._failures.move_to_end(key)
+            self._prune(failures, now)
+            failures.append(now)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def reset(self, key: str):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+password_hasher = PasswordHasher.from_env()
+login_limiter = LoginRateLimiter.from_env()
@@ -0,0 +1,154 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - falls back to a character estimate
+    tiktoken = None
+
+# Fixed per-message cost of the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except ValueError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def text_tokens(text: str) -> int:
+    """Uncached token count, for one-off text such as uploaded documents."""
+    encoding = _encoding()
+    if encoding is None:
+        # Roughly four characters per token for English prose
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    return text_tokens(text)
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message.get("content", "")) + MESSAGE_OVERHEAD
+
+
+@lru_cache(maxsize=8192)
+def summarize_turn(role: str, content: str, max_chars: int = 200) -> str:
+    """One-line extractive summary of a turn: its first sentence, clipped."""
+    text = " ".join(content.split())
+    first = _SENTENCE_END.split(text, 1)[0]
+    if len(first) > max_chars:
+        first = first[:max_chars].rsplit(" ", 1)[0] + "…"
+    speaker = "User" if role == "user" else "Assistant"
+    return f"- {speaker}: {first}"
+
+
+@dataclass
+class AssembledPrompt:
+    messages: List[dict]
+    prompt_tokens: int
+    trimmed_tokens: int
+    trimmed_messages: int
+    summary: Optional[str] = None
+
+    def stats(self) -> dict:
+        return {
+            "tokens": self.prompt_tokens,
+            "trimmed_tokens": self.trimmed_tokens,
+            "trimmed_messages": self.trimmed_messages,
+            "summarized": self.summary is not None,
+        }
+
+
+class PromptAssembler:
+    """Fits the system prompt, recent history and new message into a token budget.
+
+    The newest turns are kept verbatim; older turns that do not fit are rolled
+    into a short running summary placed right after the system prompt.
+    """
+
+    def __init__(self, budget: int = 6000, summary_budget: int = 400):
+        self.budget = budget
+        self.summary_budget = summary_budget
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            budget=int(os.getenv("PROMPT_TOKEN_BUDGET", 6000)),
+            summary_budget=int(os.getenv("PROMPT_SUMMARY_TOKENS", 400)),
+        )
+
+    def assemble(
+        self, system_prompt: str, history: List[dict], message: str, context: Optional[str] = None
+    ) -> AssembledPrompt:
+        """``context`` (e.g. retrieved reference passages) goes in a second
+        system message, so the first one stays a cacheable prefix."""
+        system = [{"role": "system", "content": system_prompt}]
+        if context:
+            system.append({"role": "system", "content": context})
+        current = {"role": "user", "content": message}
+        turns = [
+            {"role": msg.get("role", "user"), "content": msg.get("content", "")}
+            for msg in history
+        ]
+
+        used = sum(message_tokens(msg) for msg in system) + message_tokens(current)
+        history_tokens = sum(message_tokens(turn) for turn in turns)
+        if used + history_tokens <= self.budget:
+            return AssembledPrompt([*system, *turns, current], used + history_tokens, 0, 0)
+
+        # Keep the newest turns that fit after reserving room for the summary
+        available = self.budget - used - self.summary_budget
+        kept = []
+        for turn in reversed(turns):
+            cost = message_tokens(turn)
+            if cost > available:
+                break
+            kept.append(turn)
+            available -= cost
+        kept.reverse()
+        dropped = turns[:len(turns) - len(kept)]
+
+        summary = self._summarize(dropped)
+        messages = list(system)
+        if summary:
+            messages.append({"role": "system", "content": summary})
+        messages.extend(kept)
+        messages.append(current)
+
+        prompt_tokens = sum(message_tokens(msg) for msg in messages)
+        trimmed_tokens = sum(message_tokens(turn) for turn in dropped)
+        return AssembledPrompt(messages, prompt_tokens, trimmed_tokens, len(dropped), summary)
+
+    def _summarize(self, turns: List[dict]) -> Optional[str]:
+        # Per-turn lines are cached, so extending the summary as a conversation
+        # grows only costs the newly dropped turns.
+        lines = []
+        remaining = self.summary_budget - count_tokens(SUMMARY_HEADER) - MESSAGE_OVERHEAD
+        for turn in reversed(turns):
+            line = summarize_turn(turn["role"], turn["content"])
+            cost = count_tokens(line)
+            if cost > remaining:
+                break
+            lines.append(line)
+            remaining -= cost
+        if not lines:
+            return None
+        lines.reverse()
+        return "\n".join([SUMMARY_HEADER, *lines])
+
+
+prompt_assembler = PromptAssembler.from_env()
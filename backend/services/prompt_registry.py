@@ -0,0 +1,102 @@
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+_TEMPLATE_FILE = re.compile(r"^(?P<name>[a-z0-9_]+)\.v(?P<version>\d+)\.txt$")
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@lru_cache(maxsize=16384)
+def _message_json(role: str, content: str) -> bytes:
+    # History turns repeat on every request of a conversation; serialize each
+    # one once.
+    return _dumps({"role": role, "content": content})
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    version: int
+    text: str
+    system_json: bytes = field(init=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "system_json", _message_json("system", self.text))
+
+    @lru_cache(maxsize=32)
+    def body_prefix(self, model: str, max_tokens: int, temperature: float, stream: bool = False) -> bytes:
+        """Request body up to and including the system message.
+
+        Parameters come before ``messages`` and the system prompt is the first
+        message, so the byte prefix is identical for every request, which is
+        also what upstream prompt caching keys on.
+        """
+        params = {"model": model, "max_tokens": max_tokens, "temperature": temperature}
+        if stream:
+            params.update(stream=True, stream_options={"include_usage": True})
+        return _dumps(params)[:-1] + b',"messages":[' + self.system_json
+
+    def render_body(
+        self,
+        messages: List[dict],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        stream: bool = False,
+    ) -> bytes:
+        """Serialize a chat request whose first message is this template.
+
+        Only the dynamic messages after the system prompt are encoded here.
+        """
+        if messages and messages[0]["role"] == "system" and messages[0]["content"] == self.text:
+            messages = messages[1:]
+        parts = [self.body_prefix(model, max_tokens, temperature, stream)]
+        for msg in messages:
+            parts.append(b",")
+            parts.append(_message_json(msg.get("role", "user"), msg.get("content", "")))
+        parts.append(b"]}")
+        return b"".join(parts)
+
+
+class PromptRegistry:
+    """Loads every ``<name>.v<N>.txt`` template once at startup.
+
+    The highest version of each template is active unless pinned with
+    ``PROMPT_VERSIONS`` (e.g. ``legal_assistant=1,legal_assistant_brief=2``).
+    """
+
+    def __init__(self, directory: str = PROMPTS_DIR, pinned: Dict[str, int] = None):
+        self.templates: Dict[str, Dict[int, PromptTemplate]] = {}
+        self.pinned = pinned or {}
+        for filename in sorted(os.listdir(directory)):
+            match = _TEMPLATE_FILE.match(filename)
+            if not match:
+                continue
+            with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                text = f.read().rstrip("\n")
+            name, version = match.group("name"), int(match.group("version"))
+            self.templates.setdefault(name, {})[version] = PromptTemplate(name, version, text)
+
+    @classmethod
+    def from_env(cls):
+        pinned = {}
+        for entry in filter(None, os.getenv("PROMPT_VERSIONS", "").split(",")):
+            name, _, version = entry.partition("=")
+            pinned[name.strip()] = int(version)
+        return cls(os.getenv("PROMPTS_DIR", PROMPTS_DIR), pinned)
+
+    def get(self, name: str, version: int = None) -> PromptTemplate:
+        versions = self.templates[name]
+        version = version or self.pinned.get(name) or max(versions)
+        return versions[version]
+
+
+prompt_registry = PromptRegistry.from_env()
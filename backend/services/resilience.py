@@ -0,0 +1,346 @@
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from services.concurrency import UPSTREAM_QUEUE_TIMEOUT
+
+# Statuses worth another attempt; 429 and 503 also mean "slow down"
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+OVERLOAD_STATUSES = {429, 503}
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class Overloaded(Exception):
+    pass
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills ``rate`` tokens per minute up to ``capacity``; callers wait for credit."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Take ``amount`` tokens, returning how long the caller had to wait."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                delay = (amount - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= amount
+        return waited
+
+
+class AIMDLimiter:
+    """Adaptive concurrency limit: grows by one per window of successes and
+    halves whenever the upstream signals overload."""
+
+    def __init__(
+        self,
+        initial: int = 32,
+        minimum: int = 4,
+        maximum: int = 256,
+        backoff: float = 0.5,
+        queue_timeout: float = 5.0,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.shed = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.in_flight < int(self.limit)),
+                    self.queue_timeout,
+                )
+            except asyncio.TimeoutError:
+                self.shed += 1
+                raise Overloaded("Too many upstream requests in flight")
+            self.in_flight += 1
+
+    async def release(self, overloaded: bool = False):
+        async with self._condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and lets a single
+    probe through once ``reset_timeout`` has passed."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+
+    def before_call(self) -> bool:
+        """Raise ``CircuitOpen`` or let the call through; returns True when
+        this call is the half-open probe, which must end in a recorded
+        outcome or ``release_probe()``."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpen("Upstream circuit is open")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise CircuitOpen("Upstream circuit is half-open")
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def release_probe(self):
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opens += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class Resilience:
+    """Rate limiting, adaptive concurrency, retries, hedging and a circuit
+    breaker wrapped around every upstream call."""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200000,
+        limiter: Optional[AIMDLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        hedge_delay: float = 0.0,
+    ):
+        self.rpm = TokenBucket(requests_per_minute)
+        self.tpm = TokenBucket(tokens_per_minute)
+        self.limiter = limiter or AIMDLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_delay = hedge_delay
+        self.stats = {"calls": 0, "retries": 0, "throttled_seconds": 0.0, "hedges": 0, "hedge_wins": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            requests_per_minute=float(os.getenv("OPENAI_RPM", 500)),
+            tokens_per_minute=float(os.getenv("OPENAI_TPM", 200000)),
+            limiter=AIMDLimiter(
+                initial=int(os.getenv("UPSTREAM_CONCURRENCY", 32)),
+                minimum=int(os.getenv("UPSTREAM_CONCURRENCY_MIN", 4)),
+                maximum=int(os.getenv("UPSTREAM_CONCURRENCY_MAX", 256)),
+                queue_timeout=UPSTREAM_QUEUE_TIMEOUT,
+            ),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("UPSTREAM_BREAKER_FAILURES", 5)),
+                reset_timeout=float(os.getenv("UPSTREAM_BREAKER_RESET", 30.0)),
+            ),
+            max_retries=int(os.getenv("UPSTREAM_RETRIES", 3)),
+            hedge_delay=float(os.getenv("UPSTREAM_HEDGE_DELAY", 0)),
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "shed": self.limiter.shed,
+            "breaker_state": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+        }
+
+    async def _throttle(self, tokens: int):
+        waited = await self.rpm.acquire(1)
+        waited += await self.tpm.acquire(tokens)
+        self.stats["throttled_seconds"] += waited
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                return min(retry_after, self.max_delay * 4) + random.uniform(0, self.base_delay)
+        # Full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _hedged(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        if self.hedge_delay <= 0:
+            return await send()
+        first = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+        if done:
+            return first.result()
+
+        # The first attempt is slow: race a second one and keep the winner
+        self.stats["hedges"] += 1
+        second = asyncio.ensure_future(send())
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(
+        self, send: Callable[[], Awaitable[httpx.Response]], tokens: int = 1, timer=None
+    ) -> httpx.Response:
+        """Send a request with retries; non-retryable responses are returned as-is.
+
+        ``timer`` (an ``UpstreamTimer``) times each attempt on its own.
+        """
+        self.stats["calls"] += 1
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            recorded = False
+            try:
+                await self._throttle(tokens)
+                await self.limiter.acquire()
+                response = None
+                overloaded = False
+                if timer is not None:
+                    timer.start_attempt()
+                try:
+                    response = await self._hedged(send)
+                    overloaded = response.status_code in OVERLOAD_STATUSES
+                except (httpx.TimeoutException, httpx.TransportError):
+                    overloaded = True
+                    self.breaker.record_failure()
+                    recorded = True
+                    if attempt >= self.max_retries:
+                        raise
+                finally:
+                    if timer is not None:
+                        timer.end_attempt()
+                    await self.limiter.release(overloaded)
+
+                if response is not None:
+                    recorded = True
+                    if response.status_code not in RETRYABLE_STATUSES:
+                        self.breaker.record_success()
+                        return response
+                    self.breaker.record_failure()
+                    if attempt >= self.max_retries:
+                        return response
+            finally:
+                # Shed, cancelled or failed with anything but an upstream
+                # error: no outcome, but the probe slot must not stay taken
+                if probe and not recorded:
+                    self.breaker.release_probe()
+
+            await asyncio.sleep(self._backoff(attempt, response))
+            attempt += 1
+            self.stats["retries"] += 1
+
+    @asynccontextmanager
+    async def stream_slot(self, tokens: int = 1, timer=None):
+        """Guard a streamed call; retries and hedging do not apply mid-stream.
+
+        The body reports the upstream outcome through the yielded dict.
+        ``timer`` times the stream from the moment it holds a slot.
+        """
+        self.stats["calls"] += 1
+        probe = self.breaker.before_call()
+        try:
+            await self._throttle(tokens)
+            await self.limiter.acquire()
+        except BaseException:
+            if probe:
+                self.breaker.release_probe()
+            raise
+        outcome = {"status_code": None}
+        if timer is not None:
+            timer.start_attempt()
+        try:
+            yield outcome
+        except (httpx.TimeoutException, httpx.TransportError):
+            outcome["status_code"] = 503
+            raise
+        finally:
+            if timer is not None:
+                timer.end_attempt()
+            status_code = outcome["status_code"]
+            if status_code in RETRYABLE_STATUSES:
+                self.breaker.record_failure()
+            elif status_code is not None:
+                self.breaker.record_success()
+            elif probe:
+                # Cancelled before the upstream answered
+                self.breaker.release_probe()
+            await self.limiter.release(status_code in OVERLOAD_STATUSES)
+
+
+resilience = Resilience.from_env()
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import anyio
+
+_WHITESPACE = re.compile(r"\s+")
+
+BYPASS_HEADER = "X-Cache-Bypass"
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", text or "").strip().lower()
+
+
+def make_key(model: str, temperature: float, messages: List[dict]) -> str:
+    """Hash of everything that determines the completion.
+
+    Whitespace and case are normalized so trivially different phrasings of the
+    same question share an entry. The system prompt is part of ``messages``, so
+    editing it naturally invalidates old entries.
+    """
+    normalized = [
+        [msg.get("role", "user"), _normalize(msg.get("content", ""))]
+        for msg in messages
+    ]
+    raw = json.dumps([model, round(float(temperature), 3), normalized], separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def should_bypass(headers) -> bool:
+    if headers.get(BYPASS_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in headers.get("Cache-Control", "").lower()
+
+
+class ResponseCache:
+    """Two-tier completion cache: in-process LRU in front of optional SQLite.
+
+    ``get``/``set`` serve the Flask worker threads; async code uses
+    ``aget``/``aset``, which keep SQLite off the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 86400.0,
+        db_path: Optional[str] = None,
+        max_disk_entries: int = 100000,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._disk_writes = 0
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS ix_response_cache_expires_at "
+                "ON response_cache (expires_at)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", 1024)),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", 86400)),
+            db_path=os.getenv("RESPONSE_CACHE_DB") or None,
+            max_disk_entries=int(os.getenv("RESPONSE_CACHE_DISK_SIZE", 100000)),
+        )
+
+    def _memory_get(self, key: str, now: float) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                del self._entries[key]
+                self.stats["expired"] += 1
+            if self._db is None:
+                self.stats["misses"] += 1
+        return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[dict]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        value = json.loads(row[0]) if row and row[1] > now else None
+        with self._lock:
+            if value is None:
+                self.stats["misses"] += 1
+            else:
+                self._store(key, value, row[1])
+                self.stats["disk_hits"] += 1
+        return value
+
+    def _disk_set(self, key: str, value: dict, expires_at: float):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._disk_writes += 1
+            if self._disk_writes % 100 == 0:
+                self._prune_disk()
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self._db is not None:
+            value = self._disk_get(key, now)
+        return value
+
+    def set(self, key: str, value: dict):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self._db is not None:
+            self._disk_set(key, value, expires_at)
+
+    # For the event loop: only the LRU is touched on the loop, and SQLite
+    # runs on a worker thread
+
+    async def aget(self, key: str) -> Optional[dict]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self._db is not None:
+            value = await anyio.to_thread.run_sync(self._disk_get, key, now)
+        return value
+
+    async def aset(self, key: str, value: dict):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self._db is not None:
+            await anyio.to_thread.run_sync(self._disk_set, key, value, expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM response_cache")
+                self._db.commit()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _store(self, key, value, expires_at):
+        # Caller holds _lock
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _prune_disk(self):
+        # Caller holds _db_lock
+        self._db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        overflow = self._db.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM response_cache WHERE key IN "
+                "(SELECT key FROM response_cache ORDER BY expires_at LIMIT ?)",
+                (overflow,),
+            )
+
+
+response_cache = ResponseCache.from_env()
@@ -0,0 +1,612 @@
+import asyncio
+import contextlib
+import copy
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from services.prompt import text_tokens
+
+logger = logging.getLogger("eezlegal.retrieval")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS_DIR = os.path.join(BACKEND_DIR, "knowledge")
+# Beside the app database, without importing SQLAlchemy for the path
+DEFAULT_INDEX_DIR = os.path.join(BACKEND_DIR, "database", "knowledge-index")
+
+CORPUS_SUFFIXES = (".md", ".txt", ".jsonl")
+MANIFEST = "manifest.json"
+# Held while a process cleans up or syncs the index; workers share the directory
+LOCK_FILE = ".lock"
+# Reciprocal rank fusion constant; 60 is the usual choice
+RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+CONTEXT_HEADER = "Reference material (cite it by number where relevant; it may not cover the question):"
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_PARAGRAPH = re.compile(r"\n\s*\n")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have if in is it its my of on or so that the "
+    "their there this to was were what when which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+@lru_cache(maxsize=1 << 18)
+def _feature(term: str, dim: int) -> Tuple[int, float]:
+    # crc32 rather than hash(): it must be stable across processes
+    h = zlib.crc32(term.encode("utf-8"))
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+class HashingEmbedder:
+    """Dense vectors from signed feature hashing of words and word pairs.
+
+    Needs no model or network call, so queries embed in microseconds and the
+    index can be built offline. Word pairs let the vector match phrases such
+    as "security deposit" that BM25 only sees as separate words.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, tokens: List[str]) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        counts = Counter(tokens)
+        counts.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        if not counts:
+            return vector
+        index = np.empty(len(counts), dtype=np.int64)
+        weight = np.empty(len(counts), dtype=np.float32)
+        for i, (feature, count) in enumerate(counts.items()):
+            index[i], sign = _feature(feature, self.dim)
+            weight[i] = sign * (1.0 + math.log(count))
+        np.add.at(vector, index, weight)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def split_passages(text: str, max_words: int) -> Iterator[str]:
+    """Pack paragraphs into passages of at most ``max_words`` words."""
+    words: List[str] = []
+    for paragraph in _PARAGRAPH.split(text):
+        paragraph_words = paragraph.split()
+        if words and len(words) + len(paragraph_words) > max_words:
+            yield " ".join(words)
+            words = []
+        words.extend(paragraph_words)
+        while len(words) > max_words:
+            yield " ".join(words[:max_words])
+            words = words[max_words:]
+    if words:
+        yield " ".join(words)
+
+
+def read_source(path: str, source: str, max_words: int) -> Iterator[dict]:
+    """Passages of one corpus file.
+
+    Markdown and text files are titled by their first heading (or file name);
+    ``.jsonl`` files hold one ``{"title", "text"}`` entry per line, e.g. FAQs.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                for text in split_passages(entry.get("text", ""), max_words):
+                    yield {"title": entry.get("title", ""), "text": text, "source": entry.get("source", source)}
+            return
+        text = f.read()
+    heading = next((line.lstrip("# ").strip() for line in text.splitlines() if line.startswith("#")), None)
+    title = heading or os.path.splitext(os.path.basename(path))[0].replace("_", " ").replace("-", " ")
+    for passage in split_passages(text, max_words):
+        yield {"title": title, "text": passage, "source": source}
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) <= k:
+        candidates = np.arange(len(scores))
+    else:
+        candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def _load(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Empty arrays can't be memory-mapped
+        return np.load(path)
+
+
+def _save_atomic(path: str, array: np.ndarray):
+    tmp = path + ".tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+class Segment:
+    """An immutable slice of the index, memory-mapped from its directory.
+
+    ``embeddings.npy`` holds one unit vector per passage. BM25 postings are
+    stored grouped by term (``post_docs``/``post_tf``), with each term's offset
+    and document frequency in ``meta.json``. Passages live in a JSONL file
+    read by offset. Only ``deleted.npy`` changes after the segment is written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.count = meta["count"]
+        self.total_length = meta["total_length"]
+        self.vocab: Dict[str, List[int]] = meta["vocab"]
+        self.embeddings = _load(os.path.join(path, "embeddings.npy"))
+        self.lengths = _load(os.path.join(path, "lengths.npy"))
+        self.post_docs = _load(os.path.join(path, "post_docs.npy"))
+        self.post_tf = _load(os.path.join(path, "post_tf.npy"))
+        self.offsets = _load(os.path.join(path, "offsets.npy"))
+        deleted = os.path.join(path, "deleted.npy")
+        self.deleted = np.load(deleted) if os.path.exists(deleted) else None
+        self._fd = os.open(os.path.join(path, "passages.jsonl"), os.O_RDONLY)
+        # Searches holding this segment, and whether it left the index
+        self.readers = 0
+        self.retired = False
+        self.remove = False
+
+    @property
+    def live(self) -> int:
+        return self.count - (int(self.deleted.sum()) if self.deleted is not None else 0)
+
+    @staticmethod
+    def write(path: str, passages: List[dict], embedder: HashingEmbedder) -> "Segment":
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        count = len(passages)
+        embeddings = np.lib.format.open_memmap(
+            os.path.join(tmp, "embeddings.npy"), mode="w+", dtype=np.float32, shape=(count, embedder.dim)
+        )
+        lengths = np.zeros(count, dtype=np.uint32)
+        offsets = np.zeros(count + 1, dtype=np.uint64)
+        vocab: Dict[str, int] = {}
+        term_ids, doc_ids, term_freqs = [], [], []
+        with open(os.path.join(tmp, "passages.jsonl"), "wb") as f:
+            for i, passage in enumerate(passages):
+                line = json.dumps(passage, ensure_ascii=False).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets[i + 1] = offsets[i] + len(line)
+                tokens = tokenize(f"{passage['title']} {passage['text']}")
+                lengths[i] = len(tokens)
+                embeddings[i] = embedder.embed(tokens)
+                counts = Counter(tokens)
+                term_ids.append(np.fromiter((vocab.setdefault(t, len(vocab)) for t in counts), np.uint32, len(counts)))
+                term_freqs.append(np.fromiter((min(c, 65535) for c in counts.values()), np.uint16, len(counts)))
+                doc_ids.append(np.full(len(counts), i, dtype=np.uint32))
+        embeddings.flush()
+        del embeddings
+
+        terms = np.concatenate(term_ids) if term_ids else np.zeros(0, np.uint32)
+        order = np.argsort(terms, kind="stable")
+        np.save(os.path.join(tmp, "post_docs.npy"), np.concatenate(doc_ids)[order] if doc_ids else terms)
+        np.save(os.path.join(tmp, "post_tf.npy"), np.concatenate(term_freqs)[order] if term_freqs else terms)
+        np.save(os.path.join(tmp, "lengths.npy"), lengths)
+        np.save(os.path.join(tmp, "offsets.npy"), offsets)
+        df = np.bincount(terms, minlength=len(vocab))
+        starts = np.cumsum(df) - df
+        meta = {
+            "count": count,
+            "total_length": int(lengths.sum()),
+            "vocab": {term: [int(starts[i]), int(df[i])] for term, i in vocab.items()},
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+        return Segment(path)
+
+    def mark_deleted(self, ranges: List[Tuple[int, int]]):
+        deleted = self.deleted.copy() if self.deleted is not None else np.zeros(self.count, dtype=bool)
+        for start, end in ranges:
+            deleted[start:end] = True
+        _save_atomic(os.path.join(self.path, "deleted.npy"), deleted)
+        self.deleted = deleted
+
+    def passage(self, i: int) -> dict:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        # pread keeps concurrent searches from sharing a file position
+        return json.loads(os.pread(self._fd, end - start, start))
+
+    def bm25(self, idf: Dict[str, float], avg_length: float) -> Optional[np.ndarray]:
+        scores = None
+        for term, weight in idf.items():
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            docs = self.post_docs[start:start + df]
+            tf = self.post_tf[start:start + df].astype(np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[docs] / avg_length)
+            if scores is None:
+                scores = np.zeros(self.count, dtype=np.float32)
+            # A term lists each document once, so fancy-index += is safe
+            scores[docs] += weight * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def close(self):
+        os.close(self._fd)
+
+
+class KnowledgeIndex:
+    """Hybrid dense + BM25 index over a directory of reference texts.
+
+    ``sync()`` is incremental: files are compared with the manifest by size
+    and mtime, passages of changed or removed files are tombstoned in their
+    segment, and new passages go into fresh segments. Nothing is rebuilt,
+    and segments whose passages are all deleted are dropped. Searches read
+    the current tuple of segments while a sync runs; a segment that leaves
+    the index is closed (and its directory removed) once the last search
+    holding it has finished.
+
+    Workers share the directory: an flock on ``.lock`` serializes open's
+    cleanup and syncs across processes, and a sync starts from the manifest
+    on disk.
+    """
+
+    def __init__(self, index_dir: str, dim: int = 256, max_words: int = 180, segment_size: int = 100000):
+        self.index_dir = index_dir
+        self.embedder = HashingEmbedder(dim)
+        self.max_words = max_words
+        self.segment_size = segment_size
+        self._write_lock = threading.Lock()
+        self._readers_lock = threading.Lock()
+        self.manifest = {"dim": dim, "max_words": max_words, "next_segment": 1, "segments": [], "sources": {}}
+        self.segments: Tuple[Segment, ...] = ()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(os.path.join(self.index_dir, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> dict:
+        path = os.path.join(self.index_dir, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            # Vectors or passages built with other settings can't be mixed in
+            if (manifest["dim"], manifest["max_words"]) == (self.manifest["dim"], self.manifest["max_words"]):
+                return manifest
+        return self.manifest
+
+    def open(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        with self._locked():
+            self.manifest = self._read_manifest()
+            # Drop segments a crashed sync wrote but never recorded
+            for name in os.listdir(self.index_dir):
+                if name not in (MANIFEST, LOCK_FILE) and name not in self.manifest["segments"]:
+                    shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+            self.segments = tuple(Segment(os.path.join(self.index_dir, name)) for name in self.manifest["segments"])
+        return self
+
+    def _refresh(self):
+        """Pick up a manifest another worker wrote since this one last read it."""
+        manifest = self._read_manifest()
+        if manifest == self.manifest:
+            return
+        old = self.segments
+        self.segments = tuple(Segment(os.path.join(self.index_dir, name)) for name in manifest["segments"])
+        self.manifest = manifest
+        self._retire(old)
+
+    def close(self):
+        old, self.segments = self.segments, ()
+        self._retire(old)
+
+    def _acquire(self) -> Tuple[Segment, ...]:
+        with self._readers_lock:
+            segments = self.segments
+            for segment in segments:
+                segment.readers += 1
+        return segments
+
+    def _release(self, segments: Tuple[Segment, ...]):
+        with self._readers_lock:
+            for segment in segments:
+                segment.readers -= 1
+            idle = [segment for segment in segments if segment.retired and segment.readers == 0]
+        self._dispose(idle)
+
+    def _retire(self, segments, remove: bool = False):
+        """Close segments no longer in ``self.segments``; those a search still
+        holds are closed by the search's ``_release``."""
+        with self._readers_lock:
+            for segment in segments:
+                segment.retired, segment.remove = True, remove
+            idle = [segment for segment in segments if segment.readers == 0]
+        self._dispose(idle)
+
+    @staticmethod
+    def _dispose(segments):
+        for segment in segments:
+            segment.close()
+            if segment.remove:
+                shutil.rmtree(segment.path, ignore_errors=True)
+
+    def _write_manifest(self, manifest: dict):
+        path = os.path.join(self.index_dir, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def _scan(self, corpus_dir: str) -> Dict[str, List[int]]:
+        files = {}
+        for root, dirs, names in os.walk(corpus_dir):
+            dirs.sort()
+            for name in sorted(names):
+                if name.endswith(CORPUS_SUFFIXES):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    files[os.path.relpath(path, corpus_dir)] = [stat.st_mtime_ns, stat.st_size]
+        return files
+
+    def sync(self, corpus_dir: str) -> dict:
+        with self._write_lock, self._locked():
+            self._refresh()
+            files = self._scan(corpus_dir) if os.path.isdir(corpus_dir) else {}
+            # Changes go to a copy that replaces the manifest once written
+            manifest = copy.deepcopy(self.manifest)
+            sources = manifest["sources"]
+            stale = [s for s, entry in sources.items() if files.get(s) != entry["stat"]]
+            changed = [s for s, stat in files.items() if s not in sources or sources[s]["stat"] != stat]
+            if not stale and not changed:
+                return {"added": 0, "removed": 0, "files": len(files), "passages": self.live}
+
+            deletions: Dict[str, List[Tuple[int, int]]] = {}
+            removed = 0
+            for source in stale:
+                for name, start, end in sources.pop(source)["ranges"]:
+                    deletions.setdefault(name, []).append((start, end))
+                    removed += end - start
+
+            segments = {segment.name: segment for segment in self.segments}
+            order = list(manifest["segments"])
+            written: List[Segment] = []
+            added = 0
+            pending: List[dict] = []
+            pending_ranges: List[Tuple[str, int, int]] = []
+
+            def flush():
+                name = f"seg-{manifest['next_segment']:06d}"
+                manifest["next_segment"] += 1
+                segments[name] = Segment.write(os.path.join(self.index_dir, name), pending, self.embedder)
+                written.append(segments[name])
+                order.append(name)
+                for source, start, end in pending_ranges:
+                    sources.setdefault(source, {"stat": files[source], "ranges": []})["ranges"].append([name, start, end])
+                pending.clear()
+                pending_ranges.clear()
+
+            try:
+                for source in changed:
+                    sources[source] = {"stat": files[source], "ranges": []}
+                    start = len(pending)
+                    for passage in read_source(os.path.join(corpus_dir, source), source, self.max_words):
+                        pending.append(passage)
+                        added += 1
+                        if len(pending) >= self.segment_size:
+                            pending_ranges.append((source, start, len(pending)))
+                            flush()
+                            start = 0
+                    if len(pending) > start:
+                        pending_ranges.append((source, start, len(pending)))
+                if pending:
+                    flush()
+            except BaseException:
+                # Nothing refers to the new segments yet
+                for segment in written:
+                    segment.close()
+                    shutil.rmtree(segment.path, ignore_errors=True)
+                raise
+
+            dropped = []
+            for name, ranges in deletions.items():
+                segments[name].mark_deleted(ranges)
+                if segments[name].live == 0:
+                    dropped.append(segments.pop(name))
+                    order.remove(name)
+            manifest["segments"] = order
+            self._write_manifest(manifest)
+            self.manifest = manifest
+            self.segments = tuple(segments[name] for name in order)
+            self._retire(dropped, remove=True)
+            return {"added": added, "removed": removed, "files": len(files), "passages": self.live}
+
+    @property
+    def live(self) -> int:
+        return sum(segment.live for segment in self.segments)
+
+    def search(self, query: str, k: int = 5) -> List[dict]:
+        """Top ``k`` passages by reciprocal rank fusion of cosine similarity
+        and BM25, each with its ``similarity`` and ``bm25`` scores."""
+        segments = self._acquire()
+        try:
+            return self._search(segments, query, k)
+        finally:
+            self._release(segments)
+
+    def _search(self, segments: Tuple[Segment, ...], query: str, k: int) -> List[dict]:
+        tokens = tokenize(query)
+        if not segments or not tokens:
+            return []
+        vector = self.embedder.embed(tokens)
+        documents = sum(segment.count for segment in segments)
+        avg_length = max(1.0, sum(segment.total_length for segment in segments) / max(1, documents))
+        idf = {}
+        for term in set(tokens):
+            df = sum(segment.vocab.get(term, (0, 0))[1] for segment in segments)
+            if df:
+                idf[term] = math.log(1 + (documents - df + 0.5) / (df + 0.5))
+
+        scored, dense, lexical = [], [], []
+        for s, segment in enumerate(segments):
+            similarity = segment.embeddings @ vector
+            bm25 = segment.bm25(idf, avg_length)
+            if segment.deleted is not None:
+                similarity[segment.deleted] = -np.inf
+                if bm25 is not None:
+                    bm25[segment.deleted] = 0
+            scored.append((similarity, bm25))
+            dense.extend((float(similarity[i]), s, int(i)) for i in _top(similarity, k) if similarity[i] > 0)
+            if bm25 is not None:
+                lexical.extend((float(bm25[i]), s, int(i)) for i in _top(bm25, k) if bm25[i] > 0)
+
+        fused: Dict[Tuple[int, int], float] = {}
+        for ranking in (sorted(dense, reverse=True)[:k], sorted(lexical, reverse=True)[:k]):
+            for rank, (_, s, i) in enumerate(ranking):
+                fused[s, i] = fused.get((s, i), 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        hits = []
+        for (s, i), score in sorted(fused.items(), key=lambda item: -item[1])[:k]:
+            similarity, bm25 = scored[s]
+            hits.append({
+                **segments[s].passage(i),
+                "score": round(score, 5),
+                "similarity": round(float(similarity[i]), 4),
+                "bm25": round(float(bm25[i]), 3) if bm25 is not None else 0.0,
+            })
+        return hits
+
+
+class Retriever:
+    """Grounds chat prompts in the local knowledge base.
+
+    The index is opened at startup (memory-mapped, so it costs no load time)
+    and synced with the corpus directory in the background; until the first
+    sync finishes, searches use what was indexed before.
+    """
+
+    def __init__(
+        self,
+        corpus_dir: str = DEFAULT_CORPUS_DIR,
+        index_dir: str = DEFAULT_INDEX_DIR,
+        top_k: int = 4,
+        max_tokens: int = 800,
+        min_similarity: float = 0.3,
+        min_relative_bm25: float = 0.5,
+        dim: int = 256,
+        segment_size: int = 100000,
+    ):
+        self.corpus_dir = corpus_dir
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+        self.min_similarity = min_similarity
+        self.min_relative_bm25 = min_relative_bm25
+        self.index = KnowledgeIndex(index_dir, dim=dim, segment_size=segment_size)
+        self._sync_task: Optional[asyncio.Task] = None
+        self.stats = {"searches": 0, "grounded": 0, "syncs": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            corpus_dir=os.getenv("KNOWLEDGE_DIR", DEFAULT_CORPUS_DIR),
+            index_dir=os.getenv("KNOWLEDGE_INDEX_DIR", DEFAULT_INDEX_DIR),
+            top_k=int(os.getenv("RETRIEVAL_TOP_K", 4)),
+            max_tokens=int(os.getenv("RETRIEVAL_MAX_TOKENS", 800)),
+            min_similarity=float(os.getenv("RETRIEVAL_MIN_SIMILARITY", 0.3)),
+            min_relative_bm25=float(os.getenv("RETRIEVAL_MIN_RELATIVE_BM25", 0.5)),
+            dim=int(os.getenv("RETRIEVAL_DIM", 256)),
+            segment_size=int(os.getenv("RETRIEVAL_SEGMENT_SIZE", 100000)),
+        )
+
+    async def start(self):
+        await run_in_threadpool(self.index.open)
+        self._sync_task = asyncio.ensure_future(self._sync_in_background())
+
+    async def _sync_in_background(self):
+        try:
+            result = await self.sync()
+        except Exception:
+            logger.exception("Knowledge index sync failed; searching the previous index")
+            return
+        if not result["files"]:
+            logger.warning("No knowledge corpus in %s; chat answers will not be grounded", self.corpus_dir)
+
+    async def close(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        self.index.close()
+
+    async def sync(self) -> dict:
+        result = await run_in_threadpool(self.index.sync, self.corpus_dir)
+        self.stats["syncs"] += 1
+        if result["added"] or result["removed"]:
+            logger.info("Knowledge index synced: %s", result)
+        return result
+
+    async def search(self, query: str, k: Optional[int] = None) -> List[dict]:
+        if not self.index.segments:
+            return []
+        self.stats["searches"] += 1
+        # NumPy releases the GIL for the matrix product, so a thread keeps
+        # large indexes from stalling the event loop
+        return await run_in_threadpool(self.index.search, query, k or self.top_k)
+
+    async def context_for(self, message: str) -> Tuple[Optional[str], List[dict]]:
+        """Prompt context of the best passages within ``max_tokens``, and
+        their titles and sources for citing."""
+        hits = await self.search(message)
+        # Lexical scores are only comparable within one query, so passages
+        # must come close to the best match unless their vectors agree
+        best_bm25 = max((hit["bm25"] for hit in hits), default=0.0)
+        blocks, sources, used = [], [], text_tokens(CONTEXT_HEADER)
+        for hit in hits:
+            if hit["similarity"] < self.min_similarity and (
+                hit["bm25"] <= 0 or hit["bm25"] < self.min_relative_bm25 * best_bm25
+            ):
+                continue
+            block = f"[{len(blocks) + 1}] {hit['title']}\n{hit['text']}"
+            cost = text_tokens(block)
+            if used + cost > self.max_tokens:
+                break
+            blocks.append(block)
+            sources.append({"title": hit["title"], "source": hit["source"]})
+            used += cost
+        if not blocks:
+            return None, []
+        self.stats["grounded"] += 1
+        return "\n\n".join([CONTEXT_HEADER, *blocks]), sources
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "segments": len(self.index.segments),
+            "passages": self.index.live,
+            "sources": len(self.index.manifest["sources"]),
+        }
+
+
+retriever = Retriever.from_env()
@@ -0,0 +1,148 @@
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one upstream call.
+
+    The first caller (the leader) starts the work as a task; everyone arriving
+    while it runs awaits that same task. The task is shielded, so a leader
+    whose client disconnects does not cancel the call for its followers.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.stats["calls"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
+
+
+class _Broadcast:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        # Chunks each subscriber has consumed, by subscriber
+        self.positions: Dict[object, int] = {}
+        self.changed = asyncio.Event()
+        self.advanced = asyncio.Event()
+        self.task = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self.positions)
+
+    def lead(self) -> int:
+        """How many chunks the pump is ahead of the slowest subscriber."""
+        return len(self.chunks) - min(self.positions.values(), default=len(self.chunks))
+
+    def publish(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def consumed(self, subscriber, position: int):
+        self.positions[subscriber] = position
+        self._wake_pump()
+
+    def leave(self, subscriber):
+        del self.positions[subscriber]
+        self._wake_pump()
+
+    def _wake_pump(self):
+        self.advanced.set()
+        self.advanced = asyncio.Event()
+
+
+class StreamFlight:
+    """Fans one upstream stream out to every identical concurrent request.
+
+    Chunks are buffered for the lifetime of the stream so late joiners replay
+    from the start. The upstream is read at most ``max_ahead`` chunks ahead
+    of the slowest subscriber, so a slow client still slows the upstream
+    read as it would without coalescing. When the last subscriber
+    disconnects the upstream stream is cancelled.
+    """
+
+    def __init__(self, max_ahead: int = 32):
+        self.max_ahead = max_ahead
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(max_ahead=int(os.getenv("STREAM_FLIGHT_MAX_AHEAD", 32)))
+
+    async def subscribe(
+        self, key: Hashable, factory: Callable[[], AsyncIterator]
+    ) -> AsyncIterator:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, factory))
+            self.stats["calls"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        subscriber = object()
+        broadcast.consumed(subscriber, 0)
+        try:
+            position = 0
+            while True:
+                if position < len(broadcast.chunks):
+                    yield broadcast.chunks[position]
+                    position += 1
+                    # Resumed only once the client took the chunk
+                    broadcast.consumed(subscriber, position)
+                elif broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                else:
+                    await broadcast.changed.wait()
+        finally:
+            broadcast.leave(subscriber)
+            if broadcast.subscribers == 0 and not broadcast.done:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+                broadcast.task.cancel()
+
+    async def _pump(self, key, broadcast: _Broadcast, factory):
+        stream = factory()
+        try:
+            async for chunk in stream:
+                broadcast.chunks.append(chunk)
+                broadcast.publish()
+                while broadcast.lead() >= self.max_ahead:
+                    await broadcast.advanced.wait()
+        except asyncio.CancelledError:
+            broadcast.error = ConnectionAbortedError("stream cancelled")
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            await stream.aclose()
+            broadcast.done = True
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            broadcast.publish()
+
+
+chat_flight = SingleFlight()
+stream_flight = StreamFlight.from_env()
@@ -0,0 +1,115 @@
+import os
+import re
+from typing import Optional
+
+import httpx
+
+_E164 = re.compile(r"^\+[1-9]\d{7,14}$")
+
+
+class SMSError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        # Read by the job queue: permanent failures skip the retries
+        self.retryable = retryable
+
+
+def normalize_phone(phone: str) -> Optional[str]:
+    """E.164 form of a phone number as typed, or None if it isn't one."""
+    phone = re.sub(r"[\s().-]", "", phone or "")
+    if phone.startswith("00"):
+        phone = "+" + phone[2:]
+    return phone if _E164.match(phone) else None
+
+
+def mask_phone(phone: str) -> str:
+    """A number with all but its country code prefix and last two digits hidden."""
+    return phone[:3] + "*" * max(0, len(phone) - 5) + phone[-2:]
+
+
+class TwilioSMS:
+    """Sends SMS through Twilio's REST API on a pooled async client.
+
+    The Twilio SDK makes blocking calls, so messages go straight to the
+    Messages endpoint instead. ``TWILIO_API_BASE`` points it at a local fake
+    for testing.
+    """
+
+    def __init__(
+        self,
+        account_sid: Optional[str],
+        auth_token: Optional[str],
+        from_number: Optional[str] = None,
+        messaging_service_sid: Optional[str] = None,
+        api_base: str = "https://api.twilio.com",
+        timeout: float = 10.0,
+    ):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.messaging_service_sid = messaging_service_sid
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"sent": 0, "failed": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("TWILIO_ACCOUNT_SID"),
+            os.getenv("TWILIO_AUTH_TOKEN"),
+            from_number=os.getenv("TWILIO_FROM_NUMBER"),
+            messaging_service_sid=os.getenv("TWILIO_MESSAGING_SERVICE_SID"),
+            api_base=os.getenv("TWILIO_API_BASE", "https://api.twilio.com"),
+            timeout=float(os.getenv("TWILIO_TIMEOUT", 10)),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.account_sid and self.auth_token and (self.from_number or self.messaging_service_sid))
+
+    async def start(self):
+        if self._client is None and self.configured:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_base, auth=(self.account_sid, self.auth_token), timeout=self.timeout
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def send(self, to: str, body: str) -> str:
+        """Send one message and return its Twilio SID."""
+        if self._client is None:
+            raise SMSError("SMS is not configured", retryable=False)
+        form = {"To": to, "Body": body}
+        if self.messaging_service_sid:
+            form["MessagingServiceSid"] = self.messaging_service_sid
+        else:
+            form["From"] = self.from_number
+        try:
+            response = await self._client.post(f"/2010-04-01/Accounts/{self.account_sid}/Messages.json", data=form)
+        except httpx.HTTPError as e:
+            self.stats["failed"] += 1
+            raise SMSError(f"Twilio unreachable: {type(e).__name__}")
+        if response.status_code >= 300:
+            self.stats["failed"] += 1
+            try:
+                detail = response.json().get("message", "")
+            except ValueError:
+                detail = ""
+            # Twilio quotes the number in its errors, which end up in job rows
+            detail = detail.replace(to, mask_phone(to))
+            # Bad numbers and auth errors won't fix themselves; rate limits and
+            # server errors will
+            retryable = response.status_code == 429 or response.status_code >= 500
+            raise SMSError(f"Twilio HTTP {response.status_code}: {detail}", retryable=retryable)
+        self.stats["sent"] += 1
+        return response.json().get("sid", "")
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "configured": self.configured}
+
+
+sms = TwilioSMS.from_env()
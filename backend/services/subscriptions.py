@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Set
+
+import httpx
+from sqlalchemy import select, update
+
+from services.database import database, subscriptions
+
+FREE_SUBSCRIPTION = {"status": "active", "plan": "free", "expires_at": None}
+
+# Stripe statuses that still grant the paid plan
+PAID_STATUSES = ("active", "trialing")
+# Dunning states where access is suspended until the invoice is paid
+SUSPENDED_STATUSES = ("past_due", "unpaid")
+
+SUBSCRIPTION_EVENTS = (
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+)
+
+
+class WebhookSignatureError(Exception):
+    pass
+
+
+class StripeUnavailable(Exception):
+    pass
+
+
+def verify_stripe_signature(payload: bytes, header: str, secret: str, tolerance: int = 300):
+    """Check a ``Stripe-Signature`` header the same way Stripe's SDK does."""
+    timestamp, signatures = None, []
+    for item in (header or "").split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if not timestamp or not signatures:
+        raise WebhookSignatureError("Malformed signature header")
+    if abs(time.time() - int(timestamp)) > tolerance:
+        raise WebhookSignatureError("Timestamp outside the tolerance zone")
+    expected = hmac.new(secret.encode(), timestamp.encode() + b"." + payload, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise WebhookSignatureError("No matching signature")
+
+
+def state_from_stripe(subscription: dict) -> dict:
+    items = subscription.get("items", {}).get("data") or [{}]
+    price = items[0].get("price") or {}
+    return {
+        "status": subscription.get("status", "canceled"),
+        "plan": subscription.get("metadata", {}).get("plan") or price.get("lookup_key") or "pro",
+        "expires_at": subscription.get("current_period_end"),
+    }
+
+
+def effective_plan(state: dict) -> str:
+    return state["plan"] if state["status"] in PAID_STATUSES else "free"
+
+
+class SubscriptionService:
+    """Per-user plan and status, kept local so the request path never calls Stripe.
+
+    Stripe webhooks write through to the database and the in-process cache.
+    Entries older than ``ttl`` are still served while a background refresh
+    runs (stale-while-revalidate); only a miss reads the database, and only a
+    user with a Stripe customer id and a stale entry is ever refreshed from
+    Stripe. At most ``max_entries`` users are cached, least recently used
+    first out.
+
+    Webhooks and cancels only update the cache of the worker that handled
+    them; other workers pick the change up once their entry passes ``ttl``.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_stale: float = 86400.0,
+        max_entries: int = 100000,
+        stripe_api_base: str = "https://api.stripe.com",
+        stripe_secret_key: Optional[str] = None,
+        webhook_secret: Optional[str] = None,
+    ):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.stripe_api_base = stripe_api_base.rstrip("/")
+        self.stripe_secret_key = stripe_secret_key
+        self.webhook_secret = webhook_secret
+        self._entries = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "webhooks": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            ttl=float(os.getenv("SUBSCRIPTION_CACHE_TTL", 300)),
+            max_stale=float(os.getenv("SUBSCRIPTION_MAX_STALE", 86400)),
+            max_entries=int(os.getenv("SUBSCRIPTION_CACHE_SIZE", 100000)),
+            stripe_api_base=os.getenv("STRIPE_API_BASE", "https://api.stripe.com"),
+            stripe_secret_key=os.getenv("STRIPE_SECRET_KEY"),
+            webhook_secret=os.getenv("STRIPE_WEBHOOK_SECRET"),
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _remember(self, user_id: str, state: dict, customer_id: Optional[str]):
+        self._entries[user_id] = (time.monotonic(), state, customer_id)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    async def get(self, user_id: str) -> dict:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+            fetched_at, state, customer_id = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                return state
+            if age < self.max_stale:
+                self.stats["stale_hits"] += 1
+                self._revalidate(user_id, customer_id)
+                return state
+
+        self.stats["misses"] += 1
+        state, customer_id = await self._load(user_id)
+        self._remember(user_id, state, customer_id)
+        return state
+
+    async def _load(self, user_id: str):
+        async with database.session() as session:
+            row = (await session.execute(
+                select(
+                    subscriptions.c.status,
+                    subscriptions.c.plan,
+                    subscriptions.c.expires_at,
+                    subscriptions.c.stripe_customer_id,
+                ).where(subscriptions.c.user_id == user_id)
+            )).first()
+        if row is None:
+            # Users without a row have never paid and are on the free plan
+            return dict(FREE_SUBSCRIPTION), None
+        return {"status": row.status, "plan": row.plan, "expires_at": row.expires_at}, row.stripe_customer_id
+
+    def _revalidate(self, user_id: str, customer_id: Optional[str]):
+        if user_id in self._refreshing:
+            return
+        self._refreshing.add(user_id)
+
+        async def refresh():
+            try:
+                if customer_id and self.stripe_secret_key:
+                    state = await self._fetch_from_stripe(customer_id)
+                    await self._store(user_id, state, customer_id)
+                else:
+                    state, customer_id_now = await self._load(user_id)
+                    self._remember(user_id, state, customer_id_now)
+                self.stats["refreshes"] += 1
+            except Exception:
+                # Keep serving the stale entry; the next request retries
+                self.stats["refresh_errors"] += 1
+            finally:
+                self._refreshing.discard(user_id)
+
+        asyncio.ensure_future(refresh())
+
+    async def _stripe(self, method: str, path: str, **kwargs) -> dict:
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.stripe_api_base, timeout=10.0)
+        response = await self._client.request(method, path, auth=(self.stripe_secret_key, ""), **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def _fetch_from_stripe(self, customer_id: str) -> dict:
+        data = (await self._stripe(
+            "GET", "/v1/subscriptions", params={"customer": customer_id, "status": "all", "limit": 1}
+        )).get("data") or []
+        return state_from_stripe(data[0]) if data else {**FREE_SUBSCRIPTION, "status": "canceled"}
+
+    async def _store(self, user_id: str, state: dict, customer_id: Optional[str], event_time: Optional[float] = None):
+        updated_at = time.time() if event_time is None else event_time
+        values = {**state, "stripe_customer_id": customer_id, "updated_at": updated_at}
+        async with database.session() as session:
+            result = await session.execute(
+                update(subscriptions)
+                .where(subscriptions.c.user_id == user_id)
+                # Stripe may deliver events out of order; never go backwards
+                .where(subscriptions.c.updated_at <= updated_at)
+                .values(**values)
+            )
+            if not result.rowcount:
+                exists = (await session.execute(
+                    select(subscriptions.c.user_id).where(subscriptions.c.user_id == user_id)
+                )).first()
+                if exists:
+                    return
+                await session.execute(subscriptions.insert().values(user_id=user_id, **values))
+            await session.commit()
+        self._remember(user_id, state, customer_id)
+
+    async def _link_customer(self, user_id: str, customer_id: str, event_time: Optional[float]):
+        # Re-subscribing after a cancel may bring a new customer; the link
+        # holds whatever the state, which only moves forward in time
+        async with database.session() as session:
+            await session.execute(
+                update(subscriptions).where(subscriptions.c.user_id == user_id).values(stripe_customer_id=customer_id)
+            )
+            await session.commit()
+        self.invalidate(user_id)
+        await self._store(user_id, {**FREE_SUBSCRIPTION, "status": "incomplete"}, customer_id, event_time)
+
+    async def _user_for_customer(self, customer_id: str) -> Optional[str]:
+        async with database.session() as session:
+            row = (await session.execute(
+                select(subscriptions.c.user_id).where(subscriptions.c.stripe_customer_id == customer_id)
+            )).first()
+        return row.user_id if row else None
+
+    async def handle_webhook(self, payload: bytes, signature: str) -> bool:
+        """Apply a Stripe event; returns False for events that were ignored."""
+        if not self.webhook_secret:
+            raise WebhookSignatureError("STRIPE_WEBHOOK_SECRET is not configured")
+        verify_stripe_signature(payload, signature, self.webhook_secret)
+        event = json.loads(payload)
+        self.stats["webhooks"] += 1
+        obj = event.get("data", {}).get("object", {})
+
+        if event.get("type") == "checkout.session.completed":
+            # Links the Stripe customer to our user; the subscription events
+            # that follow carry the plan and status
+            user_id = obj.get("client_reference_id")
+            if not user_id or not obj.get("customer"):
+                return False
+            await self._link_customer(user_id, obj["customer"], event.get("created"))
+            return True
+
+        if event.get("type") not in SUBSCRIPTION_EVENTS:
+            return False
+        customer_id = obj.get("customer")
+        user_id = obj.get("metadata", {}).get("user_id") or await self._user_for_customer(customer_id)
+        if not user_id:
+            return False
+        await self._store(user_id, state_from_stripe(obj), customer_id, event.get("created"))
+        return True
+
+    async def cancel(self, user_id: str) -> Optional[dict]:
+        """Cancel the user's subscription in Stripe and store the state it
+        returns; None if there is nothing to cancel. Raises
+        ``StripeUnavailable`` if Stripe can't be reached."""
+        _, customer_id = await self._load(user_id)
+        if not customer_id:
+            return None
+        if not self.stripe_secret_key:
+            raise StripeUnavailable("Stripe is not configured")
+        try:
+            listed = (await self._stripe(
+                "GET", "/v1/subscriptions", params={"customer": customer_id, "status": "all", "limit": 10}
+            )).get("data") or []
+            live = next((sub for sub in listed if sub.get("status") not in ("canceled", "incomplete_expired")), None)
+            if live is None:
+                return None
+            canceled = await self._stripe("DELETE", f"/v1/subscriptions/{live['id']}")
+        except httpx.HTTPError as e:
+            raise StripeUnavailable(f"Stripe request failed: {type(e).__name__}")
+        state = state_from_stripe({**live, **canceled})
+        await self._store(user_id, state, customer_id)
+        return state
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "cached": len(self._entries), "refreshing": len(self._refreshing)}
+
+
+subscription_service = SubscriptionService.from_env()
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select
+
+from services.database import database, revoked_tokens
+
+logger = logging.getLogger("eezlegal.tokens")
+
+
+class TokenError(Exception):
+    pass
+
+
+class KeyRing:
+    """Signing keys by key id (``kid``).
+
+    New tokens are signed with the active key; every key still in the ring
+    verifies, so a key can be rotated in, made active, and dropped once the
+    tokens it signed have expired.
+    """
+
+    def __init__(self, keys: Dict[str, str], active_kid: Optional[str] = None):
+        if not keys:
+            raise ValueError("KeyRing needs at least one key")
+        self.keys = dict(keys)
+        self.active_kid = active_kid or next(iter(self.keys))
+        if self.active_kid not in self.keys:
+            raise ValueError(f"Active key {self.active_kid!r} is not in the key ring")
+
+    @classmethod
+    def from_env(cls):
+        # JWT_SIGNING_KEYS="2024-06:secret,2024-01:older-secret"
+        keys = {}
+        for entry in filter(None, os.getenv("JWT_SIGNING_KEYS", "").split(",")):
+            kid, _, secret = entry.partition(":")
+            keys[kid.strip()] = secret.strip()
+        if not keys and os.getenv("JWT_SECRET_KEY"):
+            keys["default"] = os.getenv("JWT_SECRET_KEY")
+        if not keys:
+            # A random per-process key would only verify on the worker that
+            # signed it, so refuse to start instead
+            raise ValueError("Set JWT_SIGNING_KEYS or JWT_SECRET_KEY; every worker must share the signing keys")
+        return cls(keys, os.getenv("JWT_ACTIVE_KID"))
+
+    @property
+    def active_key(self) -> str:
+        return self.keys[self.active_kid]
+
+    def rotate(self, kid: str, secret: str):
+        self.keys[kid] = secret
+        self.active_kid = kid
+
+    def retire(self, kid: str):
+        if kid == self.active_kid:
+            raise ValueError("Cannot retire the active key")
+        self.keys.pop(kid, None)
+
+
+class TokenService:
+    """Issues and verifies HS256 JWTs without a database round trip.
+
+    Verified tokens are kept in an LRU until they expire, so repeat requests
+    with the same token skip the signature check and claim parsing entirely.
+    Logout revokes a token's ``jti`` for the rest of its lifetime: the id is
+    stored in ``revoked_token`` and every worker reloads that table every
+    ``revocation_sync`` seconds, so revocations survive restarts and reach
+    the other workers without a database call per request.
+    """
+
+    def __init__(
+        self,
+        keyring: KeyRing,
+        algorithm: str = "HS256",
+        ttl: int = 3600,
+        issuer: str = "eezlegal",
+        cache_size: int = 10000,
+        revocation_sync: float = 5.0,
+    ):
+        self.keyring = keyring
+        self.algorithm = algorithm
+        self.ttl = ttl
+        self.issuer = issuer
+        self.cache_size = cache_size
+        self.revocation_sync = revocation_sync
+        self._verified = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"issued": 0, "cache_hits": 0, "verified": 0, "rejected": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            KeyRing.from_env(),
+            ttl=int(os.getenv("JWT_TTL", 3600)),
+            issuer=os.getenv("JWT_ISSUER", "eezlegal"),
+            cache_size=int(os.getenv("JWT_CACHE_SIZE", 10000)),
+            revocation_sync=float(os.getenv("JWT_REVOCATION_SYNC", 5)),
+        )
+
+    async def start(self):
+        await self.load_revocations()
+        self._task = asyncio.ensure_future(self._sync_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def issue(self, subject: str, claims: Optional[dict] = None, ttl: Optional[int] = None) -> str:
+        now = int(time.time())
+        payload = {
+            **(claims or {}),
+            "sub": str(subject),
+            "iss": self.issuer,
+            "iat": now,
+            "exp": now + (ttl or self.ttl),
+            "jti": secrets.token_urlsafe(12),
+        }
+        self.stats["issued"] += 1
+        # python-jose pulls in cryptography, so it is imported on first use
+        from jose import jwt
+        return jwt.encode(
+            payload,
+            self.keyring.active_key,
+            algorithm=self.algorithm,
+            headers={"kid": self.keyring.active_kid},
+        )
+
+    def _cached(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._verified.get(token)
+            if entry is None:
+                return None
+            kid, claims = entry
+            if claims["exp"] <= time.time() or kid not in self.keyring.keys or claims["jti"] in self._revoked:
+                del self._verified[token]
+                return None
+            self._verified.move_to_end(token)
+            return claims
+
+    def verify(self, token: str) -> dict:
+        """Return the token's claims or raise ``TokenError``."""
+        claims = self._cached(token)
+        if claims is not None:
+            self.stats["cache_hits"] += 1
+            return claims
+
+        from jose import JWTError, jwt
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            key = self.keyring.keys.get(kid)
+            if key is None:
+                raise TokenError("Unknown signing key")
+            claims = jwt.decode(token, key, algorithms=[self.algorithm], issuer=self.issuer)
+        except (JWTError, TokenError) as e:
+            self.stats["rejected"] += 1
+            raise TokenError(str(e))
+        if claims.get("jti") in self._revoked:
+            self.stats["rejected"] += 1
+            raise TokenError("Token has been revoked")
+
+        self.stats["verified"] += 1
+        with self._lock:
+            self._verified[token] = (kid, claims)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return claims
+
+    def _remember_revoked(self, revoked: Dict[str, float]):
+        now = time.time()
+        with self._lock:
+            # Drop revocations whose tokens have expired anyway
+            for jti in [jti for jti, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[jti]
+            self._revoked.update(revoked)
+
+    async def revoke(self, claims: dict):
+        if database.is_sqlite:
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        async with database.session() as session:
+            await session.execute(
+                insert(revoked_tokens)
+                .values(jti=claims["jti"], expires_at=claims["exp"])
+                .on_conflict_do_nothing(index_elements=[revoked_tokens.c.jti])
+            )
+            await session.commit()
+        self._remember_revoked({claims["jti"]: claims["exp"]})
+
+    async def load_revocations(self):
+        """Pick up revocations made by other workers or before a restart."""
+        now = time.time()
+        async with database.session() as session:
+            rows = (await session.execute(
+                select(revoked_tokens.c.jti, revoked_tokens.c.expires_at).where(revoked_tokens.c.expires_at > now)
+            )).all()
+            await session.execute(delete(revoked_tokens).where(revoked_tokens.c.expires_at <= now))
+            await session.commit()
+        # Merged rather than replaced: revocations are never undone
+        self._remember_revoked(dict(rows))
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.revocation_sync)
+            try:
+                await self.load_revocations()
+            except Exception:
+                logger.exception("Loading token revocations failed")
+                self.stats["errors"] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "cached": len(self._verified),
+            "revoked": len(self._revoked),
+            "active_kid": self.keyring.active_kid,
+            "kids": sorted(self.keyring.keys),
+        }
+
+
+tokens = TokenService.from_env()
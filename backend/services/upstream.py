@@ -0,0 +1,196 @@
+import json
+import os
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from services.metrics import UpstreamTimer
+from services.resilience import resilience
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def _http2_available():
+    # httpx only speaks HTTP/2 when the optional "h2" package is installed
+    if os.getenv("UPSTREAM_HTTP2", "1") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Per-route timeouts: completions can take a while to generate, but connecting
+# or waiting for a free pooled connection should fail fast.
+ROUTE_TIMEOUTS = {
+    "default": httpx.Timeout(
+        _env_float("UPSTREAM_TIMEOUT", 30.0),
+        connect=_env_float("UPSTREAM_CONNECT_TIMEOUT", 5.0),
+        pool=_env_float("UPSTREAM_POOL_TIMEOUT", 5.0),
+    ),
+    "chat": httpx.Timeout(
+        _env_float("OPENAI_CHAT_TIMEOUT", 30.0),
+        connect=_env_float("UPSTREAM_CONNECT_TIMEOUT", 5.0),
+        pool=_env_float("UPSTREAM_POOL_TIMEOUT", 5.0),
+    ),
+    # Streams stay open for the whole generation; the read timeout bounds the
+    # gap between two chunks rather than the total duration.
+    "chat_stream": httpx.Timeout(
+        _env_float("OPENAI_STREAM_READ_TIMEOUT", 30.0),
+        connect=_env_float("UPSTREAM_CONNECT_TIMEOUT", 5.0),
+        pool=_env_float("UPSTREAM_POOL_TIMEOUT", 5.0),
+    ),
+}
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code: int, message: str = "Upstream API error"):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UpstreamClient:
+    """App-lifetime pooled HTTP client shared by every upstream call."""
+
+    def __init__(
+        self,
+        base_url: str = OPENAI_BASE_URL,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+    ):
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_connections=_env_int("UPSTREAM_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("UPSTREAM_MAX_KEEPALIVE", 20),
+            keepalive_expiry=_env_float("UPSTREAM_KEEPALIVE_EXPIRY", 30.0),
+            http2=_http2_available(),
+        )
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                http2=self.http2,
+                timeout=ROUTE_TIMEOUTS["default"],
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # Outside of the app lifespan (scripts, tests) fall back to a lazily
+            # created client so callers never have to care.
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                http2=self.http2,
+                timeout=ROUTE_TIMEOUTS["default"],
+            )
+        return self._client
+
+    @staticmethod
+    def openai_headers(api_key: str) -> dict:
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+
+    async def chat_completion(self, api_key: str, body: bytes, tokens: int) -> httpx.Response:
+        """POST a pre-serialized completion request.
+
+        ``tokens`` is the prompt size plus ``max_tokens``, used for TPM limits.
+        """
+        timer = UpstreamTimer("chat")
+        try:
+            response = await resilience.call(
+                lambda: self.client.post(
+                    "/chat/completions",
+                    headers=self.openai_headers(api_key),
+                    content=body,
+                    timeout=ROUTE_TIMEOUTS["chat"],
+                    extensions={"trace": timer.trace},
+                ),
+                tokens=tokens,
+                timer=timer,
+            )
+        except Exception as e:
+            timer.error(type(e).__name__)
+            raise
+        if response.status_code != 200:
+            timer.error(f"http_{response.status_code}")
+        else:
+            try:
+                generated = (json.loads(response.content).get("usage") or {}).get("completion_tokens", 0)
+            except ValueError:
+                generated = 0
+            timer.record_tokens(generated, streamed=False)
+        return response
+
+    async def stream_chat_completion(self, api_key: str, body: bytes, tokens: int) -> AsyncIterator[dict]:
+        """Yield decoded chunks of a streamed completion.
+
+        ``body`` must already ask for ``stream``. The upstream response is
+        closed as soon as the consumer stops iterating (e.g. the client
+        disconnected and the generator was cancelled).
+        """
+        timer = UpstreamTimer("chat_stream")
+        generated = 0
+        try:
+            async with resilience.stream_slot(tokens, timer) as outcome:
+                async with self.client.stream(
+                    "POST",
+                    "/chat/completions",
+                    headers=self.openai_headers(api_key),
+                    content=body,
+                    timeout=ROUTE_TIMEOUTS["chat_stream"],
+                    extensions={"trace": timer.trace},
+                ) as response:
+                    outcome["status_code"] = response.status_code
+                    if response.status_code != 200:
+                        await response.aread()
+                        raise UpstreamError(response.status_code)
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        if chunk.get("usage"):
+                            generated = chunk["usage"].get("completion_tokens", 0)
+                        yield chunk
+        except UpstreamError as e:
+            timer.error(f"http_{e.status_code}")
+            raise
+        except Exception as e:
+            timer.error(type(e).__name__)
+            raise
+        timer.record_tokens(generated, streamed=True)
+
+upstream = UpstreamClient.from_env()
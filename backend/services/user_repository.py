@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.schema import CreateIndex
+
+from src.models.user import User, db, email_lookup_index
+
+# Cached marker for "no account with this email"
+_MISSING = object()
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+class UserRepository:
+    """Email lookups backed by a functional index and a read-through cache.
+
+    The cache maps a normalized email to the user's id (or to "missing" for a
+    shorter negative TTL, so repeated signup checks skip the query). Rows are
+    then loaded by primary key. Every insert, update or delete of a User
+    invalidates the emails it touched, on flush and again after commit.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._index_ready = False
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("USER_CACHE_SIZE", 10000)),
+            ttl=float(os.getenv("USER_CACHE_TTL", 300)),
+            negative_ttl=float(os.getenv("USER_CACHE_NEGATIVE_TTL", 30)),
+        )
+
+    def _ensure_index(self):
+        # Databases created before the index existed get it on first use
+        if not self._index_ready:
+            # Expression indexes can't be reflected on SQLite, so checkfirst
+            # would not see it; IF NOT EXISTS works on SQLite and Postgres
+            with db.engine.begin() as conn:
+                conn.execute(CreateIndex(email_lookup_index, if_not_exists=True))
+            self._index_ready = True
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _remember(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        key = normalize_email(email)
+        if not key:
+            return None
+
+        cached = self._cached(key)
+        if cached is _MISSING:
+            self.stats["negative_hits"] += 1
+            return None
+        if cached is not None:
+            user = db.session.get(User, cached)
+            if user is not None and normalize_email(user.email) == key:
+                self.stats["hits"] += 1
+                return user
+            self.invalidate(key)
+
+        self.stats["misses"] += 1
+        self._ensure_index()
+        user = User.query.filter(db.func.lower(User.email) == key).first()
+        if user is None:
+            self._remember(key, _MISSING, self.negative_ttl)
+        else:
+            self._remember(key, user.id, self.ttl)
+        return user
+
+    def invalidate(self, *emails):
+        with self._lock:
+            for email in emails:
+                if self._entries.pop(normalize_email(email), None) is not None:
+                    self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_repository = UserRepository.from_env()
+
+
+def _touched_emails(user: User):
+    history = inspect(user).attrs.email.history
+    return {email for email in (user.email, *history.deleted) if email}
+
+
+def invalidate_user(user: User):
+    """Called from the User mapper events for every insert, update and delete."""
+    emails = _touched_emails(user)
+    user_repository.invalidate(*emails)
+    session = object_session(user)
+    if session is not None:
+        session.info.setdefault("user_cache_invalidations", set()).update(emails)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    # Another request may have re-cached the old row between flush and
+    # commit, so invalidate once more now that the change is visible
+    emails = session.info.pop("user_cache_invalidations", None)
+    if emails:
+        user_repository.invalidate(*emails)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("user_cache_invalidations", None)
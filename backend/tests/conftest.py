@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+
+# The services read their settings when imported, so the environment is set
+# up before any test module imports them
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DATA_DIR = tempfile.mkdtemp(prefix="eezlegal-tests-")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DATA_DIR}/app.db",
+    "CONVERSATION_DB": f"{DATA_DIR}/conversations.db",
+    "USAGE_WAL_DIR": f"{DATA_DIR}/usage-wal",
+    "KNOWLEDGE_DIR": f"{DATA_DIR}/knowledge",
+    "KNOWLEDGE_INDEX_DIR": f"{DATA_DIR}/knowledge-index",
+    "JWT_SECRET_KEY": "test-signing-key",
+    "OTP_SECRET": "test-otp-secret",
+    "ARGON2_TIME_COST": "1",
+    "ARGON2_MEMORY_COST": "8192",
+    "PASSWORD_HASH_WORKERS": "1",
+    "OPENAI_API_KEY": "sk-test",
+    "STRIPE_SECRET_KEY": "",
+    "STRIPE_WEBHOOK_SECRET": "whsec_test",
+    "APP_FEATURES": "auth,chat,billing,users,documents",
+})
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+
+class FakeOpenAI:
+    """Stand-in for the chat completions endpoint that counts its calls."""
+
+    def __init__(self):
+        self.calls = []
+        self.app = FastAPI()
+
+        @self.app.post("/chat/completions")
+        async def completions(request: Request):
+            body = await request.json()
+            self.calls.append(body)
+            question = body["messages"][-1]["content"]
+            return {
+                "choices": [{"message": {"role": "assistant", "content": f"Answer {len(self.calls)}: {question}"}}],
+                "usage": {"prompt_tokens": 50, "completion_tokens": 10, "total_tokens": 60},
+            }
+
+
+@pytest.fixture
+def fake_openai():
+    from services.upstream import upstream
+    fake = FakeOpenAI()
+    # Installed before the app starts; start() keeps an existing client
+    upstream._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake.app), base_url="http://fake-openai")
+    yield fake
+    upstream._client = None
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from app import create_app
+    with TestClient(create_app()) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def flask_app(tmp_path):
+    """The Flask user routes on a fresh SQLite database. The blueprints import
+    the backend as ``src``, as it is deployed."""
+    import types
+    from flask import Flask
+    if "src" not in sys.modules:
+        src = types.ModuleType("src")
+        src.__path__ = [BACKEND_DIR]
+        sys.modules["src"] = src
+    from src.models.user import db
+    from src.routes.user import user_bp
+    from src.services.user_repository import user_repository
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path}/flask.db"
+    db.init_app(app)
+    app.register_blueprint(user_bp, url_prefix="/api")
+    with app.app_context():
+        db.create_all()
+        user_repository.clear()
+        user_repository._index_ready = False
+        yield app
+        db.session.remove()
@@ -0,0 +1,90 @@
+import uuid
+
+import pytest
+
+from services.tokens import KeyRing, TokenError, TokenService, tokens
+
+
+def new_email():
+    return f"{uuid.uuid4().hex[:12]}@example.com"
+
+
+def signup(client, email, name=None, password="correct horse"):
+    return client.post("/api/auth/signup", json={"name": name or email, "email": email, "password": password})
+
+
+def test_signup_then_login_issues_tokens_for_the_account(client):
+    email = new_email()
+    created = signup(client, email.upper())
+    assert created.status_code == 200
+    user = created.json()["user"]
+    assert user["email"] == email and user["id"].isdigit()
+
+    response = client.post("/api/auth/login", json={"email": email, "password": "correct horse"})
+    assert response.status_code == 200
+    assert tokens.verify(response.json()["token"])["sub"] == user["id"]
+    verified = client.get("/api/auth/verify", headers={"Authorization": f"Bearer {response.json()['token']}"})
+    assert verified.json()["user"]["id"] == user["id"]
+
+
+def test_wrong_password_and_unknown_email_get_no_token(client):
+    email = new_email()
+    signup(client, email)
+    for credentials in ({"email": email, "password": "wrong password"}, {"email": new_email(), "password": "correct horse"}):
+        response = client.post("/api/auth/login", json=credentials)
+        assert response.status_code == 401
+        assert "token" not in response.json()
+
+
+def test_repeated_failures_are_rate_limited(client):
+    email = new_email()
+    signup(client, email)
+    for _ in range(5):
+        assert client.post("/api/auth/login", json={"email": email, "password": "nope nope"}).status_code == 401
+    response = client.post("/api/auth/login", json={"email": email, "password": "correct horse"})
+    assert response.status_code == 429
+
+
+def test_duplicate_emails_conflict_but_names_may_repeat(client):
+    email = new_email()
+    name = f"name-{uuid.uuid4().hex[:8]}"
+    assert signup(client, email, name).status_code == 200
+    response = signup(client, email, name=f"other-{name}")
+    assert response.status_code == 409 and "email" in response.json()["detail"]
+    # Display names are not unique
+    response = signup(client, new_email(), name=name)
+    assert response.status_code == 200 and response.json()["user"]["name"] == name
+
+
+def test_short_passwords_are_rejected(client):
+    assert signup(client, new_email(), password="short").status_code == 400
+
+
+def test_social_login_routes_are_gone(client):
+    # Nothing exchanged the provider's code, so these could never sign anyone in
+    for path in ("/auth/google", "/auth/microsoft", "/auth/apple", "/auth/callback?code=anything"):
+        assert client.get(path, follow_redirects=False).status_code == 404
+
+
+def test_key_ring_refuses_to_start_without_a_shared_key(monkeypatch):
+    monkeypatch.delenv("JWT_SIGNING_KEYS", raising=False)
+    monkeypatch.delenv("JWT_SECRET_KEY", raising=False)
+    with pytest.raises(ValueError):
+        KeyRing.from_env()
+    monkeypatch.setenv("JWT_SIGNING_KEYS", "2024-06:new,2024-01:old")
+    monkeypatch.setenv("JWT_ACTIVE_KID", "2024-06")
+    assert KeyRing.from_env().active_key == "new"
+
+
+def test_logout_revocation_reaches_other_workers(client):
+    token = tokens.issue(uuid.uuid4().hex)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/api/auth/logout", headers=headers).json()["success"]
+    assert client.get("/api/auth/verify", headers=headers).status_code == 401
+
+    # Another worker, or this one after a restart, loads it from the database
+    worker = TokenService(tokens.keyring)
+    assert worker.verify(token)
+    client.portal.call(worker.load_revocations)
+    with pytest.raises(TokenError):
+        worker.verify(token)
@@ -0,0 +1,24 @@
+import uuid
+
+from api import chat
+
+
+def test_unexpected_errors_are_logged_not_returned(client, monkeypatch, caplog):
+    async def broken_prompt(chat_request, history):
+        raise RuntimeError("secret internal detail")
+
+    async def broken_stream(*args):
+        raise RuntimeError("secret internal detail")
+        yield
+
+    monkeypatch.setattr(chat, "build_chat_prompt", broken_prompt)
+    response = client.post("/api/chat", json={"message": f"Question {uuid.uuid4().hex}"})
+    assert response.json()["error"] == "An error occurred while processing your request"
+
+    monkeypatch.undo()
+    monkeypatch.setattr(chat.upstream, "stream_chat_completion", broken_stream)
+    response = client.post("/api/chat/stream", json={"message": f"Question {uuid.uuid4().hex}"})
+    assert "event: error" in response.text and "An error occurred while processing your request" in response.text
+
+    assert "secret internal detail" not in response.text
+    assert caplog.text.count("RuntimeError: secret internal detail") == 2
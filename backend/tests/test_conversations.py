@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+from services.conversation_search import ConversationSearch
+from services.conversations import (
+    ConversationNotFound, ConversationStore, MemoryConversationStore, SQLiteConversationStore,
+)
+from services.database import database
+from services.tokens import tokens
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryConversationStore()
+    return SQLiteConversationStore(db_path=str(tmp_path / "conversations.db"))
+
+
+def bearer(user_id):
+    return {"Authorization": f"Bearer {tokens.issue(user_id)}"}
+
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ConversationStore()
+
+
+def test_owned_conversations_are_hidden_from_other_users(store):
+    conversation_id = store.create("alice")
+    store.append(conversation_id, "user", "hello", "alice")
+
+    assert store.messages(conversation_id, "alice") == [{"role": "user", "content": "hello"}]
+    for intruder in ("mallory", None):
+        with pytest.raises(ConversationNotFound):
+            store.messages(conversation_id, intruder)
+        with pytest.raises(ConversationNotFound):
+            store.append(conversation_id, "user", "injected", intruder)
+    assert store.messages(conversation_id, "alice") == [{"role": "user", "content": "hello"}]
+
+
+def test_anonymous_conversations_are_open_to_their_id(store):
+    conversation_id = store.create()
+    store.append(conversation_id, "user", "hi")
+    assert store.messages(conversation_id, "anyone") == [{"role": "user", "content": "hi"}]
+
+
+def test_sqlite_transcript_catches_up_on_other_writers(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    reader, writer = SQLiteConversationStore(db_path=path), SQLiteConversationStore(db_path=path)
+    conversation_id = reader.create("alice")
+    writer.append(conversation_id, "user", "one", "alice")
+    assert len(reader.messages(conversation_id, "alice")) == 1
+    writer.append(conversation_id, "assistant", "two", "alice")
+    assert [m["content"] for m in reader.messages(conversation_id, "alice")] == ["one", "two"]
+
+
+def test_conversation_api_checks_the_owner(client):
+    created = client.post("/api/conversations", json={"user_id": "bob"}, headers=bearer("alice")).json()
+    conversation_id = created["conversation_id"]
+
+    assert client.get(f"/api/conversations/{conversation_id}", headers=bearer("alice")).status_code == 200
+    assert client.get(f"/api/conversations/{conversation_id}", headers=bearer("bob")).status_code == 404
+    assert client.get(f"/api/conversations/{conversation_id}").status_code == 404
+    denied = client.post("/api/chat", json={"message": "hi", "conversation_id": conversation_id}, headers=bearer("bob"))
+    assert denied.status_code == 404
+
+
+def test_chat_turns_become_searchable(client, fake_openai):
+    conversation_id = client.post("/api/conversations", headers=bearer("alice")).json()["conversation_id"]
+    answered = client.post(
+        "/api/chat", json={"message": "Can my landlord keep the deposit?", "conversation_id": conversation_id},
+        headers=bearer("alice"),
+    )
+    assert answered.json()["success"]
+
+    for _ in range(50):
+        found = client.get("/api/conversations/search", params={"q": "deposit"}, headers=bearer("alice")).json()
+        if len(found["results"]) == 2:
+            break
+        time.sleep(0.05)
+    assert {hit["role"] for hit in found["results"]} == {"user", "assistant"}
+    assert all(hit["conversation_id"] == conversation_id for hit in found["results"])
+    assert client.get("/api/conversations/search", params={"q": "deposit"}, headers=bearer("bob")).json()["results"] == []
+
+
+def test_memory_store_is_not_indexed():
+    search = ConversationSearch(MemoryConversationStore())
+    asyncio.run(search.start())
+    assert search._task is None
+    assert asyncio.run(search.search("alice", "deposit")) == {"results": [], "next_offset": None}
+
+
+def test_local_store_under_a_postgres_database_is_refused(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "url", "postgresql+asyncpg://db.internal/eezlegal")
+    store = SQLiteConversationStore(db_path=str(tmp_path / "conversations.db"))
+    with pytest.raises(RuntimeError):
+        asyncio.run(ConversationSearch(store).start())
+
+    # Turning search off starts without it
+    search = ConversationSearch(store, enabled=False)
+    asyncio.run(search.start())
+    assert search._task is None
+    assert asyncio.run(search.search("alice", "deposit")) == {"results": [], "next_offset": None}
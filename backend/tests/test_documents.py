@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import uuid
+
+from services import documents
+from services.documents import DocumentAnalyzer, SpooledUpload, document_analyzer
+from services.metering import usage_meter
+from services.tokens import tokens
+
+
+def test_cancel_mid_page_closes_the_reader_after_it_returns(monkeypatch, tmp_path):
+    reading = threading.Event()
+    release = threading.Event()
+    closed = []
+
+    def slow_pages(upload):
+        try:
+            yield "First page. " * 50
+            reading.set()
+            release.wait(5)
+            yield "Second page."
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(documents, "extract_pages", slow_pages)
+    analyzer = DocumentAnalyzer(str(tmp_path), parallelism=1)
+    upload = SpooledUpload(str(tmp_path / "doc.txt"), "doc.txt", "text", 0)
+
+    async def consume():
+        async for _ in analyzer.analyze(upload, "sk-test", "gpt-4"):
+            pass
+
+    async def scenario():
+        task = asyncio.ensure_future(consume())
+        await asyncio.get_running_loop().run_in_executor(None, reading.wait, 5)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        # Still reading the second page: the generator must not be closed yet
+        assert not closed
+        release.set()
+        await asyncio.gather(task, return_exceptions=True)
+        for _ in range(100):
+            if closed:
+                break
+            await asyncio.sleep(0.01)
+        assert closed == [True]
+
+    asyncio.run(scenario())
+
+
+def test_each_chunk_is_checked_against_the_quota_and_metered(client, fake_openai, monkeypatch):
+    monkeypatch.setitem(usage_meter.limits, "free", (100, 0))
+    monkeypatch.setattr(document_analyzer, "chunk_tokens", 40)
+    monkeypatch.setattr(document_analyzer, "parallelism", 1)
+    user_id = uuid.uuid4().hex
+
+    text = "\n\n".join(f"Clause {i}. The tenant shall keep the premises in good repair at all times." * 2 for i in range(6))
+    response = client.post(
+        "/api/documents",
+        files={"file": ("lease.txt", text.encode(), "text/plain")},
+        headers={"Authorization": f"Bearer {tokens.issue(user_id)}"},
+    )
+    events = [line for line in response.text.splitlines() if line.startswith("event:")]
+    assert events[-1] == "event: error" and '"status": 429' in response.text
+    # 60 tokens per call: the third chunk is refused before it reaches OpenAI
+    assert len(fake_openai.calls) == 2
+    assert client.portal.call(usage_meter.remaining, user_id, "free")["day"] == 0
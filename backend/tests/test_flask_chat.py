@@ -0,0 +1,33 @@
+import threading
+
+from flask import Flask
+
+
+def test_concurrent_first_requests_share_one_client(flask_app, monkeypatch):
+    from src.routes import chat
+
+    monkeypatch.setattr(chat, "_client", None)
+    start = threading.Barrier(16)
+    clients = []
+
+    def first_request():
+        start.wait()
+        clients.append(chat.get_client())
+    threads = [threading.Thread(target=first_request) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(client) for client in clients}) == 1
+
+
+def test_blueprints_leave_health_to_the_app(flask_app):
+    from src.routes.chat import chat_bp
+    from src.routes.simple_chat import simple_chat_bp
+
+    app = Flask(__name__)
+    app.register_blueprint(chat_bp, url_prefix="/api")
+    app.register_blueprint(simple_chat_bp, url_prefix="/api/simple")
+    client = app.test_client()
+    assert client.get("/api/health").status_code == 404
+    assert client.get("/api/simple/health").status_code == 404
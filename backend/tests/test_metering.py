@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import runpy
+import uuid
+
+from sqlalchemy import select
+
+from services.database import database, usage, usage_flushes
+from services.metering import UsageMeter, current_periods, usage_meter
+
+
+def stored_tokens(user_id):
+    async def read():
+        async with database.session() as session:
+            rows = (await session.execute(
+                select(usage.c.prompt_tokens + usage.c.completion_tokens).where(usage.c.user_id == user_id)
+            )).scalars().all()
+        return sorted(rows)
+    return asyncio.run(read())
+
+
+def write_segment(wal_dir, segment, user_id, tokens=10):
+    os.makedirs(wal_dir, exist_ok=True)
+    with open(os.path.join(wal_dir, segment + ".wal"), "w") as f:
+        for period in current_periods():
+            f.write(json.dumps([user_id, period, tokens, 0]) + "\n")
+
+
+def test_sealed_segment_stays_locked_until_its_flush_commits(client, tmp_path):
+    user_id = uuid.uuid4().hex
+
+    async def scenario():
+        writer, other = UsageMeter(wal_dir=str(tmp_path)), UsageMeter(wal_dir=str(tmp_path))
+        await writer.start()
+        writer.record(user_id, {"prompt_tokens": 5, "completion_tokens": 5})
+        with writer._wal_lock:
+            writer._seal_segment()
+        # A worker starting now must leave the sealed, unflushed segment alone
+        other._replay(set())
+        assert other._replayed == [] and other.stats["replayed"] == 0
+        await writer.close()
+        assert os.listdir(tmp_path) == []
+    asyncio.run(scenario())
+    assert stored_tokens(user_id) == [10, 10]
+
+
+def test_leftover_segments_are_replayed_once(client, tmp_path):
+    user_id = uuid.uuid4().hex
+    write_segment(str(tmp_path), "1-crashed", user_id)
+
+    async def scenario():
+        meter = UsageMeter(wal_dir=str(tmp_path))
+        await meter.start()
+        await meter.close()
+    asyncio.run(scenario())
+    asyncio.run(scenario())
+    assert stored_tokens(user_id) == [10, 10]
+
+
+def test_segment_already_flushed_elsewhere_is_not_counted_again(client, tmp_path):
+    user_id = uuid.uuid4().hex
+    segment = f"2-{uuid.uuid4().hex[:8]}"
+    write_segment(str(tmp_path), segment, user_id)
+
+    async def scenario():
+        meter = UsageMeter(wal_dir=str(tmp_path))
+        # Read the flushed ids before another worker commits this segment
+        meter._replay(set())
+        async with database.session() as session:
+            await session.execute(usage_flushes.insert().values(segment=segment, flushed_at=0))
+            await session.commit()
+        await meter._apply_replayed()
+    asyncio.run(scenario())
+    assert stored_tokens(user_id) == []
+    assert os.listdir(tmp_path) == []
+
+
+def test_anonymous_chat_and_batches_are_metered_by_address(client, fake_openai, monkeypatch):
+    monkeypatch.setitem(usage_meter.limits, "anonymous", (100, 0))
+    usage_meter._totals.clear()
+    asyncio.run(usage_meter.flush())
+
+    first = client.post("/api/chat", json={"message": f"First {uuid.uuid4().hex}"}, headers={"Cache-Control": "no-cache"})
+    assert first.json()["success"]
+    batch = client.post("/api/chat/batch", json={"messages": [{"message": f"Batch {uuid.uuid4().hex}"}]})
+    assert json.loads(batch.text.splitlines()[0])["success"]
+    # 60 tokens per answer: the second pushed the address past 100
+    assert client.post("/api/chat", json={"message": "Third"}).status_code == 429
+    assert client.post("/api/chat/batch", json={"messages": [{"message": "Fourth"}]}).status_code == 429
+    assert len(fake_openai.calls) == 2
+
+
+def test_forwarded_clients_get_separate_meters(fake_openai, monkeypatch):
+    # What uvicorn workers do with the gunicorn profile's forwarded_allow_ips
+    from fastapi.testclient import TestClient
+    from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+    from app import create_app
+    profile = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py"))
+    app = ProxyHeadersMiddleware(create_app(), trusted_hosts=profile["forwarded_allow_ips"])
+
+    monkeypatch.setitem(usage_meter.limits, "anonymous", (100, 0))
+    first, second = f"198.51.100.{uuid.uuid4().int % 250}", f"203.0.113.{uuid.uuid4().int % 250}"
+    with TestClient(app) as client:
+        for address in (first, first, second):
+            response = client.post(
+                "/api/chat", json={"message": f"Question {uuid.uuid4().hex}"}, headers={"X-Forwarded-For": address}
+            )
+            assert response.status_code == 200
+        assert client.post("/api/chat", json={"message": "Again"}, headers={"X-Forwarded-For": first}).status_code == 429
+        assert client.post("/api/chat", json={"message": "Again"}, headers={"X-Forwarded-For": second}).status_code == 200
+
+
+def test_failed_background_flush_is_logged_and_counted(tmp_path, monkeypatch, caplog):
+    async def scenario():
+        meter = UsageMeter(wal_dir=str(tmp_path), flush_interval=0.01)
+
+        async def broken():
+            raise OSError("database went away")
+        monkeypatch.setattr(meter, "flush", broken)
+        task = asyncio.ensure_future(meter._flush_loop())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return meter.stats["errors"]
+    assert asyncio.run(scenario()) >= 1
+    assert "Flushing usage failed" in caplog.text
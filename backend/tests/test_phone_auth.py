@@ -0,0 +1,144 @@
+import re
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete
+
+from services.database import database, phone_verification_sends, phone_verifications
+from services.jobs import job_queue
+from services.otp import otp_store
+from services.sms import sms
+
+UNDELIVERABLE = "+15005550001"
+
+
+class FakeTwilio:
+    """Stand-in for Twilio's Messages endpoint that keeps what it was sent."""
+
+    def __init__(self):
+        self.messages = []
+        self.app = FastAPI()
+
+        @self.app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+        async def create_message(account_sid: str, request: Request):
+            form = dict(await request.form())
+            if form["To"] == UNDELIVERABLE:
+                return JSONResponse({"message": f"The 'To' number {form['To']} is not a valid phone number."}, 400)
+            self.messages.append(form)
+            return {"sid": f"SM{len(self.messages):032d}"}
+
+    def code_for(self, phone: str) -> str:
+        for _ in range(100):
+            for message in reversed(self.messages):
+                if message["To"] == phone:
+                    return re.search(r"\b(\d{6})\b", message["Body"]).group(1)
+            time.sleep(0.02)
+        raise AssertionError(f"no SMS sent to {phone}")
+
+
+@pytest.fixture
+def twilio(monkeypatch):
+    fake = FakeTwilio()
+    monkeypatch.setattr(sms, "account_sid", "ACtest")
+    monkeypatch.setattr(sms, "auth_token", "secret")
+    monkeypatch.setattr(sms, "from_number", "+15550000000")
+    # Installed before the app starts; start() keeps an existing client
+    sms._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake.app), base_url="http://fake-twilio")
+    yield fake
+    sms._client = None
+
+
+@pytest.fixture
+def phone_client(twilio, client, monkeypatch):
+    monkeypatch.setattr(otp_store, "resend_interval", 0)
+
+    async def reset():
+        async with database.session() as session:
+            await session.execute(delete(phone_verifications))
+            await session.execute(delete(phone_verification_sends))
+            await session.commit()
+    client.portal.call(reset)
+    return client
+
+
+def send(client, phone):
+    return client.post("/api/auth/phone/send", json={"phoneNumber": phone})
+
+
+def verify(client, phone, code):
+    return client.post("/api/auth/phone/verify", json={"phoneNumber": phone, "verificationCode": code})
+
+
+def test_verified_number_signs_in_to_its_own_account(phone_client, twilio):
+    phone = "+14155550101"
+    assert send(phone_client, phone).json()["success"]
+    first = verify(phone_client, phone, twilio.code_for(phone)).json()
+    assert first["user"]["phone"] == phone and first["user"]["id"].isdigit()
+
+    twilio.messages.clear()
+    send(phone_client, phone)
+    again = verify(phone_client, phone, twilio.code_for(phone)).json()
+    assert again["user"]["id"] == first["user"]["id"]
+
+    send(phone_client, "+14155550102")
+    other = verify(phone_client, "+14155550102", twilio.code_for("+14155550102")).json()
+    assert other["user"]["id"] != first["user"]["id"]
+
+    profile = phone_client.get(
+        f"/api/user/{first['user']['id']}", headers={"Authorization": f"Bearer {first['token']}"}
+    )
+    assert profile.status_code == 200
+
+
+def test_resend_keeps_the_used_guesses(phone_client, twilio):
+    phone = "+14155550103"
+    send(phone_client, phone)
+    twilio.code_for(phone)
+    for _ in range(otp_store.max_attempts):
+        assert verify(phone_client, phone, "000000").status_code == 400
+
+    twilio.messages.clear()
+    assert send(phone_client, phone).json()["success"]
+    assert verify(phone_client, phone, twilio.code_for(phone)).status_code == 400
+
+
+def test_sends_are_capped_per_number_and_per_address(phone_client, monkeypatch):
+    monkeypatch.setattr(otp_store, "max_sends_per_number", 2)
+    monkeypatch.setattr(otp_store, "max_sends_per_ip", 3)
+    assert send(phone_client, "+14155550104").status_code == 200
+    assert send(phone_client, "+14155550104").status_code == 200
+    capped = send(phone_client, "+14155550104")
+    assert capped.status_code == 429 and int(capped.headers["Retry-After"]) > 0
+
+    assert send(phone_client, "+14155550105").status_code == 200
+    # Fourth send from this client, to a fresh number
+    assert send(phone_client, "+14155550106").status_code == 429
+
+
+def test_dead_letters_keep_no_code_or_number_and_expire(phone_client, monkeypatch):
+    assert send(phone_client, UNDELIVERABLE).json()["success"]
+    for _ in range(100):
+        letters = [l for l in phone_client.portal.call(job_queue.dead_letters) if l["kind"] == "sms"]
+        if letters:
+            break
+        time.sleep(0.02)
+    letter = letters[0]
+    assert UNDELIVERABLE not in (letter["payload"] + letter["last_error"])
+    assert "code" not in letter["payload"]
+    assert '"+15*******01"' in letter["payload"]
+
+    monkeypatch.setattr(job_queue, "dead_letter_retention", 0)
+    monkeypatch.setattr(job_queue, "_purged_at", 0.0)
+    phone_client.portal.call(job_queue._purge)
+    assert not phone_client.portal.call(job_queue.dead_letters)
+
+
+def test_otp_secret_is_required(monkeypatch):
+    from services.otp import OTPStore
+    monkeypatch.delenv("OTP_SECRET")
+    monkeypatch.delenv("JWT_SECRET_KEY")
+    with pytest.raises(ValueError):
+        OTPStore.from_env()
@@ -0,0 +1,136 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.resilience import AIMDLimiter, CircuitBreaker, CircuitOpen, Overloaded, Resilience
+
+
+def half_open_resilience(**limiter) -> Resilience:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    return Resilience(
+        limiter=AIMDLimiter(**{"initial": 4, "minimum": 1, **limiter}),
+        breaker=breaker,
+        max_retries=0,
+        base_delay=0.0,
+    )
+
+
+def ok():
+    async def send():
+        return httpx.Response(200)
+    return send
+
+
+def test_shed_probe_is_released():
+    async def scenario():
+        resilience = half_open_resilience(initial=1, queue_timeout=0.01)
+        resilience.limiter.in_flight = 1  # every slot taken
+        with pytest.raises(Overloaded):
+            await resilience.call(ok())
+        resilience.limiter.in_flight = 0
+        assert (await resilience.call(ok())).status_code == 200
+        assert resilience.breaker.state == CircuitBreaker.CLOSED
+    asyncio.run(scenario())
+
+
+def test_probe_failing_with_an_unexpected_error_is_released():
+    async def scenario():
+        resilience = half_open_resilience()
+
+        async def broken():
+            raise ValueError("bad request body")
+        with pytest.raises(ValueError):
+            await resilience.call(broken)
+        assert (await resilience.call(ok())).status_code == 200
+    asyncio.run(scenario())
+
+
+def test_cancelled_probe_is_released():
+    async def scenario():
+        resilience = half_open_resilience()
+
+        async def slow():
+            await asyncio.sleep(10)
+        task = asyncio.ensure_future(resilience.call(slow))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert resilience.limiter.in_flight == 0
+        assert (await resilience.call(ok())).status_code == 200
+    asyncio.run(scenario())
+
+
+def test_only_one_probe_at_a_time():
+    async def scenario():
+        resilience = half_open_resilience()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(0.05)
+            return httpx.Response(200)
+        probe = asyncio.ensure_future(resilience.call(slow))
+        await started.wait()
+        with pytest.raises(CircuitOpen):
+            await resilience.call(ok())
+        assert (await probe).status_code == 200
+        assert (await resilience.call(ok())).status_code == 200
+    asyncio.run(scenario())
+
+
+def test_shed_stream_probe_is_released():
+    async def scenario():
+        resilience = half_open_resilience(initial=1, queue_timeout=0.01)
+        resilience.limiter.in_flight = 1
+        with pytest.raises(Overloaded):
+            async with resilience.stream_slot():
+                pass
+        resilience.limiter.in_flight = 0
+        async with resilience.stream_slot() as outcome:
+            outcome["status_code"] = 200
+        assert resilience.breaker.state == CircuitBreaker.CLOSED
+    asyncio.run(scenario())
+
+
+def test_retryable_failures_open_the_breaker():
+    async def scenario():
+        resilience = Resilience(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60), max_retries=1, base_delay=0.0)
+
+        async def unavailable():
+            return httpx.Response(503)
+        assert (await resilience.call(unavailable)).status_code == 503
+        assert resilience.breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpen):
+            await resilience.call(ok())
+    asyncio.run(scenario())
+
+
+def test_each_attempt_is_timed_without_the_backoff():
+    from services.metrics import UpstreamTimer, upstream_latency
+
+    async def scenario():
+        resilience = Resilience(max_retries=1, base_delay=0.2)
+        responses = iter([httpx.Response(503), httpx.Response(200)])
+
+        async def flaky():
+            return next(responses)
+        timer = UpstreamTimer("test_retry")
+        assert (await resilience.call(flaky, timer=timer)).status_code == 200
+    asyncio.run(scenario())
+    series = upstream_latency._values[("test_retry", "total")]
+    assert sum(series[:-1]) == 2
+    # Two near-instant attempts; the 0.2 s (or more) backoff is not in them
+    assert series[-1] < 0.1
+
+
+def test_plain_completions_report_tokens_per_second(fake_openai):
+    from services.metrics import tokens_per_second
+    from services.upstream import upstream
+
+    before = sum(tokens_per_second._values.get(("chat",), [0])[:-1])
+    response = asyncio.run(upstream.chat_completion("sk-test", b'{"messages": [{"role": "user", "content": "hi"}]}', 100))
+    assert response.status_code == 200
+    assert sum(tokens_per_second._values[("chat",)][:-1]) == before + 1
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.response_cache import ResponseCache, make_key, response_cache
+
+
+def messages(question):
+    return [{"role": "system", "content": "Be brief."}, {"role": "user", "content": question}]
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", {"message": "A"})
+    cache.set("b", {"message": "B"})
+    assert cache.get("a") == {"message": "A"}
+    cache.set("c", {"message": "C"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"message": "A"}
+    assert cache.get("c") == {"message": "C"}
+    stats = cache.snapshot()
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+    assert stats["hits"] == 3 and stats["misses"] == 1
+    assert stats["hit_rate"] == pytest.approx(0.75)
+
+
+def test_expired_entries_are_misses():
+    cache = ResponseCache(ttl=-1)
+    cache.set("a", {"message": "A"})
+    assert cache.get("a") is None
+    assert cache.snapshot()["expired"] == 1
+
+
+def test_disk_tier_survives_a_new_process(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    ResponseCache(db_path=db_path).set("a", {"message": "A"})
+
+    fresh = ResponseCache(db_path=db_path)
+    assert fresh.get("a") == {"message": "A"}
+    assert fresh.get("a") == {"message": "A"}
+    assert fresh.snapshot()["disk_hits"] == 1
+    assert fresh.snapshot()["hits"] == 1
+
+
+def test_disk_tier_is_pruned_to_its_limit(tmp_path):
+    cache = ResponseCache(max_entries=10, db_path=str(tmp_path / "cache.db"), max_disk_entries=50)
+    # Pruned every 100 writes
+    for i in range(200):
+        cache.set(f"k{i}", {"message": str(i)})
+    count = cache._db.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+    assert count == 50
+
+
+def test_async_access_keeps_sqlite_off_the_event_loop(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "cache.db")
+    cache = ResponseCache(max_entries=1, db_path=db_path)
+    threads = []
+    for name in ("_disk_get", "_disk_set"):
+        def recorded(*args, _real=getattr(cache, name)):
+            threads.append(threading.get_ident())
+            return _real(*args)
+        monkeypatch.setattr(cache, name, recorded)
+
+    async def scenario():
+        await cache.aset("a", {"message": "A"})
+        await cache.aset("b", {"message": "B"})
+        # "a" left the one-entry LRU, so it comes back from disk
+        assert await cache.aget("a") == {"message": "A"}
+        assert await cache.aget("a") == {"message": "A"}
+        assert await cache.aget("missing") is None
+        return threading.get_ident()
+    loop_thread = asyncio.run(scenario())
+    assert len(threads) == 4 and loop_thread not in threads
+    assert cache.snapshot()["disk_hits"] == 1 and cache.snapshot()["hits"] == 1
+    assert ResponseCache(db_path=db_path).get("b") == {"message": "B"}
+
+
+def test_key_ignores_whitespace_and_case_only():
+    assert make_key("m", 0.7, messages("What is  a tort?")) == make_key("m", 0.7, messages(" what is a TORT? "))
+    assert make_key("m", 0.7, messages("What is a tort?")) != make_key("m", 0.2, messages("What is a tort?"))
+    assert make_key("m", 0.7, messages("What is a tort?")) != make_key("m", 0.7, messages("What is a lien?"))
+
+
+def test_repeated_questions_skip_the_upstream(fake_openai, client):
+    response_cache.clear()
+
+    first = client.post("/api/chat", json={"message": "What is a tort?"})
+    assert first.json()["success"] and first.headers["X-Cache"] == "MISS"
+    again = client.post("/api/chat", json={"message": "  what is a TORT? "})
+    assert again.headers["X-Cache"] == "HIT"
+    assert again.json()["message"] == first.json()["message"]
+    assert len(fake_openai.calls) == 1
+
+    bypass = client.post("/api/chat", json={"message": "What is a tort?"}, headers={"X-Cache-Bypass": "1"})
+    assert bypass.headers["X-Cache"] == "BYPASS"
+    assert len(fake_openai.calls) == 2
+
+    other = client.post("/api/chat", json={"message": "What is a lien?"})
+    assert other.headers["X-Cache"] == "MISS"
+    assert len(fake_openai.calls) == 3
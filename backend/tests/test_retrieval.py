@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+from services import retrieval
+from services.retrieval import KnowledgeIndex
+
+DEPOSIT = "# Security deposits\n\nA landlord must return the security deposit within 30 days of move-out."
+NOTICE = "# Notice periods\n\nA month-to-month tenancy ends with 30 days written notice."
+
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def manifest(index_dir):
+    with open(os.path.join(index_dir, "manifest.json")) as f:
+        return json.load(f)
+
+
+def test_workers_sharing_an_index_start_from_the_manifest_on_disk(tmp_path):
+    corpus, index_dir = tmp_path / "corpus", str(tmp_path / "index")
+    corpus.mkdir()
+    write(corpus / "deposits.md", DEPOSIT)
+    first, second = KnowledgeIndex(index_dir).open(), KnowledgeIndex(index_dir).open()
+    assert first.sync(str(corpus))["added"] == 1
+
+    write(corpus / "notice.md", NOTICE)
+    # The second worker never saw the first sync; it must not reuse its segment name
+    assert second.sync(str(corpus)) == {"added": 1, "removed": 0, "files": 2, "passages": 2}
+    assert manifest(index_dir)["segments"] == ["seg-000001", "seg-000002"]
+    assert second.search("security deposit", 1)[0]["title"] == "Security deposits"
+
+    # Reopening keeps both segments and the lock file
+    reopened = KnowledgeIndex(index_dir).open()
+    assert reopened.live == 2
+    assert sorted(os.listdir(index_dir)) == [".lock", "manifest.json", "seg-000001", "seg-000002"]
+
+
+def test_failed_sync_leaves_the_manifest_and_segments_unchanged(tmp_path, monkeypatch):
+    corpus, index_dir = tmp_path / "corpus", str(tmp_path / "index")
+    corpus.mkdir()
+    write(corpus / "deposits.md", DEPOSIT)
+    index = KnowledgeIndex(index_dir, segment_size=1).open()
+    index.sync(str(corpus))
+    before = manifest(index_dir)
+
+    write(corpus / "notice.md", NOTICE + "\n\n" + NOTICE)
+
+    def broken(path, source, max_words):
+        yield from real(path, source, max_words)
+        raise OSError("disk went away")
+
+    real = retrieval.read_source
+    monkeypatch.setattr(retrieval, "read_source", broken)
+    with pytest.raises(OSError):
+        index.sync(str(corpus))
+
+    assert index.manifest == before == manifest(index_dir)
+    assert [segment.name for segment in index.segments] == ["seg-000001"]
+    assert sorted(os.listdir(index_dir)) == [".lock", "manifest.json", "seg-000001"]
+
+
+def test_segments_dropped_by_a_sync_stay_readable_until_searches_release_them(tmp_path):
+    corpus, index_dir = tmp_path / "corpus", str(tmp_path / "index")
+    corpus.mkdir()
+    write(corpus / "deposits.md", DEPOSIT)
+    index = KnowledgeIndex(index_dir).open()
+    index.sync(str(corpus))
+
+    # A search in another thread holds the snapshot while the source is removed
+    held = index._acquire()
+    os.remove(corpus / "deposits.md")
+    assert index.sync(str(corpus))["removed"] == 1
+    assert index.segments == ()
+    assert held[0].passage(0)["title"] == "Security deposits"
+    assert os.path.isdir(held[0].path)
+
+    index._release(held)
+    assert sorted(os.listdir(index_dir)) == [".lock", "manifest.json"]
+    with pytest.raises(OSError):
+        held[0].passage(0)
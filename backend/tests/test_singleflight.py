@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight, StreamFlight
+
+
+def test_followers_get_the_result_when_the_leader_is_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leader = asyncio.ensure_future(flight.do("key", upstream))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do("key", upstream)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await asyncio.gather(*followers) == ["answer"] * 3
+        assert leader.cancelled()
+        assert calls == [1]
+        assert flight.stats == {"calls": 1, "coalesced": 3}
+    asyncio.run(scenario())
+
+
+class Upstream:
+    """An upstream stream that records how far it was read and whether it closed."""
+
+    def __init__(self, chunks: int, delay: float = 0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.read = 0
+        self.closed = False
+
+    async def stream(self):
+        try:
+            for i in range(self.chunks):
+                await asyncio.sleep(self.delay)
+                self.read += 1
+                yield i
+        finally:
+            self.closed = True
+
+
+def test_late_joiner_replays_the_stream_from_the_start():
+    async def scenario():
+        flight = StreamFlight()
+        upstream = Upstream(10, delay=0.005)
+        first = flight.subscribe("key", upstream.stream)
+        received = [await first.__anext__() for _ in range(4)]
+
+        late = [chunk async for chunk in flight.subscribe("key", upstream.stream)]
+        received += [chunk async for chunk in first]
+        assert late == received == list(range(10))
+        assert flight.stats == {"calls": 1, "coalesced": 1}
+    asyncio.run(scenario())
+
+
+def test_upstream_is_cancelled_when_the_last_subscriber_leaves():
+    async def scenario():
+        flight = StreamFlight()
+        upstream = Upstream(1000, delay=0.005)
+        subscribers = [flight.subscribe("key", upstream.stream) for _ in range(2)]
+        for subscriber in subscribers:
+            await subscriber.__anext__()
+        await subscribers[0].aclose()
+        await asyncio.sleep(0.02)
+        assert not upstream.closed
+        await subscribers[1].aclose()
+        await asyncio.sleep(0.02)
+        assert upstream.closed and upstream.read < 1000
+        # A new request starts a fresh upstream stream
+        assert [chunk async for chunk in flight.subscribe("key", Upstream(2).stream)] == [0, 1]
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("max_ahead", [1, 4])
+def test_upstream_is_read_no_further_ahead_than_the_slowest_subscriber(max_ahead):
+    async def scenario():
+        flight = StreamFlight(max_ahead=max_ahead)
+        upstream = Upstream(100)
+        fast = flight.subscribe("key", upstream.stream)
+        slow = flight.subscribe("key", upstream.stream)
+        await slow.__anext__()
+        fast_seen = [await fast.__anext__() for _ in range(max_ahead)]
+        await asyncio.sleep(0.02)
+        # The slow subscriber has taken one chunk, so at most max_ahead more are read
+        assert upstream.read <= 1 + max_ahead
+        assert fast_seen == list(range(max_ahead))
+
+        async def drain(stream):
+            return [chunk async for chunk in stream]
+        assert await asyncio.gather(drain(slow), drain(fast)) == [list(range(1, 100)), list(range(max_ahead, 100))]
+    asyncio.run(scenario())
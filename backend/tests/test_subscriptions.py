@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI
+
+from services.subscriptions import SubscriptionService
+from services.tokens import tokens
+
+
+class FakeStripe:
+    """Stand-in for Stripe's subscription list endpoint."""
+
+    def __init__(self):
+        self.calls = 0
+        self.subscriptions = {}
+        self.app = FastAPI()
+
+        @self.app.get("/v1/subscriptions")
+        async def list_subscriptions(customer: str):
+            self.calls += 1
+            found = self.subscriptions.get(customer)
+            return {"data": [found] if found else []}
+
+        @self.app.delete("/v1/subscriptions/{subscription_id}")
+        async def cancel_subscription(subscription_id: str):
+            self.calls += 1
+            found = next(sub for sub in self.subscriptions.values() if sub["id"] == subscription_id)
+            found["status"] = "canceled"
+            return found
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://fake-stripe")
+
+
+def stripe_subscription(customer, status="active", plan="pro"):
+    return {
+        "id": "sub_" + customer,
+        "customer": customer,
+        "status": status,
+        "metadata": {"plan": plan},
+        "current_period_end": int(time.time()) + 86400,
+    }
+
+
+def signed(event: dict, secret="whsec_test"):
+    payload = json.dumps(event).encode()
+    timestamp = str(int(time.time()))
+    signature = hmac.new(secret.encode(), timestamp.encode() + b"." + payload, hashlib.sha256).hexdigest()
+    return payload, {"Stripe-Signature": f"t={timestamp},v1={signature}", "Content-Type": "application/json"}
+
+
+def test_webhook_updates_status_served_only_to_its_owner(client):
+    user_id = uuid.uuid4().hex
+    payload, headers = signed({
+        "type": "customer.subscription.updated",
+        "created": int(time.time()),
+        "data": {"object": {**stripe_subscription("cus_1"), "metadata": {"plan": "pro", "user_id": user_id}}},
+    })
+    assert client.post("/api/stripe/webhook", content=payload, headers=headers).json()["handled"]
+
+    owner = {"Authorization": f"Bearer {tokens.issue(user_id)}"}
+    response = client.get(f"/api/stripe/subscription-status/{user_id}", headers=owner)
+    assert response.json()["subscription"]["plan"] == "pro"
+    assert client.get(f"/api/stripe/subscription-status/{user_id}").status_code == 401
+    intruder = {"Authorization": f"Bearer {tokens.issue('someone-else')}"}
+    assert client.get(f"/api/stripe/subscription-status/{user_id}", headers=intruder).status_code == 403
+
+    payload, headers = signed({"type": "customer.subscription.updated", "data": {"object": {}}}, secret="wrong")
+    assert client.post("/api/stripe/webhook", content=payload, headers=headers).status_code == 400
+
+
+def test_steady_state_reads_never_call_stripe(client):
+    async def scenario():
+        stripe = FakeStripe()
+        service = SubscriptionService(ttl=60, stripe_secret_key="sk_test")
+        service._client = stripe.client()
+        stripe.subscriptions["cus_2"] = stripe_subscription("cus_2")
+        user_id = uuid.uuid4().hex
+        await service._store(user_id, {"status": "active", "plan": "pro", "expires_at": None}, "cus_2")
+
+        for _ in range(100):
+            assert (await service.get(user_id))["plan"] == "pro"
+        assert stripe.calls == 0
+
+        # Past the ttl the stale entry is served while Stripe is asked once
+        stripe.subscriptions["cus_2"] = stripe_subscription("cus_2", status="canceled")
+        service.ttl = 0
+        assert (await service.get(user_id))["status"] == "active"
+        assert (await service.get(user_id))["status"] == "active"
+        for _ in range(50):
+            if not service._refreshing:
+                break
+            await asyncio.sleep(0.01)
+        assert stripe.calls == 1
+        service.ttl = 60
+        assert (await service.get(user_id))["status"] == "canceled"
+        await service.close()
+    asyncio.run(scenario())
+
+
+def test_cache_is_bounded_lru():
+    async def scenario():
+        service = SubscriptionService(max_entries=2)
+        free = {"status": "active", "plan": "free", "expires_at": None}
+        service._remember("a", free, None)
+        service._remember("b", free, None)
+        await service.get("a")
+        service._remember("c", free, None)
+        assert list(service._entries) == ["a", "c"]
+    asyncio.run(scenario())
+
+
+def test_cancel_goes_through_stripe_and_survives_revalidation():
+    async def scenario():
+        stripe = FakeStripe()
+        service = SubscriptionService(ttl=60, stripe_secret_key="sk_test")
+        service._client = stripe.client()
+        stripe.subscriptions["cus_3"] = stripe_subscription("cus_3")
+        user_id = uuid.uuid4().hex
+        await service._store(user_id, {"status": "active", "plan": "pro", "expires_at": None}, "cus_3")
+
+        assert (await service.cancel(user_id))["status"] == "canceled"
+        assert stripe.subscriptions["cus_3"]["status"] == "canceled"
+        assert (await service.get(user_id))["status"] == "canceled"
+        # A refresh from Stripe agrees with the local state
+        assert (await service._fetch_from_stripe("cus_3"))["status"] == "canceled"
+        assert await service.cancel(user_id) is None
+        await service.close()
+    asyncio.run(scenario())
+
+
+def test_checkout_relinks_the_customer_after_a_cancel(client):
+    user_id = uuid.uuid4().hex
+    owner = {"Authorization": f"Bearer {tokens.issue(user_id)}"}
+    for customer in ("cus_old", "cus_new"):
+        payload, headers = signed({
+            "type": "checkout.session.completed",
+            "created": int(time.time()),
+            "data": {"object": {"client_reference_id": user_id, "customer": customer}},
+        })
+        assert client.post("/api/stripe/webhook", content=payload, headers=headers).json()["handled"]
+        payload, headers = signed({
+            "type": "customer.subscription.created",
+            "created": int(time.time()),
+            "data": {"object": stripe_subscription(customer)},
+        })
+        assert client.post("/api/stripe/webhook", content=payload, headers=headers).json()["handled"]
+        assert client.get(f"/api/stripe/subscription-status/{user_id}", headers=owner).json()["subscription"]["plan"] == "pro"
+        if customer == "cus_old":
+            payload, headers = signed({
+                "type": "customer.subscription.deleted",
+                "created": int(time.time()),
+                "data": {"object": stripe_subscription(customer, status="canceled")},
+            })
+            client.post("/api/stripe/webhook", content=payload, headers=headers)
+            status = client.get(f"/api/stripe/subscription-status/{user_id}", headers=owner).json()
+            assert status["subscription"]["status"] == "canceled"
@@ -0,0 +1,75 @@
+import pytest
+
+
+@pytest.fixture
+def repo(flask_app):
+    from src.services.user_repository import user_repository
+    user_repository.stats.update({k: 0 for k in user_repository.stats})
+    return user_repository
+
+
+@pytest.fixture
+def api(flask_app):
+    return flask_app.test_client()
+
+
+def create(api, username, email):
+    response = api.post("/api/users", json={"username": username, "email": email})
+    assert response.status_code == 201
+    return response.get_json()["id"]
+
+
+def test_lookups_are_case_insensitive_and_cached(api, repo):
+    user_id = create(api, "alice", "Alice@Example.com")
+    assert repo.get_by_email("alice@example.com").id == user_id
+    assert repo.get_by_email("  ALICE@example.COM ").id == user_id
+    assert repo.stats["misses"] == 1 and repo.stats["hits"] == 1
+
+
+def test_signup_clears_the_negative_entry(api, repo):
+    assert repo.get_by_email("bob@example.com") is None
+    assert repo.get_by_email("bob@example.com") is None
+    assert repo.stats["negative_hits"] == 1
+
+    user_id = create(api, "bob", "bob@example.com")
+    assert repo.get_by_email("bob@example.com").id == user_id
+
+
+def test_email_change_moves_the_entry(api, repo):
+    user_id = create(api, "carol", "carol@example.com")
+    assert repo.get_by_email("carol@example.com").id == user_id
+
+    assert api.put(f"/api/users/{user_id}", json={"email": "carol@new.example.com"}).status_code == 200
+    assert repo.get_by_email("carol@example.com") is None
+    assert repo.get_by_email("carol@new.example.com").id == user_id
+
+
+def test_delete_invalidates(api, repo):
+    user_id = create(api, "dave", "dave@example.com")
+    assert repo.get_by_email("dave@example.com") is not None
+    assert api.delete(f"/api/users/{user_id}").status_code == 204
+    assert repo.get_by_email("dave@example.com") is None
+
+
+def test_entry_cached_between_flush_and_commit_is_dropped(api, repo):
+    from src.models.user import User, db
+    user_id = create(api, "erin", "erin@example.com")
+    user = db.session.get(User, user_id)
+    user.email = "erin@new.example.com"
+    db.session.flush()
+    # Another request caches the row before the change is committed
+    repo._remember("erin@example.com", user_id, repo.ttl)
+    db.session.commit()
+    assert repo.get_by_email("erin@example.com") is None
+    assert repo.get_by_email("erin@new.example.com").id == user_id
+
+
+def test_cache_is_bounded(api, repo):
+    repo_max = repo.max_entries
+    repo.max_entries = 5
+    try:
+        for i in range(20):
+            repo.get_by_email(f"nobody{i}@example.com")
+        assert len(repo._entries) == 5
+    finally:
+        repo.max_entries = repo_max
@@ -0,0 +1,29 @@
+import uuid
+
+
+def account(client):
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    body = client.post("/api/auth/signup", json={"name": email, "email": email, "password": "correct horse"}).json()
+    return body["user"], {"Authorization": f"Bearer {body['token']}"}
+
+
+def test_profile_is_only_served_to_its_owner(client):
+    user, headers = account(client)
+    other, other_headers = account(client)
+
+    response = client.get(f"/api/user/{user['id']}", headers=headers)
+    assert response.status_code == 200 and response.json()["user"]["email"] == user["email"]
+    assert client.get(f"/api/user/{user['id']}").status_code == 401
+    assert client.get(f"/api/user/{user['id']}", headers=other_headers).status_code == 403
+    assert client.put(f"/api/user/{user['id']}", json={"name": "x"}, headers=other_headers).status_code == 403
+
+
+def test_update_to_a_taken_email_conflicts(client):
+    user, headers = account(client)
+    other, _ = account(client)
+    response = client.put(f"/api/user/{user['id']}", json={"email": other["email"]}, headers=headers)
+    assert response.status_code == 409
+
+    response = client.put(f"/api/user/{user['id']}", json={"name": f"renamed-{user['id']}"}, headers=headers)
+    assert response.status_code == 200
+    assert client.get(f"/api/user/{user['id']}", headers=headers).json()["user"]["name"] == f"renamed-{user['id']}"